@@ -0,0 +1,577 @@
+"""
+BANF Mail Services Benchmarks
+==============================
+Throughput and latency checks for gmail_service.py and
+zelle_payment_service.py. Everything runs against local stand-ins, so no
+Gmail credentials are needed.
+
+Usage:
+  python benchmarks.py            # run every section
+  python benchmarks.py smtp zelle # run selected sections
+
+Optional: aiosmtpd (pip install aiosmtpd) for the SMTP section.
+"""
+
+import os
+import re
+import socket
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SCRIPT_DIR = Path(__file__).parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+# The services create their databases on import; keep benchmark runs out of the source tree
+SCRATCH_DIR = tempfile.mkdtemp(prefix="banf_bench_")
+os.environ.setdefault('GMAIL_DB_PATH', os.path.join(SCRATCH_DIR, 'gmail_bench.db'))
+os.environ.setdefault('ZELLE_DB_PATH', os.path.join(SCRATCH_DIR, 'zelle_bench.db'))
+
+
+def header(title):
+    print("\n" + "=" * 60)
+    print(title)
+    print("=" * 60)
+
+
+def timed(fn, *args, **kwargs):
+    """Run fn once, return (result, seconds)"""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def free_port():
+    """An unused localhost TCP port for stand-in servers"""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def percentiles(samples_ms):
+    """p50/p95/max summary of latency samples in milliseconds"""
+    ordered = sorted(samples_ms)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return f"p50 {statistics.median(ordered):.1f} ms, p95 {p95:.1f} ms, max {ordered[-1]:.1f} ms"
+
+
+# ============================================================
+# SMTP: per-recipient connections vs pooled sessions
+# ============================================================
+def bench_smtp(recipients=400, latency=0.005):
+    """
+    Send `recipients` messages to an aiosmtpd stand-in, once with a new
+    connection per message (the old send_evite behaviour) and once via
+    SMTPPool. `latency` seconds are added per round-trip to stand in for
+    the network; connection setup costs three of them (connect/TLS, EHLO,
+    AUTH), each message one.
+    """
+    header("SMTP: per-recipient connect vs pooled sessions")
+    try:
+        import asyncio
+        from aiosmtpd.controller import Controller
+    except ImportError:
+        print("  skipped: aiosmtpd not installed")
+        return
+
+    class Handler:
+        received = 0
+
+        async def handle_EHLO(self, server, session, envelope, hostname, responses):
+            await asyncio.sleep(latency * 3)
+            session.host_name = hostname
+            return responses
+
+        async def handle_DATA(self, server, session, envelope):
+            await asyncio.sleep(latency)
+            Handler.received += 1
+            return '250 OK'
+
+    port = free_port()
+    controller = Controller(Handler(), hostname='127.0.0.1', port=port)
+    controller.start()
+    try:
+        os.environ.update(SMTP_SERVER='127.0.0.1', SMTP_PORT=str(port), SMTP_STARTTLS='0')
+        import smtp_client
+        import gmail_service
+
+        message = "Subject: Durga Puja 2026\r\n\r\nYou're invited!\r\n"
+        batch = [(f"member{i}@example.com", message) for i in range(recipients)]
+
+        def one_connection_per_message():
+            for rcpt, msg in batch:
+                with gmail_service.get_smtp_connection() as server:
+                    server.sendmail(gmail_service.GMAIL_ADDRESS, [rcpt], msg)
+
+        _, t_old = timed(one_connection_per_message)
+        pool = smtp_client.SMTPPool(gmail_service.get_smtp_connection, max_size=3)
+        outcomes, t_new = timed(pool.send_many, batch, gmail_service.GMAIL_ADDRESS)
+
+        sent = sum(1 for o in outcomes if o['status'] == 'sent')
+        print(f"  per-recipient connect: {recipients} msgs in {t_old:.2f}s ({recipients / t_old:.0f} msg/s)")
+        print(f"  pooled (3 sessions):   {sent} msgs in {t_new:.2f}s ({sent / t_new:.0f} msg/s), "
+              f"{pool.metrics()['sessions_opened']} logins")
+    finally:
+        controller.stop()
+
+# ============================================================
+# Zelle classifier: per-pattern helpers vs compiled ZelleParser
+# ============================================================
+def zelle_corpus(copies=50):
+    """Mix of bank notifications and ordinary mail, like a busy inbox"""
+    filler = "Thanks for being part of our community. " * 40
+    samples = [
+        ("You received $150.00 from Sunil Banerjee", "Chase <no.reply.alerts@chase.com>",
+         "Sunil Banerjee sent you $150.00 with Zelle.\nMemo: Membership - Sunil Banerjee\n"
+         "Confirmation number: BAC123456789\n" + filler),
+        ("Zelle payment received", "Bank of America <ealerts@ealerts.bankofamerica.com>",
+         "You received $1,250.00 from Priya Sen.\nNote: Durga Puja family pass\nReference ID: ZX99887766\n" + filler),
+        ("Wells Fargo Online: Zelle deposit", "alerts@notify.wellsfargo.com",
+         "Amount: $75 deposited via Zelle. Paid by Ananya Roy. Transaction ID 7TQ2M4K9P1\n" + filler),
+        ("Your weekly digest", "news@shop.example.com", filler * 3),
+        ("Re: Saraswati Puja volunteers", "Member <member@gmail.com>",
+         "I can help with the setup. Lunch was $12 last year.\n" + filler),
+        ("Order shipped", "orders@store.example.com", "Your order #A1B2C3D4 of $49.99 has shipped.\n" + filler),
+    ]
+    return samples * copies
+
+
+def bench_zelle(copies=200):
+    """Classify + extract a synthetic inbox with both implementations and check they agree"""
+    header("Zelle classifier: per-pattern re.search vs compiled ZelleParser")
+    import zelle_payment_service as zps
+
+    corpus = zelle_corpus(copies)
+
+    def legacy():
+        out = []
+        for subject, from_addr, body in corpus:
+            if not zps.is_zelle_email(subject, from_addr, body):
+                out.append(None)
+                continue
+            out.append((zps.parse_zelle_amount(f"{subject} {body}"), zps.parse_zelle_sender(subject, body),
+                        zps.parse_zelle_memo(body), zps.parse_zelle_confirmation(body),
+                        zps.parse_bank_source(from_addr, body)))
+        return out
+
+    def compiled():
+        out = []
+        for subject, from_addr, body in corpus:
+            parsed = zps.zelle_parser.parse(subject, from_addr, body)
+            out.append(None if parsed is None else
+                       (parsed['amount'], parsed['sender_name'], parsed['memo'],
+                        parsed['confirmation_code'], parsed['bank_source']))
+        return out
+
+    old_results, t_old = min((timed(legacy) for _ in range(5)), key=lambda r: r[1])
+    new_results, t_new = min((timed(compiled) for _ in range(5)), key=lambda r: r[1])
+    n = len(corpus)
+    print(f"  messages: {n} ({sum(r is not None for r in new_results)} Zelle)")
+    print(f"  per-pattern helpers: {t_old * 1e6 / n:.1f} us/msg")
+    print(f"  ZelleParser.parse:   {t_new * 1e6 / n:.1f} us/msg ({t_old / t_new:.1f}x)")
+    print(f"  results identical:   {old_results == new_results}")
+
+
+# ============================================================
+# Zelle DB: dashboard reads while the poller writes
+# ============================================================
+class StubMailbox:
+    """
+    Minimal imaplib stand-in for poll_gmail_for_zelle(mail=...): every
+    UID search reveals `per_poll` new Zelle notifications.
+    """
+
+    def __init__(self, per_poll=20):
+        self.per_poll = per_poll
+        self.next_uid = 1
+        self.messages = {}
+
+    def response(self, code):
+        return code, [str(1 if code == 'UIDVALIDITY' else self.next_uid).encode()]
+
+    def status(self, folder, items):
+        return 'OK', [f'"{folder}" (UIDVALIDITY 1 UIDNEXT {self.next_uid})'.encode()]
+
+    def select(self, folder="INBOX", readonly=False):
+        return 'OK', [b'0']
+
+    def uid(self, command, *args):
+        if command == 'SEARCH':
+            criteria = args[-1]
+            if criteria.startswith('UID ') and 'BODY' in criteria:
+                return 'OK', [' '.join(map(str, self.messages)).encode()]
+            self.messages = {}
+            for _ in range(self.per_poll):
+                uid = self.next_uid
+                self.next_uid += 1
+                self.messages[uid] = (
+                    f"Subject: You received $50.00 from Member {uid} via Zelle\r\n"
+                    f"From: Chase <no.reply.alerts@chase.com>\r\nDate: Mon, 2 Feb 2026 09:00:00 -0500\r\n\r\n",
+                    f"Memo: Membership - Member {uid}\r\nConfirmation: ZEL{uid:08d}\r\n")
+            return 'OK', [' '.join(map(str, self.messages)).encode()]
+        wanted = set()
+        for part in args[0].split(','):
+            lo, _, hi = part.partition(':')
+            wanted.update(range(int(lo), int(hi or lo) + 1))
+        data = []
+        for seq, uid in enumerate(self.messages, 1):
+            if uid not in wanted:
+                continue
+            head, text = self.messages[uid]
+            head, text = head.encode(), text.encode()
+            data.append((f'{seq} (UID {uid} BODY[HEADER] {{{len(head)}}}'.encode(), head))
+            data.append((f' BODY[TEXT] {{{len(text)}}}'.encode(), text))
+            data.append(b')')
+        return 'OK', data
+
+    def logout(self):
+        return 'BYE', [b'']
+
+
+def bench_zelle_db(seconds=5.0, readers=4, seed_rows=5000, poll_every=0.1):
+    """
+    GET /api/zelle/payments latency from `readers` threads while the poller
+    inserts 20 payments every `poll_every` seconds on top of `seed_rows`.
+    """
+    header("Zelle DB: /api/zelle/payments under concurrent polling")
+    import threading
+    import zelle_payment_service as zps
+
+    zps.DB_PATH = os.path.join(tempfile.mkdtemp(), "zelle_bench.db")
+    zps.init_db()
+    seed = sqlite3.connect(zps.DB_PATH)
+    seed.executemany('''INSERT INTO zelle_payments (email_id, sender_name, amount, memo, status, created_at)
+        VALUES (?, ?, 50.0, 'Membership', 'pending', ?)''',
+        [(f"seed:{i}", f"Member {i}", f"2026-01-01T00:00:{i % 60:02d}.{i:06d}") for i in range(seed_rows)])
+    seed.commit()
+    seed.close()
+    client = zps.app.test_client()
+    stop = threading.Event()
+    polls = []
+    latencies, errors = [], []
+
+    def poller():
+        mailbox = StubMailbox()
+        while not stop.is_set():
+            result = zps.poll_gmail_for_zelle(mail=mailbox)
+            polls.append(result['new_payments'])
+            stop.wait(poll_every)
+
+    def reader():
+        local = zps.app.test_client()
+        while not stop.is_set():
+            start = time.perf_counter()
+            resp = local.get('/api/zelle/payments?limit=50')
+            latencies.append((time.perf_counter() - start) * 1000)
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+
+    threads = [threading.Thread(target=poller)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+
+    total = client.get('/api/zelle/payments?limit=1').get_json()['total']
+    print(f"  poller: {len(polls)} polls, {sum(polls)} payments inserted ({sum(polls) / seconds:.0f}/s), {total} rows")
+    print(f"  reads:  {len(latencies)} requests ({len(latencies) / seconds:.0f}/s), {len(errors)} errors")
+    print(f"          {percentiles(latencies)}")
+
+
+# ============================================================
+# Zelle DB: a seeded database for the paging and backfill runs
+# ============================================================
+def seed_zelle_db(zps, payments=50000, history=10000):
+    """Fresh DB_PATH with `payments` Zelle rows and `history` payment_history rows"""
+    import random
+
+    zps.DB_PATH = os.path.join(tempfile.mkdtemp(), "zelle_bench.db")
+    zps.init_db()
+    rng = random.Random(7)
+    members = ['m_banerjee', 'm_sen', 'm_roy', 'm_das', 'm_ghosh', 'm_mukherjee']
+    statuses = ['pending', 'auto_verified', 'verified', 'rejected']
+    conn = sqlite3.connect(zps.DB_PATH)
+    conn.executemany('''INSERT INTO zelle_payments
+        (email_id, sender_name, amount, memo, status, auto_matched, created_at)
+        VALUES (?, ?, ?, 'Membership', ?, ?, ?)''',
+        [(f"1:{i}", f"Member {i}", rng.choice([50.0, 75.0, 100.0, 250.0]), rng.choice(statuses),
+          rng.randint(0, 1), f"2026-{1 + i * 9 // payments:02d}-01T00:00:00.{i:06d}") for i in range(payments)])
+    conn.executemany('''INSERT INTO payment_history
+        (member_id, member_name, payment_type, amount, zelle_payment_id, created_at)
+        VALUES (?, '', 'Membership', 100.0, ?, ?)''',
+        [(rng.choice(members), rng.randint(1, payments), f"2026-01-01T00:00:00.{i:06d}") for i in range(history)])
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def bench_zelle_pages(payments=50000, limit=50, depth=500):
+    """Latency of page 1 vs page `depth` of /api/zelle/payments: OFFSET vs cursor tokens"""
+    header(f"Zelle DB: /api/zelle/payments page 1 vs page {depth} ({payments} payments)")
+    import zelle_payment_service as zps
+
+    seed_zelle_db(zps, payments)
+    client = zps.app.test_client()
+
+    def best_ms(url, runs=20):
+        client.get(url)  # warm the page cache
+        return min(timed(client.get, url)[1] for _ in range(runs)) * 1000
+
+    base = f'/api/zelle/payments?limit={limit}&include_total=false'
+    token = None
+    for _ in range(depth - 1):
+        token = client.get(base + (f'&cursor={token}' if token else '')).get_json()['next']
+    print(f"  page 1:                     {best_ms(base):.2f} ms")
+    print(f"  page {depth} via offset:       {best_ms(f'{base}&offset={(depth - 1) * limit}'):.2f} ms")
+    print(f"  page {depth} via cursor:       {best_ms(f'{base}&cursor={token}'):.2f} ms")
+    print(f"  page 1 with include_total:  {best_ms(f'/api/zelle/payments?limit={limit}'):.2f} ms")
+
+
+def bench_zelle_backfill(messages=2000):
+    """One poll that ingests a 30-day backlog of `messages` Zelle notifications"""
+    header(f"Zelle DB: backfill poll of {messages} payments")
+    import zelle_payment_service as zps
+
+    seed_zelle_db(zps, payments=0, history=0)
+    conn = zps.get_db()
+    statements = []
+    conn.set_trace_callback(statements.append)
+    result, elapsed = timed(zps.poll_gmail_for_zelle, mail=StubMailbox(per_poll=messages))
+    conn.set_trace_callback(None)
+    commits = sum(1 for sql in statements if sql.strip().upper().startswith('COMMIT'))
+    print(f"  {result['new_payments']} payments ({result['auto_matched']} auto-matched) in {elapsed:.2f}s, "
+          f"{commits} commit(s), {len(statements)} statements")
+
+
+def archive_message(uid):
+    """A bank-style multipart notification (plain + quoted-printable HTML), as (header, text)"""
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    plain = (f"Member {uid} sent you $50.00 with Zelle.\nMemo: Membership - Member {uid}\n"
+             f"Confirmation: ZEL{uid:08d}\n" + "Thanks for banking with us. " * 40)
+    html = ("<html><body><table>" + "<tr><td style='padding:4px'>&nbsp;</td></tr>" * 60 +
+            f"<p>Member {uid} sent you <b>$50.00</b> with Zelle&reg;.</p>"
+            f"<p>Memo: Membership - Member {uid}</p></table></body></html>")
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = f"You received $50.00 from Member {uid}"
+    msg['From'] = "Chase <no.reply.alerts@chase.com>"
+    msg['Date'] = "Mon, 2 Feb 2026 09:00:00 -0500"
+    msg.attach(MIMEText(plain, 'plain'))
+    msg.attach(MIMEText(html, 'html', 'utf-8'))
+    head, _, text = msg.as_string().partition("\n\n")
+    return head.replace("\n", "\r\n") + "\r\n\r\n", text.replace("\n", "\r\n")
+
+
+def bench_zelle_parse(messages=3000):
+    """Parse an archive import inline vs in the process pool"""
+    header(f"Zelle backfill parsing: {messages} MIME messages, inline vs process pool")
+    import zelle_payment_service as zps
+
+    mail = StubMailbox()
+    mail.messages = {uid: archive_message(uid) for uid in range(1, messages + 1)}
+    uids = list(mail.messages)
+    print(f"  cores: {os.cpu_count()}")
+    baseline = None
+    for workers in sorted({1, 2, zps.PARSE_WORKERS}):
+        out, elapsed = timed(lambda: list(zps.iter_parsed_messages(mail, uids, workers)))
+        parsed = sum(isinstance(r, dict) for _, r in out)
+        baseline = baseline or elapsed
+        print(f"  workers={workers}: {messages / elapsed:,.0f} msg/s ({baseline / elapsed:.2f}x), "
+              f"{parsed} parsed, in order: {[u for u, _ in out] == uids}")
+
+
+# ============================================================
+# Gmail search: server-side SEARCH + fetch hits vs local FTS5 index
+# ============================================================
+class IndexMailbox:
+    """imaplib stand-in serving `UID SEARCH UID n:*` and the index's header + partial text FETCH from memory"""
+
+    def __init__(self, messages):
+        self.messages = messages  # {uid: raw bytes}
+
+    def uid(self, command, *args):
+        if command == 'SEARCH':
+            first = int(args[-1].split()[1].split(':')[0])
+            return 'OK', [' '.join(str(u) for u in self.messages if u >= first).encode()]
+        text_bytes = int(re.search(r'TEXT\]<0\.(\d+)>', args[1]).group(1))
+        data = []
+        for part in args[0].split(','):
+            lo, _, hi = part.partition(':')
+            for uid in range(int(lo), int(hi or lo) + 1):
+                head, _, text = self.messages[uid].partition(b"\n\n")
+                head, text = head + b"\n\n", text[:text_bytes]
+                data.append((f'{uid} (UID {uid} BODY[HEADER] {{{len(head)}}}'.encode(), head))
+                data.append((f' BODY[TEXT]<0> {{{len(text)}}}'.encode(), text))
+                data.append(b')')
+        return 'OK', data
+
+
+def search_corpus(messages):
+    """Community mailbox: announcements, replies and newsletters (some HTML-only)"""
+    from email.mime.text import MIMEText
+
+    topics = ["Durga Puja volunteers", "Saraswati Puja menu", "Membership renewal", "Picnic carpool",
+              "Kali Puja rehearsal", "Newsletter", "Board meeting minutes", "Cultural program auditions"]
+    corpus = {}
+    for uid in range(1, messages + 1):
+        topic = topics[uid % len(topics)]
+        text = (f"Hello all, update #{uid} on {topic.lower()}. Please reply by Friday. "
+                f"Contact coordinator{uid % 40}@example.com for details. " * 12)
+        part = MIMEText(f"<html><body><p>{text}</p></body></html>", 'html') if uid % 3 == 0 else MIMEText(text)
+        part['Subject'] = f"{topic} ({uid})"
+        part['From'] = f"Member {uid % 300} <member{uid % 300}@example.com>"
+        part['To'] = "banfjax@gmail.com"
+        part['Date'] = "Sat, 14 Mar 2026 10:00:00 -0400"
+        corpus[uid] = part.as_bytes()
+    return corpus
+
+
+def bench_gmail_search(messages=5000, limit=20):
+    """
+    Search a synthetic folder the old way (scan every message for the
+    term, then download + parse each hit for its snippet) and via the
+    local FTS5 index. The old path is measured in-process, so real Gmail
+    adds a server-side folder scan and network round-trips on top.
+    """
+    header(f"Gmail search: folder scan + fetch hits vs FTS5 index ({messages} messages)")
+    import gmail_service
+    import mail_index
+
+    corpus = search_corpus(messages)
+    index = mail_index.MailIndex(os.path.join(tempfile.mkdtemp(), 'search_bench.db'), gmail_service.index_fields)
+    state, elapsed = timed(index.sync, IndexMailbox(corpus), 'INBOX', 1, limit=0)
+    print(f"  initial sync: {state['indexed']} messages in {elapsed:.2f}s ({state['indexed'] / elapsed:.0f} msg/s)")
+
+    def scan(term):
+        needle = term.lower().encode()
+        hits = [uid for uid in reversed(list(corpus)) if needle in corpus[uid].lower()][:limit]
+        return [gmail_service.parse_raw_message(corpus[uid])['body'][:300] for uid in hits]
+
+    for term in ("carpool", "coordinator7", "kali rehearsal", "renew*"):
+        indexed = [timed(index.search, 'INBOX', 1, term, limit)[1] * 1000 for _ in range(20)]
+        total = index.search('INBOX', 1, term, limit)[0]
+        line = f"  {term!r:18} {total:5} hits  index {percentiles(indexed)}"
+        if '*' not in term and ' ' not in term:
+            scanned = [timed(scan, term)[1] * 1000 for _ in range(3)]
+            line += f" | scan+fetch {statistics.median(scanned):.1f} ms"
+        print(line)
+
+
+# ============================================================
+# Contact groups: whole-file JSON rewrites vs SQLite rows
+# ============================================================
+def bench_contacts(contacts=2000, ops=200):
+    """Add/remove one contact on a `contacts`-member group: JSON load + dump (the old store) vs ContactStore"""
+    header(f"Contact groups: JSON file vs SQLite ({contacts} contacts, {ops} ops each)")
+    import json
+    import contact_store
+
+    tmp = tempfile.mkdtemp()
+    members = [{"name": f"Member {i}", "email": f"member{i}@example.com"} for i in range(contacts)]
+    data = {"groups": {"All Members": {"description": "All BANF Members", "contacts": members}}}
+    json_path = os.path.join(tmp, "gmail_contacts.json")
+    with open(json_path, "w") as f:
+        json.dump(data, f, indent=2)
+
+    def json_add_remove(i):
+        # load_contacts() / save_contacts() as the routes used them
+        for adding in (True, False):
+            with open(json_path) as f:
+                doc = json.load(f)
+            group = doc["groups"]["All Members"]["contacts"]
+            if adding:
+                group.append({"name": f"New {i}", "email": f"new{i}@example.com"})
+            else:
+                doc["groups"]["All Members"]["contacts"] = [c for c in group if c["email"] != f"new{i}@example.com"]
+            with open(json_path, "w") as f:
+                json.dump(doc, f, indent=2)
+
+    store, t_import = timed(contact_store.ContactStore, os.path.join(tmp, "contacts.db"), import_path=json_path)
+    print(f"  one-time import of {contacts} contacts: {t_import * 1000:.0f} ms")
+
+    def store_add_remove(i):
+        store.add_to_group("All Members", [{"name": f"New {i}", "email": f"new{i}@example.com"}])
+        store.remove_from_group("All Members", f"new{i}@example.com")
+
+    _, t_json = timed(lambda: [json_add_remove(i) for i in range(ops)])
+    _, t_store = timed(lambda: [store_add_remove(i) for i in range(ops)])
+    print(f"  JSON file:   {t_json * 1000 / ops:.2f} ms per add+remove")
+    print(f"  ContactStore: {t_store * 1000 / ops:.2f} ms per add+remove ({t_json / t_store:.1f}x)")
+    print(f"  group size after: {len(store.group_contacts('All Members'))}")
+
+
+# ============================================================
+# Evites: per-recipient string building + MIME vs compiled template
+# ============================================================
+def bench_evite(recipients=1000):
+    """Per-recipient render time of the evite, the old way (f-strings, .replace chain, MIMEMultipart) vs EviteTemplate"""
+    header(f"Evite rendering ({recipients} recipients)")
+    import evite_template
+
+    sender = "banfjax@gmail.com"
+    event = dict(event_name="Durga Puja 2026", event_date="October 20, 2026", event_time="6:00 PM",
+                 venue="Jacksonville Community Center")
+    message = ("Dear {memberName}, join us for {eventName} on {eventDate} at {venue}, starting {eventTime}. "
+               "Bring the family!")
+    subject = f"You're Invited: {event['event_name']}"
+    # Every tenth name is Bengali, which takes the base64 part path
+    people = [(f"Member {i}" if i % 10 else f"সদস্য {i}", f"member{i}@example.com") for i in range(recipients)]
+
+    def old_way(name, to_addr):
+        personalized = message.replace('{memberName}', name).replace('{eventName}', event['event_name'])\
+            .replace('{eventDate}', event['event_date']).replace('{venue}', event['venue'])\
+            .replace('{eventTime}', event['event_time'])
+        values = dict(event, r_name=name, personalized_msg=personalized, sender_address=sender,
+                      details_note=evite_template.DETAILS_NOTE)
+        return evite_template.build_message(f"BANF <{sender}>", sender, to_addr, subject,
+                                            evite_template.EVITE_TEXT.render(values),
+                                            evite_template.EVITE_HTML.render(values))
+
+    def new_way():
+        evite = evite_template.EviteTemplate(sender, subject, message=message, **event)
+        return [evite.render(name, to_addr) for name, to_addr in people]
+
+    old, t_old = timed(lambda: [old_way(name, to_addr) for name, to_addr in people])
+    new, t_new = timed(new_way)
+    print(f"  email package per recipient: {t_old * 1e6 / recipients:.0f} us/recipient ({t_old * 1000:.0f} ms total)")
+    print(f"  compiled template:           {t_new * 1e6 / recipients:.0f} us/recipient ({t_new * 1000:.0f} ms total, "
+          f"incl. compile) {t_old / t_new:.1f}x")
+
+    boundary = re.compile(r'={15}\d+==')
+    mismatched = sum(1 for a, b in zip(old, new) if boundary.sub('', a) != boundary.sub('', b))
+    print(f"  messages differing from the email package output: {mismatched}")
+    return mismatched == 0
+
+
+SECTIONS = {
+    'smtp': bench_smtp,
+    'zelle': bench_zelle,
+    'zelle-db': bench_zelle_db,
+    'zelle-pages': bench_zelle_pages,
+    'zelle-backfill': bench_zelle_backfill,
+    'zelle-parse': bench_zelle_parse,
+    'gmail-search': bench_gmail_search,
+    'contacts': bench_contacts,
+    'evite': bench_evite,
+}
+
+
+def main():
+    selected = sys.argv[1:] or list(SECTIONS)
+    for name in selected:
+        if name not in SECTIONS:
+            print(f"Unknown section '{name}'. Choose from: {', '.join(SECTIONS)}")
+            return 1
+    # A section returning False is a failed check
+    failed = [name for name in selected if SECTIONS[name]() is False]
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
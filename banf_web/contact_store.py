@@ -0,0 +1,370 @@
+# -*- coding: utf-8 -*-
+"""
+BANF Contact Groups
+====================
+SQLite store for gmail_service.py contact groups.
+
+Groups, contacts and a membership join table replace gmail_contacts.json,
+which every route parsed in full and every change rewrote in full (and
+two concurrent edits could overwrite each other). Each change now touches
+only the rows it affects, inside one transaction. A contact is one row
+per email address (case-insensitive), shared by every group it is in.
+
+Bulk uploads (CSV or vCard) are parsed as a stream and written in
+batches, so a 100k-row roster needs memory for one batch, not the file;
+the UNIQUE constraints do the de-duplication.
+
+The first start imports gmail_contacts.json if it exists, otherwise it
+seeds the default groups. To import a file by hand:
+
+  python contact_store.py gmail_contacts.json [gmail_service.db]
+"""
+
+import csv
+import json
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime
+from email.utils import parseaddr
+
+IMPORT_BATCH = 1000       # rows per transaction for bulk imports
+INVALID_SAMPLES = 20      # invalid rows echoed back to the caller
+
+_EMAIL_RE = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+_EMAIL_HEADERS = ("email", "e-mail", "email address", "e-mail address", "mail", "email 1 - value")
+_NAME_HEADERS = ("name", "full name", "display name", "contact name")
+
+
+def normalize_email(value):
+    """Lower-cased bare address from 'a@b.org', 'mailto:a@b.org' or 'Name <a@b.org>'; None if not valid"""
+    value = (value or "").strip()
+    if value.lower().startswith("mailto:"):
+        value = value[7:]
+    addr = parseaddr(value)[1] if "<" in value else value
+    addr = addr.strip().lower()
+    if len(addr) > 254 or not _EMAIL_RE.match(addr):
+        return None
+    return addr
+
+
+# ====== UPLOAD PARSERS ======
+# Each yields (line_no, name, raw_email) per contact, one row at a time.
+
+def iter_csv_contacts(lines):
+    """
+    Contacts from CSV. A header row is used if it names an email column
+    (email, e-mail, email address, ...) and optionally name or first/last
+    name columns; without one, the first cell containing '@' is the email
+    and the first other non-empty cell is the name.
+    """
+    reader = csv.reader(lines)
+    columns = None  # {'email': i, 'name': i, 'first': i, 'last': i} once the first row is seen
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        if columns is None:
+            headers = [cell.strip().lower() for cell in row]
+            columns = {
+                'email': next((i for i, h in enumerate(headers) if h in _EMAIL_HEADERS), None),
+                'name': next((i for i, h in enumerate(headers) if h in _NAME_HEADERS), None),
+                'first': next((i for i, h in enumerate(headers) if h in ("first name", "given name")), None),
+                'last': next((i for i, h in enumerate(headers) if h in ("last name", "family name")), None),
+            }
+            if columns['email'] is not None:
+                continue
+
+        def cell(key):
+            i = columns[key]
+            return row[i].strip() if i is not None and i < len(row) else ""
+
+        if columns['email'] is not None:
+            raw = cell('email')
+            name = cell('name') or " ".join(part for part in (cell('first'), cell('last')) if part)
+        else:
+            at = next((i for i, value in enumerate(row) if "@" in value), None)
+            raw = row[at] if at is not None else ""
+            name = next((value.strip() for i, value in enumerate(row) if i != at and value.strip()), "")
+        yield reader.line_num, name, raw
+
+
+def iter_vcard_contacts(lines):
+    """
+    Contacts from vCard (2.1/3.0/4.0): one per EMAIL property, named by FN
+    (or N). Folded lines are unfolded as they stream past.
+    """
+    card = None
+    pending, pending_no = None, 0
+
+    def lines_unfolded():
+        nonlocal pending, pending_no
+        for line_no, line in enumerate(lines, 1):
+            line = line.rstrip("\r\n")
+            if line[:1] in (" ", "\t") and pending is not None:
+                pending += line[1:]
+                continue
+            if pending is not None:
+                yield pending_no, pending
+            pending, pending_no = line, line_no
+        if pending is not None:
+            yield pending_no, pending
+
+    for line_no, line in lines_unfolded():
+        key, _, value = line.partition(":")
+        prop = key.split(";")[0].split(".")[-1].upper()  # drop params and item1. group prefixes
+        if prop == "BEGIN" and value.strip().upper() == "VCARD":
+            card = {"fn": "", "n": "", "emails": []}
+        elif card is None:
+            continue
+        elif prop == "FN":
+            card["fn"] = _vcard_unescape(value)
+        elif prop == "N":
+            family, given = (value.split(";") + ["", ""])[:2]
+            card["n"] = " ".join(_vcard_unescape(p) for p in (given, family) if p.strip())
+        elif prop == "EMAIL":
+            card["emails"].append((line_no, _vcard_unescape(value)))
+        elif prop == "END" and value.strip().upper() == "VCARD":
+            for email_line, raw in card["emails"]:
+                yield email_line, card["fn"] or card["n"], raw
+            card = None
+
+
+def _vcard_unescape(value):
+    return value.replace("\\,", ",").replace("\\;", ";").replace("\\n", " ").replace("\\\\", "\\").strip()
+
+
+class ContactStore:
+    """Contact groups in SQLite; `seed` is the {"groups": {...}} layout of gmail_contacts.json"""
+
+    def __init__(self, db_path, import_path=None, seed=None):
+        self.db_path = db_path
+        self.init_db(import_path, seed)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    def init_db(self, import_path=None, seed=None):
+        """Create tables; on first use import `import_path` (if present) or `seed`"""
+        conn = self._connect()
+        with conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS contact_groups (
+                id INTEGER PRIMARY KEY,
+                name TEXT NOT NULL UNIQUE,
+                description TEXT DEFAULT '',
+                created_at TEXT
+            )''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS contacts (
+                id INTEGER PRIMARY KEY,
+                email TEXT NOT NULL UNIQUE COLLATE NOCASE,
+                name TEXT DEFAULT '',
+                created_at TEXT
+            )''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS contact_group_members (
+                group_id INTEGER NOT NULL REFERENCES contact_groups (id) ON DELETE CASCADE,
+                contact_id INTEGER NOT NULL REFERENCES contacts (id) ON DELETE CASCADE,
+                added_at TEXT,
+                UNIQUE (group_id, contact_id)
+            )''')
+            conn.execute('''CREATE INDEX IF NOT EXISTS idx_contact_group_members_contact
+                ON contact_group_members (contact_id)''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS contact_store_meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            )''')
+            initialized = conn.execute("SELECT value FROM contact_store_meta WHERE key = 'initialized'").fetchone()
+        conn.close()
+
+        if initialized is None:
+            source = "seed"
+            if import_path and os.path.exists(import_path):
+                with open(import_path) as f:
+                    seed = json.load(f)
+                source = import_path
+            if seed:
+                self.import_groups(seed)
+            conn = self._connect()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO contact_store_meta (key, value) VALUES ('initialized', ?)",
+                             (f"{source} @ {datetime.now().isoformat()}",))
+            conn.close()
+
+    def import_groups(self, data):
+        """
+        Merge a gmail_contacts.json-style dict into the store in one
+        transaction. Safe to re-run: existing groups and memberships are
+        kept. Returns {"groups": n, "memberships": n} newly added.
+        """
+        conn = self._connect()
+        groups = memberships = 0
+        with conn:
+            for name, group in (data.get("groups") or {}).items():
+                cur = conn.execute('''INSERT OR IGNORE INTO contact_groups (name, description, created_at)
+                    VALUES (?, ?, ?)''', (name, group.get("description", ""), datetime.now().isoformat()))
+                groups += cur.rowcount
+                group_id = conn.execute("SELECT id FROM contact_groups WHERE name = ?", (name,)).fetchone()[0]
+                memberships += self._add_members(conn, group_id, group.get("contacts") or [])
+        conn.close()
+        return {"groups": groups, "memberships": memberships}
+
+    # ====== READS ======
+
+    def all_groups(self):
+        """Every group with its contacts, in the gmail_contacts.json layout"""
+        conn = self._connect()
+        rows = conn.execute('''SELECT g.name, g.description, c.name, c.email
+            FROM contact_groups g
+            LEFT JOIN contact_group_members m ON m.group_id = g.id
+            LEFT JOIN contacts c ON c.id = m.contact_id
+            ORDER BY g.id, m.rowid''').fetchall()
+        conn.close()
+        groups = {}
+        for group_name, description, name, email_addr in rows:
+            group = groups.setdefault(group_name, {"description": description or "", "contacts": []})
+            if email_addr is not None:
+                group["contacts"].append({"name": name or "", "email": email_addr})
+        return {"groups": groups}
+
+    def group_contacts(self, group_name):
+        """[{name, email}] for one group, or None if it doesn't exist"""
+        conn = self._connect()
+        try:
+            group = conn.execute("SELECT id FROM contact_groups WHERE name = ?", (group_name,)).fetchone()
+            if group is None:
+                return None
+            return [{"name": name or "", "email": email_addr} for name, email_addr in conn.execute('''
+                SELECT c.name, c.email FROM contact_group_members m JOIN contacts c ON c.id = m.contact_id
+                WHERE m.group_id = ? ORDER BY m.rowid''', group)]
+        finally:
+            conn.close()
+
+    # ====== WRITES ======
+
+    def create_group(self, group_name, description=""):
+        """False if a group with that name already exists"""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("INSERT INTO contact_groups (name, description, created_at) VALUES (?, ?, ?)",
+                             (group_name, description, datetime.now().isoformat()))
+            return True
+        except sqlite3.IntegrityError:
+            return False
+        finally:
+            conn.close()
+
+    def delete_group(self, group_name):
+        """Delete a group and its memberships (contacts stay); False if not found"""
+        conn = self._connect()
+        with conn:
+            deleted = conn.execute("DELETE FROM contact_groups WHERE name = ?", (group_name,)).rowcount
+        conn.close()
+        return bool(deleted)
+
+    def add_to_group(self, group_name, contact_list):
+        """Add [{name, email}] to a group; returns how many were new members, or None if no such group"""
+        conn = self._connect()
+        try:
+            with conn:
+                group = conn.execute("SELECT id FROM contact_groups WHERE name = ?", (group_name,)).fetchone()
+                if group is None:
+                    return None
+                return self._add_members(conn, group[0], contact_list)
+        finally:
+            conn.close()
+
+    def remove_from_group(self, group_name, email_addr):
+        """Remove one address from a group; None if no such group, else whether it was a member"""
+        conn = self._connect()
+        try:
+            with conn:
+                group = conn.execute("SELECT id FROM contact_groups WHERE name = ?", (group_name,)).fetchone()
+                if group is None:
+                    return None
+                return bool(conn.execute('''DELETE FROM contact_group_members
+                    WHERE group_id = ? AND contact_id = (SELECT id FROM contacts WHERE email = ?)''',
+                    (group[0], (email_addr or "").strip())).rowcount)
+        finally:
+            conn.close()
+
+    def import_contacts(self, group_name, rows, batch_size=IMPORT_BATCH):
+        """
+        Stream (line_no, name, email) rows, e.g. from iter_csv_contacts(),
+        into a group, committing every `batch_size` valid rows. Addresses
+        are normalized; ones already in the group (or repeated in the
+        upload) count as duplicates. Returns {added, duplicates, invalid,
+        invalid_samples}, or None if no such group.
+        """
+        conn = self._connect()
+        try:
+            group = conn.execute("SELECT id FROM contact_groups WHERE name = ?", (group_name,)).fetchone()
+            if group is None:
+                return None
+            result = {"added": 0, "duplicates": 0, "invalid": 0, "invalid_samples": []}
+            batch = []
+
+            # Each batch goes through a temp table so contacts and memberships
+            # are written with one statement each instead of two per row
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS contact_import (email TEXT, name TEXT)")
+
+            def flush():
+                now = datetime.now().isoformat()
+                with conn:
+                    conn.execute("DELETE FROM contact_import")
+                    conn.executemany("INSERT INTO contact_import (email, name) VALUES (?, ?)", batch)
+                    # "WHERE true" lets SQLite parse an upsert whose rows come from a SELECT
+                    conn.execute('''INSERT INTO contacts (email, name, created_at)
+                        SELECT email, name, ? FROM contact_import WHERE true
+                        ON CONFLICT(email) DO UPDATE SET name = COALESCE(NULLIF(contacts.name, ''), excluded.name)''',
+                        (now,))
+                    added = conn.execute('''INSERT OR IGNORE INTO contact_group_members (group_id, contact_id, added_at)
+                        SELECT ?, c.id, ? FROM contact_import i JOIN contacts c ON c.email = i.email''',
+                        (group[0], now)).rowcount
+                result["added"] += added
+                result["duplicates"] += len(batch) - added
+                batch.clear()
+
+            for line_no, name, raw in rows:
+                email_addr = normalize_email(raw)
+                if email_addr is None:
+                    result["invalid"] += 1
+                    if len(result["invalid_samples"]) < INVALID_SAMPLES:
+                        result["invalid_samples"].append({"line": line_no, "value": (raw or "")[:200]})
+                    continue
+                batch.append((email_addr, name))
+                if len(batch) >= batch_size:
+                    flush()
+            if batch:
+                flush()
+            return result
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _add_members(conn, group_id, contact_list):
+        now = datetime.now().isoformat()
+        added = 0
+        for contact in contact_list:
+            email_addr = (contact.get("email") or "").strip()
+            if not email_addr:
+                continue
+            # One row per address; fill in a missing name but never overwrite one
+            contact_id = conn.execute('''INSERT INTO contacts (email, name, created_at) VALUES (?, ?, ?)
+                ON CONFLICT(email) DO UPDATE SET name = COALESCE(NULLIF(contacts.name, ''), excluded.name)
+                RETURNING id''', (email_addr, contact.get("name") or "", now)).fetchone()[0]
+            added += conn.execute('''INSERT OR IGNORE INTO contact_group_members (group_id, contact_id, added_at)
+                VALUES (?, ?, ?)''', (group_id, contact_id, now)).rowcount
+        return added
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    here = os.path.dirname(os.path.abspath(__file__))
+    db = sys.argv[2] if len(sys.argv) > 2 else os.getenv("GMAIL_DB_PATH", os.path.join(here, "gmail_service.db"))
+    with open(sys.argv[1]) as f:
+        result = ContactStore(db).import_groups(json.load(f))
+    print(f"Imported {result['groups']} new group(s), {result['memberships']} new membership(s) into {db}")
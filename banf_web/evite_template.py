@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+BANF Evite Templates
+=====================
+Precompiled evite emails for gmail_service.py /api/gmail/send-evite.
+
+The invitation HTML and plain text are split into static segments and
+named slots once, at import. Per send, the event fields are bound into
+the static text, the message is compiled the same way, and the MIME
+envelope (headers, boundary, part headers) is generated once by the
+email package. Per recipient, rendering fills the name slots and joins
+the segments; only the two text parts are encoded. The output is the
+same message the email package builds, with a per-send boundary.
+"""
+
+import re
+import uuid
+from email import base64mime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from functools import lru_cache
+
+_SLOT_RE = re.compile(r'\{(\w+)\}')
+# Placeholders recognised inside the caller's free-text message
+_MESSAGE_SLOT_RE = re.compile(r'\{(memberName|eventName|eventDate|venue|eventTime)\}')
+
+DETAILS_NOTE = ("<p style='color:#888;font-size:14px;'>Please include: number of adults, kids, "
+                "and any dietary requirements in your reply.</p>")
+
+
+class Template:
+    """
+    Text split once into static segments and named slots: parts[0::2] are
+    static, parts[1::2] are slot names. render() is a list fill and a join.
+    """
+
+    def __init__(self, text, pattern=_SLOT_RE):
+        self._parts = pattern.split(text)
+
+    @classmethod
+    def _from_parts(cls, parts):
+        template = cls.__new__(cls)
+        template._parts = parts
+        return template
+
+    @property
+    def slots(self):
+        return set(self._parts[1::2])
+
+    def bind(self, **values):
+        """New template with the given slots filled in (values are literal, never re-parsed)"""
+        parts = [self._parts[0]]
+        for i in range(1, len(self._parts), 2):
+            name, static = self._parts[i], self._parts[i + 1]
+            if name in values:
+                parts[-1] += values[name] + static
+            else:
+                parts += [name, static]
+        return Template._from_parts(parts)
+
+    def render(self, values):
+        parts = list(self._parts)
+        parts[1::2] = [values[name] for name in parts[1::2]]
+        return "".join(parts)
+
+
+EVITE_HTML = Template("""
+        <div style="max-width:600px;margin:0 auto;font-family:Arial,sans-serif;">
+            <div style="background:linear-gradient(135deg,#ff6b35,#f7c948);padding:30px;text-align:center;border-radius:10px 10px 0 0;">
+                <h1 style="color:white;margin:0;">&#127799; BANF Invitation</h1>
+                <p style="color:rgba(255,255,255,0.9);margin:5px 0 0;">Bengali Association of North Florida</p>
+            </div>
+            <div style="background:#fff;padding:30px;border:1px solid #eee;">
+                <h2 style="color:#333;">{event_name}</h2>
+                <p style="color:#666;">Dear {r_name},</p>
+                <p style="color:#444;line-height:1.6;">{personalized_msg}</p>
+                <div style="background:#f9f9f9;padding:15px;border-radius:8px;margin:20px 0;">
+                    <p style="margin:5px 0;"><strong>&#128197; Date:</strong> {event_date}</p>
+                    <p style="margin:5px 0;"><strong>&#128336; Time:</strong> {event_time}</p>
+                    <p style="margin:5px 0;"><strong>&#128205; Venue:</strong> {venue}</p>
+                </div>
+                <div style="text-align:center;margin:25px 0;">
+                    <p style="color:#666;margin-bottom:15px;">Please let us know if you can attend:</p>
+                    <a href="mailto:{sender_address}?subject=RSVP%20YES%20-%20{event_name}%20-%20{r_name}&body=I%20will%20attend!%0A%0AName:%20{r_name}%0AAdults:%20%0AKids:%20%0ADietary:%20" 
+                       style="display:inline-block;background:#4CAF50;color:white;padding:12px 30px;text-decoration:none;border-radius:5px;margin:5px;font-weight:bold;">
+                        &#9989; Yes, I'll Attend
+                    </a>
+                    <a href="mailto:{sender_address}?subject=RSVP%20MAYBE%20-%20{event_name}%20-%20{r_name}&body=I%20might%20attend.%0A%0AName:%20{r_name}" 
+                       style="display:inline-block;background:#FF9800;color:white;padding:12px 30px;text-decoration:none;border-radius:5px;margin:5px;font-weight:bold;">
+                        &#129300; Maybe
+                    </a>
+                    <a href="mailto:{sender_address}?subject=RSVP%20NO%20-%20{event_name}%20-%20{r_name}&body=Sorry,%20I%20cannot%20attend.%0A%0AName:%20{r_name}" 
+                       style="display:inline-block;background:#f44336;color:white;padding:12px 30px;text-decoration:none;border-radius:5px;margin:5px;font-weight:bold;">
+                        &#10060; Can't Make It
+                    </a>
+                </div>
+                {details_note}
+            </div>
+            <div style="background:#333;padding:15px;text-align:center;border-radius:0 0 10px 10px;">
+                <p style="color:#aaa;margin:0;font-size:12px;">Bengali Association of North Florida (BANF) &#8226; Jacksonville, FL</p>
+                <p style="color:#aaa;margin:5px 0 0;font-size:12px;">Contact: banfjax@gmail.com</p>
+            </div>
+        </div>
+        """)
+
+EVITE_TEXT = Template("""
+BANF Invitation - {event_name}
+
+Dear {r_name},
+
+{personalized_msg}
+
+&#128197; Date: {event_date}
+&#128336; Time: {event_time}
+&#128205; Venue: {venue}
+
+Please reply to this email with:
+- YES / MAYBE / NO
+- Number of adults and kids attending
+- Any dietary requirements
+
+Thank you!
+BANF - Bengali Association of North Florida
+""")
+
+
+def _part_headers(subtype):
+    """Header blocks MIMEText writes for an ASCII (7bit) and a UTF-8 (base64) part"""
+    ascii_headers = MIMEText("", subtype).as_string()
+    utf8_text = MIMEText("\u00e9", subtype).as_string()
+    return ascii_headers, utf8_text[:utf8_text.index("\n\n") + 2]
+
+
+_PART_HEADERS = {subtype: _part_headers(subtype) for subtype in ("plain", "html")}
+
+
+def build_message(sender, reply_to, to_addr, subject, plain_body, html_body):
+    """The evite as the email package builds it (used where the fast path doesn't apply)"""
+    msg = MIMEMultipart("alternative")
+    msg["From"] = sender
+    msg["To"] = to_addr
+    msg["Subject"] = subject
+    msg["Reply-To"] = reply_to
+
+    msg.attach(MIMEText(plain_body, "plain"))
+    msg.attach(MIMEText(html_body, "html"))
+    return msg.as_string()
+
+
+class EviteTemplate:
+    """One evite send: event fields bound, MIME envelope pre-built; render() per recipient"""
+
+    def __init__(self, sender_address, subject, event_name, event_date, event_time, venue, message,
+                 details_note=True):
+        event = {"event_name": str(event_name), "event_date": str(event_date), "event_time": str(event_time),
+                 "venue": str(venue)}
+        self.sender = f"BANF <{sender_address}>"
+        self.reply_to = sender_address
+        self.subject = subject
+        self.html = EVITE_HTML.bind(sender_address=sender_address,
+                                    details_note=DETAILS_NOTE if details_note else "", **event)
+        self.text = EVITE_TEXT.bind(**event)
+        self.message = Template(message, _MESSAGE_SLOT_RE).bind(
+            eventName=event_name, eventDate=event_date, venue=venue, eventTime=event_time)
+
+        # Flatten a prototype with sentinel slots once; every recipient reuses
+        # its headers, boundary and part headers
+        token = uuid.uuid4().hex
+        slot_re = re.compile(token + r'(\w+)' + token)
+        slot = {name: f"{token}{name}{token}" for name in ("to", "plain_part", "html_part")}
+        proto = MIMEMultipart("alternative")
+        proto["From"] = self.sender
+        proto["To"] = slot["to"]
+        proto["Subject"] = subject
+        proto["Reply-To"] = sender_address
+        proto.attach(MIMEText(slot["plain_part"], "plain"))
+        proto.attach(MIMEText(slot["html_part"], "html"))
+        flat = proto.as_string()
+        for subtype in ("plain", "html"):
+            flat = flat.replace(_PART_HEADERS[subtype][0] + slot[f"{subtype}_part"], slot[f"{subtype}_part"])
+        self.boundary = proto.get_boundary()
+        self.envelope = Template(flat, slot_re)
+
+    def bodies(self, name):
+        """(plain, html) bodies for one recipient"""
+        values = {"r_name": name, "personalized_msg": self.message.render({"memberName": name})}
+        return self.text.render(values), self.html.render(values)
+
+    def render(self, name, to_addr):
+        """The full RFC822 message for one recipient"""
+        plain_body, html_body = self.bodies(name)
+        plain_part = self._encode_part("plain", plain_body)
+        html_part = self._encode_part("html", html_body)
+        # Addresses that need header encoding or folding go through the email package
+        if plain_part is None or html_part is None or not _plain_address(to_addr):
+            return build_message(self.sender, self.reply_to, to_addr, self.subject, plain_body, html_body)
+        return self.envelope.render({"to": to_addr, "plain_part": plain_part, "html_part": html_part})
+
+    def _encode_part(self, subtype, text):
+        if not text.isascii():
+            return _PART_HEADERS[subtype][1] + base64mime.body_encode(text.encode("utf-8"))
+        # 7bit: the generator writes \n line endings, and the boundary must not occur in the body
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        if self.boundary in text:
+            return None
+        return _PART_HEADERS[subtype][0] + text
+
+
+def _plain_address(addr):
+    return addr.isascii() and len(addr) <= 70 and not any(c.isspace() for c in addr)
+
+
+@lru_cache(maxsize=16)
+def compile_evite(sender_address, subject, event_name, event_date, event_time, venue, message, details_note=True):
+    """EviteTemplate for these fields, reused when the same evite goes out again (e.g. to another group)"""
+    return EviteTemplate(sender_address, subject, event_name, event_date, event_time, venue, message, details_note)
@@ -20,19 +20,32 @@ Usage:
 
 from flask import Flask, request, jsonify
 from flask_cors import CORS
-import imaplib
 import smtplib
+import csv
 import email
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.header import decode_header
-import json
+import html
+import io
 import os
 import re
+import threading
+import time
 import traceback
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+import contact_store
+import evite_template
+import imap_client
+import leader
+import mail_index
+import mail_jobs
+import message_cache
+import rsvp_store
+import smtp_client
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -41,54 +54,100 @@ CORS(app)  # Allow cross-origin for frontend
 # ====== CONFIGURATION ======
 GMAIL_ADDRESS = os.getenv("GMAIL_ADDRESS", "banfjax@gmail.com")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD", "skmxlbejaryowvkt")  # Gmail App Password
-IMAP_SERVER = "imap.gmail.com"
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
-
-# Contact groups stored in-memory (persistent file-based in production)
+IMAP_SERVER = os.getenv("IMAP_SERVER", "imap.gmail.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", "0")) or None  # None = library default (993)
+IMAP_USE_SSL = os.getenv("IMAP_USE_SSL", "1") != "0"  # set 0 for a local IMAP stand-in
+IMAP_TIMEOUT = float(os.getenv("IMAP_TIMEOUT", "60"))  # seconds per socket read; a hung server can't pin a worker
+IMAP_POOL_SIZE = int(os.getenv("IMAP_POOL_SIZE", "4"))  # Gmail allows ~15 concurrent sessions
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "1") != "0"  # set 0 for a local SMTP stand-in
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "3"))
+MAIL_JOB_WORKERS = int(os.getenv("MAIL_JOB_WORKERS", str(SMTP_POOL_SIZE)))
+MAIL_RATE_PER_MINUTE = float(os.getenv("MAIL_RATE_PER_MINUTE", "60"))  # stay under Gmail's daily quota
+MESSAGE_CACHE_MEMORY_MB = int(os.getenv("MESSAGE_CACHE_MEMORY_MB", "32"))  # parsed messages in RAM
+MESSAGE_CACHE_DISK_MB = int(os.getenv("MESSAGE_CACHE_DISK_MB", "256"))  # raw messages in GMAIL_DB_PATH
+MESSAGE_CACHE_MAX_AGE_DAYS = int(os.getenv("MESSAGE_CACHE_MAX_AGE_DAYS", "30"))
+MAIL_INDEX_SYNC_BATCH = int(os.getenv("MAIL_INDEX_SYNC_BATCH", "200"))  # messages indexed per pooled-session checkout
+MAIL_INDEX_SYNC_INTERVAL = int(os.getenv("MAIL_INDEX_SYNC_INTERVAL", "60"))  # seconds between background index/RSVP syncs
+MAIL_INDEX_FOLDERS = [f.strip() for f in os.getenv("MAIL_INDEX_FOLDERS", "INBOX").split(",") if f.strip()]
+RSVP_SYNC_BATCH = int(os.getenv("RSVP_SYNC_BATCH", "50"))  # RSVP replies read inside an rsvp-check request
+GMAIL_DB_PATH = os.getenv("GMAIL_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "gmail_service.db"))
+
+# Contact groups live in GMAIL_DB_PATH; this legacy file is imported once on first start
 CONTACTS_FILE = os.path.join(os.path.dirname(__file__), "gmail_contacts.json")
-
-
-def load_contacts():
-    """Load contact groups from file"""
-    if os.path.exists(CONTACTS_FILE):
-        with open(CONTACTS_FILE, 'r') as f:
-            return json.load(f)
-    return {
-        "groups": {
-            "EC Members": {
-                "description": "Executive Committee Members",
-                "contacts": [
-                    {"name": "Admin Test", "email": "admin@test.com"},
-                    {"name": "Priya Sen", "email": "events@banf.org"},
-                    {"name": "Amit Roy", "email": "sponsor@banf.org"}
-                ]
-            },
-            "All Members": {
-                "description": "All BANF Members",
-                "contacts": []
-            },
-            "Volunteers": {
-                "description": "Event Volunteers",
-                "contacts": []
-            }
+DEFAULT_CONTACT_GROUPS = {
+    "groups": {
+        "EC Members": {
+            "description": "Executive Committee Members",
+            "contacts": [
+                {"name": "Admin Test", "email": "admin@test.com"},
+                {"name": "Priya Sen", "email": "events@banf.org"},
+                {"name": "Amit Roy", "email": "sponsor@banf.org"}
+            ]
+        },
+        "All Members": {
+            "description": "All BANF Members",
+            "contacts": []
+        },
+        "Volunteers": {
+            "description": "Event Volunteers",
+            "contacts": []
         }
     }
+}
 
-
-def save_contacts(data):
-    """Save contact groups to file"""
-    with open(CONTACTS_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+contacts_store = contact_store.ContactStore(GMAIL_DB_PATH, import_path=CONTACTS_FILE, seed=DEFAULT_CONTACT_GROUPS)
 
 
 # ====== IMAP HELPER FUNCTIONS ======
 
 def get_imap_connection():
     """Create IMAP connection to Gmail"""
-    mail = imaplib.IMAP4_SSL(IMAP_SERVER)
-    mail.login(GMAIL_ADDRESS, GMAIL_APP_PASSWORD)
-    return mail
+    return imap_client.connect(IMAP_SERVER, GMAIL_ADDRESS, GMAIL_APP_PASSWORD,
+                               port=IMAP_PORT, use_ssl=IMAP_USE_SSL, timeout=IMAP_TIMEOUT)
+
+
+# Authenticated sessions shared across requests (avoids TLS + LOGIN per call)
+imap_pool = imap_client.IMAPPool(get_imap_connection, max_size=IMAP_POOL_SIZE)
+
+
+def get_smtp_connection():
+    """Create authenticated SMTP connection to Gmail (with timeout to avoid hanging)"""
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=15)
+    server.ehlo()
+    if SMTP_STARTTLS:
+        server.starttls()
+        server.ehlo()
+    if server.has_extn('auth'):
+        server.login(GMAIL_ADDRESS, GMAIL_APP_PASSWORD)
+    return server
+
+
+# Sessions reused across recipients and requests (avoids STARTTLS + LOGIN per email)
+smtp_pool = smtp_client.SMTPPool(get_smtp_connection, max_size=SMTP_POOL_SIZE)
+
+# Bulk sends (evites) are queued here and drained by background workers.
+# Delivery and the search-index/RSVP sync run in one process only (the leader), so
+# MAIL_RATE_PER_MINUTE holds however many workers serve the API.
+job_queue = mail_jobs.MailJobQueue(GMAIL_DB_PATH, smtp_pool.send, GMAIL_ADDRESS,
+                                   workers=MAIL_JOB_WORKERS, rate_per_minute=MAIL_RATE_PER_MINUTE,
+                                   autostart=False)
+background_leader = leader.LeaderLock(GMAIL_DB_PATH + ".background.lock")
+background_stop = threading.Event()
+
+
+def _lead_background():
+    job_queue.start()
+    threading.Thread(target=mail_syncer, args=(background_stop,), name="mail-sync", daemon=True).start()
+
+
+def start_background():
+    """
+    Campaign for the background leader lock; the winner drains the job
+    queue and keeps the search index and RSVP store synced. Safe to call in every worker.
+    """
+    background_leader.elect(_lead_background)
 
 
 def decode_email_header(header_value):
@@ -171,16 +230,169 @@ def parse_email_message(msg, msg_id):
     }
 
 
+def parse_raw_message(raw):
+    """Parse RFC822 bytes; the caller fills in the sequence-number id"""
+    return parse_email_message(email.message_from_bytes(raw), "")
+
+
+# Parsed messages keyed by (folder, UIDVALIDITY, UID): reopening mail skips FETCH + MIME parsing
+message_store = message_cache.MessageCache(GMAIL_DB_PATH, parse_raw_message,
+                                           memory_bytes=MESSAGE_CACHE_MEMORY_MB * 1024 * 1024,
+                                           disk_bytes=MESSAGE_CACHE_DISK_MB * 1024 * 1024,
+                                           max_age=MESSAGE_CACHE_MAX_AGE_DAYS * 86400)
+
+
+def _html_text(markup):
+    return html.unescape(re.sub(r'<[^>]+>', ' ', markup))
+
+
+def index_fields(raw):
+    """(subject, from, to, date, text) for the search index; HTML is de-tagged, like IMAP BODY search sees it"""
+    parsed = parse_raw_message(raw)
+    body = parsed['body'] if parsed['body'] != parsed['body_html'][:5000] else ""
+    if re.search(r'<(?:html|body|p|div|br|table)\b', body[:2000], re.IGNORECASE):
+        body = _html_text(body)  # single-part text/html
+    html_text = _html_text(parsed['body_html']) if parsed['has_html'] else ""
+    return parsed['subject'], parsed['from'], parsed['to'], parsed['date'], f"{body}\n{html_text}".strip()
+
+
+# Local FTS5 index for search, fed by UID sync
+search_index = mail_index.MailIndex(GMAIL_DB_PATH, index_fields, sync_batch=MAIL_INDEX_SYNC_BATCH)
+
+
+def index_ready(conn, folder):
+    """True once the background sync has indexed the whole folder; never touches IMAP"""
+    return conn.uidvalidity is not None and search_index.is_ready(folder, conn.uidvalidity)
+
+
+def sync_search_index_once(stop=None):
+    """
+    Index new mail in every synced folder (MAIL_INDEX_FOLDERS plus any
+    folder searched so far) until each has caught up. Each batch borrows
+    a pooled session and gives it back, so a first backfill of a big
+    mailbox never keeps one from requests for long. Returns messages indexed.
+    """
+    indexed = 0
+    for folder in search_index.folders(MAIL_INDEX_FOLDERS):
+        while not (stop and stop.is_set()):
+            with imap_pool.connection() as conn:
+                conn.select(folder, readonly=True)
+                if conn.uidvalidity is None:
+                    break
+                state = search_index.sync(conn.mail, folder, conn.uidvalidity)
+            indexed += state['indexed']
+            if state['busy'] or not state['pending']:
+                break
+    return indexed
+
+
+def sync_rsvps_once(stop=None):
+    """Read new RSVP replies in batches until the store has caught up. Returns replies read."""
+    read = 0
+    while not (stop and stop.is_set()):
+        with imap_pool.connection() as conn:
+            conn.select("INBOX", readonly=True)
+            if conn.uidvalidity is None:
+                break
+            state = rsvp_tally.sync(conn.mail, conn.uidvalidity)
+        read += state['read']
+        if state['busy'] or not state['pending']:
+            break
+    return read
+
+
+def mail_syncer(stop):
+    """Background thread (leader only) that keeps the search index and RSVP store caught up until `stop` is set"""
+    print(f"[SYNC] Search index and RSVP sync started (every {MAIL_INDEX_SYNC_INTERVAL}s)")
+    while not stop.is_set():
+        for sync_once in (sync_search_index_once, sync_rsvps_once):
+            try:
+                sync_once(stop)
+            except Exception as e:
+                print(f"[SYNC] {sync_once.__name__} failed (will retry): {e}")
+        stop.wait(MAIL_INDEX_SYNC_INTERVAL)
+
+
+def search_local(conn, folder, query, limit, offset=0, newest_first=False):
+    """
+    Index search mapped back to current sequence numbers: (total, [(seq, hit)]).
+    Hits whose UID has been expunged are dropped from the index.
+    """
+    total, hits = search_index.search(folder, conn.uidvalidity, query, limit, offset, newest_first)
+    seqs = imap_client.uid_to_seq(conn.mail, [h['uid'] for h in hits]) if hits else {}
+    gone = [h['uid'] for h in hits if h['uid'] not in seqs]
+    if gone:
+        search_index.remove(folder, conn.uidvalidity, gone)
+    return total - len(gone), [(seqs[h['uid']], h) for h in hits if h['uid'] in seqs]
+
+
+# RSVP replies keyed by (event, sender) with trigger-maintained totals
+rsvp_tally = rsvp_store.RSVPStore(GMAIL_DB_PATH)
+
+
+def fetch_parsed(conn, folder, seq_ids):
+    """
+    Parsed messages for sequence numbers in the selected `folder`, as
+    {seq: dict or Exception}; messages the server didn't return are
+    absent. One FETCH (UID) maps them to cache keys and only cache
+    misses download RFC822.
+    """
+    seqs = [int(i) for i in seq_ids]
+    uid_by_seq = {seq: attrs['UID'] for seq, attrs in imap_client.fetch_messages(conn.mail, seqs, "(UID)")
+                  if 'UID' in attrs}
+    uidvalidity = conn.uidvalidity
+    keys = {seq: (folder, uidvalidity, uid) for seq, uid in uid_by_seq.items()}
+    # Without UIDVALIDITY a UID isn't a stable key, so nothing is cached
+    found = message_store.get_many(list(keys.values())) if uidvalidity is not None else {}
+
+    misses = [uid for seq, uid in uid_by_seq.items() if keys[seq] not in found]
+    for uid, attrs in imap_client.fetch_messages(conn.mail, misses, uid=True):
+        key = (folder, uidvalidity, uid)
+        try:
+            if attrs.get('RFC822') is None:
+                raise ValueError("Message not returned by server")
+            found[key] = (message_store.put(key, attrs['RFC822']) if uidvalidity is not None
+                          else parse_raw_message(attrs['RFC822']))
+        except Exception as e:
+            found[key] = e
+
+    return {seq: (found[key] if isinstance(found[key], Exception) else dict(found[key], id=str(seq)))
+            for seq, key in keys.items() if key in found}
+
+
+def fetch_summaries(conn, seq_ids):
+    """
+    List-view rows for sequence numbers as {seq: dict}, from one FETCH of
+    ENVELOPE/FLAGS/RFC822.SIZE/BODYSTRUCTURE; no message body is downloaded.
+    """
+    summaries = {}
+    for seq, attrs in imap_client.fetch_messages(conn.mail, seq_ids, imap_client.SUMMARY_FETCH):
+        summary = imap_client.envelope_summary(attrs)
+        summary.update(id=str(seq), uid=attrs.get('UID'), subject=decode_email_header(summary['subject']),
+                       seen='\\Seen' in summary['flags'])
+        summary['from'] = decode_email_header(summary['from'])
+        summary['to'] = decode_email_header(summary['to'])
+        summaries[seq] = summary
+    return summaries
+
+
+def invalidate_cached(conn, folder, email_id):
+    """Drop a message from the cache before its flags change or it is expunged"""
+    uids = [attrs['UID'] for _, attrs in imap_client.fetch_messages(conn.mail, [email_id], "(UID)") if 'UID' in attrs]
+    if uids and conn.uidvalidity is not None:
+        message_store.invalidate(folder, conn.uidvalidity, uids)
+    return uids
+
+
 # ====== API ROUTES ======
 
 @app.route('/api/gmail/status', methods=['GET'])
 def gmail_status():
     """Check Gmail connection status"""
     try:
-        mail = get_imap_connection()
-        status, data = mail.select("INBOX", readonly=True)
-        msg_count = int(data[0])
-        mail.logout()
+        with imap_pool.connection() as conn:
+            status, data = conn.mail.status("INBOX", "(MESSAGES)")
+        msg_count = int(re.search(rb'MESSAGES\s+(\d+)', data[0]).group(1))
         return jsonify({
             "connected": True,
             "email": GMAIL_ADDRESS,
@@ -203,46 +415,58 @@ def get_inbox():
     per_page = int(request.args.get('per_page', 20))
     search = request.args.get('search', '')
     folder = request.args.get('folder', 'INBOX')
+    source = request.args.get('source', 'index')  # 'imap' forces server-side SEARCH
+    view = request.args.get('view', 'full')  # 'summary': envelope fields only, no bodies
+    start = (page - 1) * per_page
+    end = start + per_page
 
     try:
-        mail = get_imap_connection()
-        mail.select(folder, readonly=True)
-
-        # Search
-        if search:
-            criteria = f'(OR (SUBJECT "{search}") (FROM "{search}") (BODY "{search}"))'
-            status, msg_ids = mail.search(None, criteria)
-        else:
-            status, msg_ids = mail.search(None, "ALL")
-
-        all_ids = msg_ids[0].split()
-        all_ids.reverse()  # Newest first
-        total = len(all_ids)
-
-        # Pagination
-        start = (page - 1) * per_page
-        end = start + per_page
-        page_ids = all_ids[start:end]
-
-        emails = []
-        for msg_id in page_ids:
-            try:
-                status, msg_data = mail.fetch(msg_id, "(RFC822)")
-                raw_email = msg_data[0][1]
-                msg = email.message_from_bytes(raw_email)
-                parsed = parse_email_message(msg, msg_id.decode())
-                emails.append(parsed)
-            except Exception as e:
-                emails.append({"id": msg_id.decode(), "error": str(e)})
-
-        mail.logout()
+        with imap_pool.connection() as conn:
+            mail = conn.mail
+            conn.select(folder, readonly=True)
+
+            # Search: local index once it has caught up, else server-side
+            if search and source != 'imap' and index_ready(conn, folder):
+                source = 'index'
+                total, hits = search_local(conn, folder, search, per_page, start, newest_first=True)
+                page_ids = [str(seq).encode() for seq, _ in hits]
+            else:
+                source = 'imap'
+                if search:
+                    criteria = f'(OR (OR (SUBJECT "{search}") (FROM "{search}")) (BODY "{search}"))'
+                    status, msg_ids = mail.search(None, criteria)
+                else:
+                    status, msg_ids = mail.search(None, "ALL")
+
+                all_ids = msg_ids[0].split()
+                all_ids.reverse()  # Newest first
+                total = len(all_ids)
+
+                # Pagination
+                page_ids = all_ids[start:end]
+
+            # Cached where possible, one batched FETCH for the rest, then newest-first order
+            if view == 'summary':
+                parsed_by_id = fetch_summaries(conn, page_ids)
+            else:
+                parsed_by_id = fetch_parsed(conn, folder, page_ids)
+
+            emails = []
+            for msg_id in page_ids:
+                parsed = parsed_by_id.get(int(msg_id), ValueError("Message not returned by server"))
+                if isinstance(parsed, Exception):
+                    emails.append({"id": msg_id.decode(), "error": str(parsed)})
+                else:
+                    emails.append(parsed)
 
         return jsonify({
             "emails": emails,
             "total": total,
             "page": page,
             "per_page": per_page,
-            "total_pages": (total + per_page - 1) // per_page
+            "total_pages": (total + per_page - 1) // per_page,
+            "view": view,
+            "source": source if search else None
         })
 
     except Exception as e:
@@ -255,18 +479,16 @@ def get_email(email_id):
     folder = request.args.get('folder', 'INBOX')
 
     try:
-        mail = get_imap_connection()
-        mail.select(folder, readonly=True)
+        with imap_pool.connection() as conn:
+            mail = conn.mail
+            conn.select(folder, readonly=True)
 
-        status, msg_data = mail.fetch(email_id.encode(), "(RFC822)")
-        if status != 'OK':
-            return jsonify({"error": "Email not found"}), 404
+            parsed = fetch_parsed(conn, folder, [email_id]).get(int(email_id))
+            if parsed is None:
+                return jsonify({"error": "Email not found"}), 404
+            if isinstance(parsed, Exception):
+                raise parsed
 
-        raw_email = msg_data[0][1]
-        msg = email.message_from_bytes(raw_email)
-        parsed = parse_email_message(msg, email_id)
-
-        mail.logout()
         return jsonify(parsed)
 
     except Exception as e:
@@ -277,9 +499,9 @@ def get_email(email_id):
 def get_folders():
     """Get list of Gmail folders/labels"""
     try:
-        mail = get_imap_connection()
-        status, folders = mail.list()
-        mail.logout()
+        with imap_pool.connection() as conn:
+            mail = conn.mail
+            status, folders = mail.list()
 
         folder_list = []
         for f in folders:
@@ -335,12 +557,8 @@ def send_email():
         if bcc:
             recipients.extend([addr.strip() for addr in bcc.split(',')])
 
-        # Send via SMTP (with timeout to avoid hanging)
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=15) as server:
-            server.ehlo()
-            server.starttls()
-            server.login(GMAIL_ADDRESS, GMAIL_APP_PASSWORD)
-            server.sendmail(GMAIL_ADDRESS, recipients, msg.as_string())
+        # Send via a pooled SMTP session
+        smtp_pool.send(GMAIL_ADDRESS, recipients, msg.as_string())
 
         return jsonify({
             "success": True,
@@ -375,202 +593,83 @@ def send_evite():
     if not recipients or not event_name:
         return jsonify({"error": "Missing required fields: recipients, event_name"}), 400
 
-    sent_count = 0
-    failed = []
+    # Event fields, message placeholders and MIME headers are compiled once per send
+    evite = evite_template.compile_evite(GMAIL_ADDRESS, subject, event_name, event_date, event_time, venue,
+                                         message, bool(collect_dietary or collect_kids))
+    messages = []
 
     for recipient in recipients:
         r_name = recipient.get('name', 'Member')
         r_email = recipient.get('email', '')
         if not r_email:
             continue
+        messages.append((r_email, evite.render(r_name, r_email)))
 
-        # Personalize message
-        personalized_msg = message.replace('{memberName}', r_name)\
-                                   .replace('{eventName}', event_name)\
-                                   .replace('{eventDate}', event_date)\
-                                   .replace('{venue}', venue)\
-                                   .replace('{eventTime}', event_time)
-
-        # Build HTML email
-        html_body = f"""
-        <div style="max-width:600px;margin:0 auto;font-family:Arial,sans-serif;">
-            <div style="background:linear-gradient(135deg,#ff6b35,#f7c948);padding:30px;text-align:center;border-radius:10px 10px 0 0;">
-                <h1 style="color:white;margin:0;">&#127799; BANF Invitation</h1>
-                <p style="color:rgba(255,255,255,0.9);margin:5px 0 0;">Bengali Association of North Florida</p>
-            </div>
-            <div style="background:#fff;padding:30px;border:1px solid #eee;">
-                <h2 style="color:#333;">{event_name}</h2>
-                <p style="color:#666;">Dear {r_name},</p>
-                <p style="color:#444;line-height:1.6;">{personalized_msg}</p>
-                <div style="background:#f9f9f9;padding:15px;border-radius:8px;margin:20px 0;">
-                    <p style="margin:5px 0;"><strong>&#128197; Date:</strong> {event_date}</p>
-                    <p style="margin:5px 0;"><strong>&#128336; Time:</strong> {event_time}</p>
-                    <p style="margin:5px 0;"><strong>&#128205; Venue:</strong> {venue}</p>
-                </div>
-                <div style="text-align:center;margin:25px 0;">
-                    <p style="color:#666;margin-bottom:15px;">Please let us know if you can attend:</p>
-                    <a href="mailto:{GMAIL_ADDRESS}?subject=RSVP%20YES%20-%20{event_name}%20-%20{r_name}&body=I%20will%20attend!%0A%0AName:%20{r_name}%0AAdults:%20%0AKids:%20%0ADietary:%20" 
-                       style="display:inline-block;background:#4CAF50;color:white;padding:12px 30px;text-decoration:none;border-radius:5px;margin:5px;font-weight:bold;">
-                        &#9989; Yes, I'll Attend
-                    </a>
-                    <a href="mailto:{GMAIL_ADDRESS}?subject=RSVP%20MAYBE%20-%20{event_name}%20-%20{r_name}&body=I%20might%20attend.%0A%0AName:%20{r_name}" 
-                       style="display:inline-block;background:#FF9800;color:white;padding:12px 30px;text-decoration:none;border-radius:5px;margin:5px;font-weight:bold;">
-                        &#129300; Maybe
-                    </a>
-                    <a href="mailto:{GMAIL_ADDRESS}?subject=RSVP%20NO%20-%20{event_name}%20-%20{r_name}&body=Sorry,%20I%20cannot%20attend.%0A%0AName:%20{r_name}" 
-                       style="display:inline-block;background:#f44336;color:white;padding:12px 30px;text-decoration:none;border-radius:5px;margin:5px;font-weight:bold;">
-                        &#10060; Can't Make It
-                    </a>
-                </div>
-                {"<p style='color:#888;font-size:14px;'>Please include: number of adults, kids, and any dietary requirements in your reply.</p>" if collect_dietary or collect_kids else ""}
-            </div>
-            <div style="background:#333;padding:15px;text-align:center;border-radius:0 0 10px 10px;">
-                <p style="color:#aaa;margin:0;font-size:12px;">Bengali Association of North Florida (BANF) &#8226; Jacksonville, FL</p>
-                <p style="color:#aaa;margin:5px 0 0;font-size:12px;">Contact: banfjax@gmail.com</p>
-            </div>
-        </div>
-        """
-
-        plain_body = f"""
-BANF Invitation - {event_name}
-
-Dear {r_name},
-
-{personalized_msg}
-
-&#128197; Date: {event_date}
-&#128336; Time: {event_time}
-&#128205; Venue: {venue}
-
-Please reply to this email with:
-- YES / MAYBE / NO
-- Number of adults and kids attending
-- Any dietary requirements
-
-Thank you!
-BANF - Bengali Association of North Florida
-"""
+    if not messages:
+        return jsonify({"error": "No recipients with an email address"}), 400
 
-        try:
-            msg = MIMEMultipart("alternative")
-            msg["From"] = f"BANF <{GMAIL_ADDRESS}>"
-            msg["To"] = r_email
-            msg["Subject"] = subject
-            msg["Reply-To"] = GMAIL_ADDRESS
-
-            msg.attach(MIMEText(plain_body, "plain"))
-            msg.attach(MIMEText(html_body, "html"))
-
-            with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=15) as server:
-                server.ehlo()
-                server.starttls()
-                server.login(GMAIL_ADDRESS, GMAIL_APP_PASSWORD)
-                server.sendmail(GMAIL_ADDRESS, [r_email], msg.as_string())
-
-            sent_count += 1
-
-        except smtplib.SMTPAuthenticationError as e:
-            failed.append({"email": r_email, "error": "Gmail auth failed. Use an App Password (see https://myaccount.google.com/apppasswords)"})
-        except Exception as e:
-            failed.append({"email": r_email, "error": str(e)})
+    # Delivery happens in the background; poll /api/gmail/jobs/<id> for progress
+    start_background()
+    job_id = job_queue.submit("evite", messages, meta={"event_name": event_name, "subject": subject})
 
     return jsonify({
-        "success": sent_count > 0,
-        "sent_count": sent_count,
-        "failed_count": len(failed),
-        "failed": failed,
+        "success": True,
+        "job_id": job_id,
+        "status": "queued",
+        "queued_count": len(messages),
+        "status_url": f"/api/gmail/jobs/{job_id}",
         "timestamp": datetime.now().isoformat()
-    })
+    }), 202
+
+
+@app.route('/api/gmail/jobs/<job_id>', methods=['GET'])
+def get_mail_job(job_id):
+    """Progress of a background send job: sent/failed/pending counts"""
+    job = job_queue.get_job(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
 
 @app.route('/api/gmail/rsvp-check', methods=['GET'])
 def check_rsvp_replies():
-    """Check inbox for RSVP replies to evites"""
+    """
+    RSVP replies to evites and their counts over the last `days_back`
+    days (default 30; 0 = all time, served from the running totals).
+    A local read: the background sync pulls new replies from INBOX.
+    `refresh=1` also reads up to RSVP_SYNC_BATCH new replies first,
+    leaving any larger backlog to the background sync (`pending`).
+    Replies without a usable Date header are dated by their arrival.
+    """
     event_name = request.args.get('event_name', '')
-    days_back = int(request.args.get('days_back', 30))
+    days_back = request.args.get('days_back', 30, type=int)
+    refresh = request.args.get('refresh', '0') == '1'
 
     try:
-        mail = get_imap_connection()
-        mail.select("INBOX", readonly=True)
-
-        # Search for RSVP replies
-        since_date = (datetime.now() - timedelta(days=days_back)).strftime("%d-%b-%Y")
-        search_criteria = f'(SINCE "{since_date}" SUBJECT "RSVP")'
-        if event_name:
-            search_criteria = f'(SINCE "{since_date}" SUBJECT "RSVP" SUBJECT "{event_name}")'
-
-        status, msg_ids = mail.search(None, search_criteria)
-        all_ids = msg_ids[0].split()
-
-        rsvps = []
-        for msg_id in all_ids:
-            try:
-                status, msg_data = mail.fetch(msg_id, "(RFC822)")
-                raw_email = msg_data[0][1]
-                msg = email.message_from_bytes(raw_email)
-
-                subject = decode_email_header(msg.get("Subject", ""))
-                from_addr = decode_email_header(msg.get("From", ""))
-                date_str = msg.get("Date", "")
-
-                # Parse RSVP status from subject
-                subject_upper = subject.upper()
-                if "RSVP YES" in subject_upper:
-                    rsvp_status = "attending"
-                elif "RSVP MAYBE" in subject_upper:
-                    rsvp_status = "maybe"
-                elif "RSVP NO" in subject_upper:
-                    rsvp_status = "not_attending"
-                else:
-                    rsvp_status = "unknown"
-
-                # Get body for details
-                body = ""
-                if msg.is_multipart():
-                    for part in msg.walk():
-                        if part.get_content_type() == "text/plain":
-                            payload = part.get_payload(decode=True)
-                            if payload:
-                                body = payload.decode(part.get_content_charset() or 'utf-8', errors='replace')
-                            break
-                else:
-                    payload = msg.get_payload(decode=True)
-                    if payload:
-                        body = payload.decode(msg.get_content_charset() or 'utf-8', errors='replace')
-
-                # Extract name from subject (RSVP YES - EventName - MemberName)
-                name_match = re.search(r'RSVP\s+\w+\s*-\s*[^-]+-\s*(.+)', subject, re.IGNORECASE)
-                member_name = name_match.group(1).strip() if name_match else from_addr
-
-                # Parse adults/kids from body
-                adults_match = re.search(r'Adults?:\s*(\d+)', body, re.IGNORECASE)
-                kids_match = re.search(r'Kids?:\s*(\d+)', body, re.IGNORECASE)
-                dietary_match = re.search(r'Dietary:\s*(.+)', body, re.IGNORECASE)
-
-                rsvps.append({
-                    "from": from_addr,
-                    "name": member_name,
-                    "status": rsvp_status,
-                    "subject": subject,
-                    "date": date_str,
-                    "adults": int(adults_match.group(1)) if adults_match else None,
-                    "kids": int(kids_match.group(1)) if kids_match else None,
-                    "dietary": dietary_match.group(1).strip() if dietary_match else None,
-                    "raw_body": body[:500]
-                })
-
-            except Exception:
-                pass
+        synced = None
+        if refresh:
+            with imap_pool.connection() as conn:
+                conn.select("INBOX", readonly=True)
+                if conn.uidvalidity is not None:
+                    synced = rsvp_tally.sync(conn.mail, conn.uidvalidity, limit=RSVP_SYNC_BATCH)
 
-        mail.logout()
+        since = (datetime.now() - timedelta(days=days_back)).timestamp() if days_back else None
+        rsvps = rsvp_tally.replies(event_name, since=since)
+        tally = rsvp_tally.tally(event_name, since=since)
 
         return jsonify({
             "rsvps": rsvps,
-            "total": len(rsvps),
-            "attending": len([r for r in rsvps if r["status"] == "attending"]),
-            "maybe": len([r for r in rsvps if r["status"] == "maybe"]),
-            "declined": len([r for r in rsvps if r["status"] == "not_attending"]),
-            "unknown": len([r for r in rsvps if r["status"] == "unknown"])
+            "total": tally["total"],
+            "attending": tally["attending"],
+            "maybe": tally["maybe"],
+            "declined": tally["declined"],
+            "unknown": tally["unknown"],
+            "headcount": {"adults": tally["adults"], "kids": tally["kids"]},
+            "days_back": days_back,
+            "new_replies": synced["read"] if synced else None,
+            "pending": synced["pending"] if synced else None,
+            "synced_at": rsvp_tally.synced_at(),
+            "unparsed": len(rsvp_tally.failures())
         })
 
     except Exception as e:
@@ -583,11 +682,20 @@ def delete_email(email_id):
     folder = request.args.get('folder', 'INBOX')
 
     try:
-        mail = get_imap_connection()
-        mail.select(folder)
-        mail.store(email_id.encode(), '+FLAGS', '\\Deleted')
-        mail.expunge()
-        mail.logout()
+        with imap_pool.connection() as conn:
+            mail = conn.mail
+            status, data = conn.select(folder, readonly=False)
+            if status != 'OK':
+                return jsonify({"error": f"Could not open {folder}: {data}"}), 500
+            uids = invalidate_cached(conn, folder, email_id)
+            status, data = mail.store(email_id.encode(), '+FLAGS', '\\Deleted')
+            if status != 'OK':
+                return jsonify({"error": f"Could not delete email {email_id}: {data}"}), 500
+            status, data = mail.expunge()
+            if status != 'OK':
+                return jsonify({"error": f"Could not expunge email {email_id}: {data}"}), 500
+            if conn.uidvalidity is not None:
+                search_index.remove(folder, conn.uidvalidity, uids)
         return jsonify({"success": True, "message": f"Email {email_id} deleted"})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -599,10 +707,15 @@ def mark_read(email_id):
     folder = request.args.get('folder', 'INBOX')
 
     try:
-        mail = get_imap_connection()
-        mail.select(folder)
-        mail.store(email_id.encode(), '+FLAGS', '\\Seen')
-        mail.logout()
+        with imap_pool.connection() as conn:
+            mail = conn.mail
+            status, data = conn.select(folder, readonly=False)
+            if status != 'OK':
+                return jsonify({"error": f"Could not open {folder}: {data}"}), 500
+            invalidate_cached(conn, folder, email_id)
+            status, data = mail.store(email_id.encode(), '+FLAGS', '\\Seen')
+            if status != 'OK':
+                return jsonify({"error": f"Could not mark email {email_id} read: {data}"}), 500
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -613,8 +726,7 @@ def mark_read(email_id):
 @app.route('/api/gmail/contacts', methods=['GET'])
 def get_contacts():
     """Get all contact groups"""
-    contacts = load_contacts()
-    return jsonify(contacts)
+    return jsonify(contacts_store.all_groups())
 
 
 @app.route('/api/gmail/contacts/group', methods=['POST'])
@@ -627,27 +739,16 @@ def create_group():
     if not group_name:
         return jsonify({"error": "Group name required"}), 400
 
-    contacts = load_contacts()
-    if group_name in contacts["groups"]:
+    if not contacts_store.create_group(group_name, description):
         return jsonify({"error": "Group already exists"}), 409
-
-    contacts["groups"][group_name] = {
-        "description": description,
-        "contacts": []
-    }
-    save_contacts(contacts)
     return jsonify({"success": True, "message": f"Group '{group_name}' created"})
 
 
 @app.route('/api/gmail/contacts/group/<group_name>', methods=['DELETE'])
 def delete_group(group_name):
     """Delete a contact group"""
-    contacts = load_contacts()
-    if group_name not in contacts["groups"]:
+    if not contacts_store.delete_group(group_name):
         return jsonify({"error": "Group not found"}), 404
-
-    del contacts["groups"][group_name]
-    save_contacts(contacts)
     return jsonify({"success": True, "message": f"Group '{group_name}' deleted"})
 
 
@@ -657,20 +758,58 @@ def add_to_group(group_name):
     data = request.json
     contact_list = data.get('contacts', [])  # [{name, email}]
 
-    contacts = load_contacts()
-    if group_name not in contacts["groups"]:
+    added = contacts_store.add_to_group(group_name, contact_list)
+    if added is None:
         return jsonify({"error": "Group not found"}), 404
+    return jsonify({"success": True, "added": added})
 
-    existing_emails = {c['email'] for c in contacts["groups"][group_name]["contacts"]}
-    added = 0
-    for contact in contact_list:
-        if contact.get('email') and contact['email'] not in existing_emails:
-            contacts["groups"][group_name]["contacts"].append(contact)
-            existing_emails.add(contact['email'])
-            added += 1
 
-    save_contacts(contacts)
-    return jsonify({"success": True, "added": added})
+@app.route('/api/gmail/contacts/group/<group_name>/import', methods=['POST'])
+def import_to_group(group_name):
+    """
+    Bulk-add contacts from a CSV or vCard upload, either as a multipart
+    `file` field or as the raw request body. The format comes from
+    ?format=csv|vcard, else the file name / Content-Type, else the first
+    line. The upload is parsed and written as it streams in.
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        stream, filename, content_type = upload.stream, upload.filename or '', upload.mimetype or ''
+    elif request.mimetype and request.mimetype.startswith('multipart/'):
+        return jsonify({"error": "Multipart upload needs a 'file' field"}), 400
+    else:
+        stream, filename, content_type = io.BufferedReader(request.stream), '', request.mimetype or ''
+
+    lines = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+    fmt = (request.args.get('format') or '').lower()
+    if not fmt:
+        if filename.lower().endswith(('.vcf', '.vcard')) or 'vcard' in content_type:
+            fmt = 'vcard'
+        elif filename.lower().endswith('.csv') or 'csv' in content_type:
+            fmt = 'csv'
+    first_line = lines.readline()
+    if not fmt:
+        fmt = 'vcard' if first_line.strip().upper() == 'BEGIN:VCARD' else 'csv'
+    if fmt not in ('csv', 'vcard'):
+        return jsonify({"error": "format must be csv or vcard"}), 400
+
+    # Put the sniffed line back in front of the rest of the stream
+    rows_in = _chain_lines(first_line, lines)
+    parse = contact_store.iter_vcard_contacts if fmt == 'vcard' else contact_store.iter_csv_contacts
+    started = time.time()
+    try:
+        result = contacts_store.import_contacts(group_name, parse(rows_in))
+    except csv.Error as e:
+        return jsonify({"error": f"Could not parse upload: {e}"}), 400
+    if result is None:
+        return jsonify({"error": "Group not found"}), 404
+    return jsonify(dict(result, success=True, format=fmt, duration_s=round(time.time() - started, 2)))
+
+
+def _chain_lines(first_line, lines):
+    if first_line:
+        yield first_line
+    yield from lines
 
 
 @app.route('/api/gmail/contacts/group/<group_name>/remove', methods=['POST'])
@@ -679,15 +818,8 @@ def remove_from_group(group_name):
     data = request.json
     email_addr = data.get('email', '')
 
-    contacts = load_contacts()
-    if group_name not in contacts["groups"]:
+    if contacts_store.remove_from_group(group_name, email_addr) is None:
         return jsonify({"error": "Group not found"}), 404
-
-    contacts["groups"][group_name]["contacts"] = [
-        c for c in contacts["groups"][group_name]["contacts"]
-        if c['email'] != email_addr
-    ]
-    save_contacts(contacts)
     return jsonify({"success": True})
 
 
@@ -699,36 +831,27 @@ def send_to_group(group_name):
     body = data.get('body', '')
     body_html = data.get('body_html', '')
 
-    contacts = load_contacts()
-    if group_name not in contacts["groups"]:
+    group_contacts = contacts_store.group_contacts(group_name)
+    if group_contacts is None:
         return jsonify({"error": "Group not found"}), 404
-
-    group_contacts = contacts["groups"][group_name]["contacts"]
     if not group_contacts:
         return jsonify({"error": "Group has no contacts"}), 400
 
-    sent = 0
-    failed = []
+    messages = []
     for contact in group_contacts:
-        try:
-            msg = MIMEMultipart("alternative")
-            msg["From"] = f"BANF <{GMAIL_ADDRESS}>"
-            msg["To"] = contact['email']
-            msg["Subject"] = subject
-
-            msg.attach(MIMEText(body, "plain"))
-            if body_html:
-                msg.attach(MIMEText(body_html, "html"))
-
-            with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-                server.ehlo()
-                server.starttls()
-                server.login(GMAIL_ADDRESS, GMAIL_APP_PASSWORD)
-                server.sendmail(GMAIL_ADDRESS, [contact['email']], msg.as_string())
-
-            sent += 1
-        except Exception as e:
-            failed.append({"email": contact['email'], "error": str(e)})
+        msg = MIMEMultipart("alternative")
+        msg["From"] = f"BANF <{GMAIL_ADDRESS}>"
+        msg["To"] = contact['email']
+        msg["Subject"] = subject
+
+        msg.attach(MIMEText(body, "plain"))
+        if body_html:
+            msg.attach(MIMEText(body_html, "html"))
+        messages.append((contact['email'], msg.as_string()))
+
+    outcomes = smtp_pool.send_many(messages, GMAIL_ADDRESS)
+    sent = sum(1 for o in outcomes if o["status"] == "sent")
+    failed = [{"email": o["email"], "error": o["error"]} for o in outcomes if o["status"] != "sent"]
 
     return jsonify({
         "success": sent > 0,
@@ -746,53 +869,81 @@ def search_emails():
     query = request.args.get('q', '')
     folder = request.args.get('folder', 'INBOX')
     limit = int(request.args.get('limit', 20))
+    source = request.args.get('source', 'index')  # 'imap' forces server-side SEARCH
 
     if not query:
         return jsonify({"error": "Search query required"}), 400
 
     try:
-        mail = get_imap_connection()
-        mail.select(folder, readonly=True)
-
-        # Build IMAP search
-        search_criteria = f'(OR (SUBJECT "{query}") (FROM "{query}") (BODY "{query}"))'
-        status, msg_ids = mail.search(None, search_criteria)
-
-        all_ids = msg_ids[0].split()
-        all_ids.reverse()
-        all_ids = all_ids[:limit]
-
-        results = []
-        for msg_id in all_ids:
-            try:
-                status, msg_data = mail.fetch(msg_id, "(RFC822)")
-                raw_email = msg_data[0][1]
-                msg = email.message_from_bytes(raw_email)
-                parsed = parse_email_message(msg, msg_id.decode())
+        with imap_pool.connection() as conn:
+            mail = conn.mail
+            conn.select(folder, readonly=True)
+
+            # Ranked local search with snippets; nothing is downloaded
+            if source != 'imap' and index_ready(conn, folder):
+                total, hits = search_local(conn, folder, query, limit)
+                results = [{"id": str(seq), "uid": hit['uid'], "subject": hit['subject'], "from": hit['from'],
+                            "to": hit['to'], "date": hit['date'], "body": hit['snippet'], "score": hit['score']}
+                           for seq, hit in hits]
+                return jsonify({"results": results, "count": len(results), "total": total, "source": "index"})
+
+            # Build IMAP search
+            search_criteria = f'(OR (OR (SUBJECT "{query}") (FROM "{query}")) (BODY "{query}"))'
+            status, msg_ids = mail.search(None, search_criteria)
+
+            all_ids = msg_ids[0].split()
+            all_ids.reverse()
+            all_ids = all_ids[:limit]
+
+            parsed_by_id = fetch_parsed(conn, folder, all_ids)
+
+            results = []
+            for msg_id in all_ids:
+                parsed = parsed_by_id.get(int(msg_id))
+                if parsed is None or isinstance(parsed, Exception):
+                    continue
                 # Trim body for search results
                 parsed['body'] = parsed['body'][:300] if parsed['body'] else ""
                 results.append(parsed)
-            except Exception:
-                pass
 
-        mail.logout()
-        return jsonify({"results": results, "count": len(results)})
+        return jsonify({"results": results, "count": len(results), "source": "imap"})
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/gmail/index/sync', methods=['POST'])
+def sync_search_index():
+    """Index every message not yet in the local search index (e.g. after first start)"""
+    data = request.get_json(silent=True) or {}
+    folder = data.get('folder', 'INBOX')
+
+    try:
+        with imap_pool.connection() as conn:
+            conn.select(folder, readonly=True)
+            if conn.uidvalidity is None:
+                return jsonify({"error": "Server did not report UIDVALIDITY; folder can't be indexed"}), 400
+            started = time.time()
+            state = search_index.sync(conn.mail, folder, conn.uidvalidity, limit=0)
+        if state['busy']:
+            return jsonify({"error": "Index sync already running"}), 409
+        return jsonify({"success": True, "folder": folder, "indexed": state['indexed'],
+                        "duration_ms": int((time.time() - started) * 1000)})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # ====== UNREAD COUNT ======
 
 @app.route('/api/gmail/unread', methods=['GET'])
 def unread_count():
     """Get unread email count"""
     try:
-        mail = get_imap_connection()
-        mail.select("INBOX", readonly=True)
-        status, msg_ids = mail.search(None, "UNSEEN")
-        count = len(msg_ids[0].split()) if msg_ids[0] else 0
-        mail.logout()
+        with imap_pool.connection() as conn:
+            mail = conn.mail
+            conn.select("INBOX", readonly=True)
+            status, msg_ids = mail.search(None, "UNSEEN")
+            count = len(msg_ids[0].split()) if msg_ids[0] else 0
         return jsonify({"unread": count})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -808,16 +959,25 @@ def health_check():
         "status": "running",
         "email": GMAIL_ADDRESS,
         "timestamp": datetime.now().isoformat(),
+        "imap_pool": imap_pool.metrics(),
+        "smtp_pool": smtp_pool.metrics(),
+        "mail_jobs": job_queue.metrics(),
+        "background_leader_pid": background_leader.holder(),
+        "worker_pid": os.getpid(),
+        "message_cache": message_store.metrics(),
+        "search_index": search_index.metrics(),
         "zelle_service": "http://localhost:5002/api/zelle/health",
         "endpoints": [
             "GET /api/gmail/status",
-            "GET /api/gmail/inbox",
+            "GET /api/gmail/inbox?view=summary",
             "GET /api/gmail/email/<id>",
             "GET /api/gmail/folders",
             "GET /api/gmail/unread",
             "GET /api/gmail/search?q=",
+            "POST /api/gmail/index/sync",
             "POST /api/gmail/send",
             "POST /api/gmail/send-evite",
+            "GET /api/gmail/jobs/<id>",
             "GET /api/gmail/rsvp-check",
             "DELETE /api/gmail/delete/<id>",
             "POST /api/gmail/mark-read/<id>",
@@ -825,6 +985,7 @@ def health_check():
             "POST /api/gmail/contacts/group",
             "DELETE /api/gmail/contacts/group/<name>",
             "POST /api/gmail/contacts/group/<name>/add",
+            "POST /api/gmail/contacts/group/<name>/import",
             "POST /api/gmail/contacts/group/<name>/remove",
             "POST /api/gmail/contacts/group/<name>/send",
             "--- Zelle Integration (port 5002) ---",
@@ -854,4 +1015,7 @@ if __name__ == '__main__':
     print("   2. Create App Password: https://myaccount.google.com/apppasswords")
     print("   3. Set GMAIL_APP_PASSWORD env var with the 16-char code")
     print()
+    # Resume queued sends now rather than on the next submit;
+    # python serve.py gmail runs the API with several worker processes
+    start_background()
     app.run(host='0.0.0.0', port=5001, debug=False)
@@ -0,0 +1,559 @@
+# -*- coding: utf-8 -*-
+"""
+BANF IMAP Helpers
+==================
+Shared IMAP plumbing for gmail_service.py and zelle_payment_service.py.
+
+UID-based sync:
+  Sequence numbers shift whenever mail is deleted, UIDs do not. A mailbox
+  checkpoint is the pair (UIDVALIDITY, last seen UID); as long as the
+  server reports the same UIDVALIDITY, `UID SEARCH UID n:*` returns only
+  mail that arrived after the checkpoint.
+
+Bulk FETCH:
+  fetch_messages() sends one FETCH per batch of ids as a compressed
+  sequence set (e.g. `41:60,75`) instead of one round-trip per message,
+  parses the nested FETCH responses (atoms, quoted strings, literals,
+  lists) into a dict per message and yields them batch by batch.
+
+Connection pool:
+  IMAPPool keeps a bounded set of logged-in sessions alive between HTTP
+  requests, checks stale ones with NOOP, reconnects dead ones and skips
+  SELECT when a session already has the requested folder open.
+
+IDLE (RFC 2177):
+  imaplib has no IDLE support, so idle_wait() speaks the command directly
+  on the connection, reading through imaplib's buffered file. Gmail ends
+  IDLE after ~29 minutes; callers should re-issue it well before that.
+"""
+
+import imaplib
+import itertools
+import re
+import select
+import ssl
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from email.utils import formataddr
+
+FETCH_BATCH_SIZE = 100  # messages per FETCH command
+
+
+def connect(host, user, password, port=None, use_ssl=True, timeout=None):
+    """Open an authenticated IMAP connection (plain TCP for local stand-ins); `timeout` applies to every socket op"""
+    cls = imaplib.IMAP4_SSL if use_ssl else imaplib.IMAP4
+    mail = cls(host, port, timeout=timeout) if port else cls(host, timeout=timeout)
+    mail.login(user, password)
+    return mail
+
+
+def _parse_int(value):
+    """Convert an IMAP response value (bytes/str/None) to int or None"""
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode(errors='replace')
+    match = re.search(r'\d+', str(value))
+    return int(match.group(0)) if match else None
+
+
+def mailbox_uid_state(mail, folder="INBOX"):
+    """
+    Return (uidvalidity, uidnext) for the selected mailbox.
+    Uses the untagged responses left by SELECT, falling back to STATUS.
+    """
+    uidvalidity = _parse_int(mail.response('UIDVALIDITY')[1][0])
+    uidnext = _parse_int(mail.response('UIDNEXT')[1][0])
+    if uidvalidity is None or uidnext is None:
+        status, data = mail.status(folder, '(UIDVALIDITY UIDNEXT)')
+        if status == 'OK' and data and data[0]:
+            text = data[0].decode(errors='replace') if isinstance(data[0], bytes) else str(data[0])
+            v_match = re.search(r'UIDVALIDITY\s+(\d+)', text)
+            n_match = re.search(r'UIDNEXT\s+(\d+)', text)
+            if uidvalidity is None and v_match:
+                uidvalidity = int(v_match.group(1))
+            if uidnext is None and n_match:
+                uidnext = int(n_match.group(1))
+    return uidvalidity, uidnext
+
+
+def uid_search(mail, criteria):
+    """Run `UID SEARCH` and return the matching UIDs as sorted ints"""
+    status, data = mail.uid('SEARCH', None, criteria)
+    if status != 'OK' or not data or not data[0]:
+        return []
+    return sorted(int(u) for u in data[0].split())
+
+
+def new_uids_since(mail, last_uid, criteria=None):
+    """
+    UIDs greater than `last_uid`. `UID n:*` always matches the newest
+    message even when it is older than n, so the result is filtered.
+    """
+    query = f'UID {int(last_uid) + 1}:*'
+    if criteria:
+        query = f'{query} {criteria}'
+    return [u for u in uid_search(mail, query) if u > last_uid]
+
+
+def sequence_set(ids):
+    """Compress UIDs or sequence numbers into an IMAP set, e.g. [1,2,3,7] -> '1:3,7'"""
+    ids = sorted(set(int(i) for i in ids))
+    if not ids:
+        return ""
+    ranges = []
+    start = prev = ids[0]
+    for u in ids[1:]:
+        if u == prev + 1:
+            prev = u
+            continue
+        ranges.append(f"{start}:{prev}" if prev != start else str(start))
+        start = prev = u
+    ranges.append(f"{start}:{prev}" if prev != start else str(start))
+    return ",".join(ranges)
+
+
+_idle_tags = itertools.count(1)
+
+
+def _idle_tag():
+    """
+    A tag for IDLE. imaplib only hands out tags through the private
+    _new_tag(), so IDLE uses its own series; tags just have to be unique
+    among commands in flight, and IDLE always runs alone.
+    """
+    return b'IDLE%d' % next(_idle_tags)
+
+
+def _response_buffered(mail):
+    """
+    True if a response line can be read without waiting on the socket:
+    imaplib reads through a buffered file, so an EXISTS that arrived in
+    the same packet as an earlier line sits in mail.file, where select()
+    on the socket can't see it. TLS may also hold a decrypted record.
+    """
+    pending = getattr(mail.sock, 'pending', None)
+    if pending and pending():
+        return True
+    # peek() returns the buffer if it holds anything; otherwise it makes one
+    # read, which must not block, so the socket goes non-blocking for it
+    timeout = mail.sock.gettimeout()
+    mail.sock.settimeout(0)
+    try:
+        return bool(mail.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        mail.sock.settimeout(timeout)
+
+
+def idle_wait(mail, timeout, should_stop=None, poll_slice=1.0):
+    """
+    Hold the selected mailbox in IDLE until the server reports new mail
+    (EXISTS), `timeout` seconds pass, or `should_stop()` returns True.
+    Always leaves IDLE with DONE. Returns True if new mail arrived.
+    """
+    tag = _idle_tag()
+    mail.send(tag + b' IDLE\r\n')
+    got_mail = False
+    while True:
+        line = mail.readline()
+        if not line:
+            raise mail.abort("connection closed before IDLE started")
+        if line.startswith(b'+'):
+            break
+        if line.startswith(tag + b' '):
+            raise mail.error(f"IDLE rejected: {line.strip()!r}")
+        if line.rstrip().upper().endswith(b'EXISTS'):
+            got_mail = True
+
+    deadline = time.monotonic() + timeout
+    while not got_mail:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (should_stop and should_stop()):
+            break
+        if not _response_buffered(mail):
+            readable, _, _ = select.select([mail.sock], [], [], min(poll_slice, remaining))
+            if not readable:
+                continue
+        line = mail.readline()
+        if not line or line.startswith(b'* BYE'):
+            raise mail.abort(f"connection closed during IDLE: {line.strip()!r}")
+        if line.rstrip().upper().endswith(b'EXISTS'):
+            got_mail = True
+
+    mail.send(b'DONE\r\n')
+    while True:
+        line = mail.readline()
+        if not line:
+            raise mail.abort("connection closed while leaving IDLE")
+        if line.startswith(tag + b' '):
+            if not line[len(tag):].strip().upper().startswith(b'OK'):
+                raise mail.error(f"IDLE failed: {line.strip()!r}")
+            break
+        if line.rstrip().upper().endswith(b'EXISTS'):
+            got_mail = True
+    return got_mail
+
+
+# ====== FETCH RESPONSE PARSING ======
+
+_OPEN = object()
+_CLOSE = object()
+
+
+class _String(bytes):
+    """Quoted string or literal (as opposed to an atom)"""
+
+
+def _scan(text):
+    """Tokenize the non-literal part of a FETCH response"""
+    i, n = 0, len(text)
+    while i < n:
+        ch = text[i:i + 1]
+        if ch in (b' ', b'\r', b'\n'):
+            i += 1
+        elif ch == b'(':
+            yield _OPEN
+            i += 1
+        elif ch == b')':
+            yield _CLOSE
+            i += 1
+        elif ch == b'"':
+            j, buf = i + 1, bytearray()
+            while j < n and text[j:j + 1] != b'"':
+                if text[j:j + 1] == b'\\':
+                    j += 1
+                buf += text[j:j + 1]
+                j += 1
+            yield _String(bytes(buf))
+            i = j + 1
+        else:
+            # Atom; section specs like BODY[HEADER.FIELDS (A B)] keep their brackets
+            j, depth = i, 0
+            while j < n:
+                c = text[j:j + 1]
+                if c == b'[':
+                    depth += 1
+                elif c == b']':
+                    depth -= 1
+                elif depth == 0 and c in (b' ', b'(', b')', b'\r', b'\n'):
+                    break
+                j += 1
+            atom = text[i:j].decode(errors='replace')
+            if atom.upper() == 'NIL':
+                yield None
+            elif atom.isdigit():
+                yield int(atom)
+            else:
+                yield atom
+            i = j
+
+
+def _tokens(data):
+    for item in data:
+        if isinstance(item, tuple):
+            head, literal = item[0], item[1]
+            yield from _scan(re.sub(rb'\{\d+\}$', b'', head))
+            yield _String(literal)
+        elif isinstance(item, bytes):
+            yield from _scan(item)
+
+
+def _parse_list(tokens, pos):
+    values = []
+    while pos < len(tokens) and tokens[pos] is not _CLOSE:
+        if tokens[pos] is _OPEN:
+            value, pos = _parse_list(tokens, pos + 1)
+            values.append(value)
+        else:
+            values.append(tokens[pos])
+            pos += 1
+    return values, pos + 1
+
+
+def parse_fetch_response(data):
+    """
+    Parse imaplib FETCH data into [(seq, {ITEM: value})]. Item names are
+    upper-cased (`UID`, `FLAGS`, `BODY[TEXT]`, ...); literals and quoted
+    strings come back as bytes, numbers as int, NIL as None.
+    """
+    tokens = list(_tokens(data))
+    messages = []
+    pos = 0
+    while pos < len(tokens):
+        tok = tokens[pos]
+        if isinstance(tok, int) and pos + 1 < len(tokens) and tokens[pos + 1] is _OPEN:
+            values, pos = _parse_list(tokens, pos + 2)
+            attrs = {}
+            for name, value in zip(values[::2], values[1::2]):
+                if isinstance(name, str):
+                    attrs[name.upper()] = value
+            messages.append((tok, attrs))
+        else:
+            pos += 1
+    return messages
+
+
+def internal_date(value):
+    """FETCH INTERNALDATE ('17-Jul-1996 02:44:25 -0700') as a Unix timestamp, or None"""
+    if isinstance(value, bytes):
+        value = value.decode(errors='replace')
+    try:
+        return datetime.strptime(str(value).strip(), "%d-%b-%Y %H:%M:%S %z").timestamp()
+    except ValueError:
+        return None
+
+
+def section(attrs, prefix):
+    """Return the first FETCH item whose name starts with `prefix` (e.g. 'BODY[HEADER')"""
+    for name, value in attrs.items():
+        if name.startswith(prefix):
+            return value
+    return None
+
+
+# ====== ENVELOPE / BODYSTRUCTURE ======
+
+SUMMARY_FETCH = "(UID FLAGS ENVELOPE RFC822.SIZE BODYSTRUCTURE)"
+
+
+def _text(value):
+    """ENVELOPE string (bytes/None) as str; RFC 2047 words are left for the caller to decode"""
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='replace')
+    return str(value)
+
+
+def envelope_addresses(addresses):
+    """ENVELOPE address list [(name adl mailbox host) ...] -> 'Name <mailbox@host>, ...'"""
+    out = []
+    for addr in addresses or []:
+        if not isinstance(addr, list) or len(addr) < 4:
+            continue
+        name, mailbox, host = _text(addr[0]), _text(addr[2]), _text(addr[3])
+        out.append(formataddr((name, f"{mailbox}@{host}" if host else mailbox)))
+    return ", ".join(out)
+
+
+def has_attachment(structure):
+    """True if any part of a BODYSTRUCTURE has an ATTACHMENT disposition, i.e. (ATTACHMENT (FILENAME ...))"""
+    if not isinstance(structure, list):
+        return False
+    if structure and isinstance(structure[0], (bytes, str)) and _text(structure[0]).upper() == 'ATTACHMENT':
+        return True
+    return any(has_attachment(value) for value in structure)
+
+
+def envelope_summary(attrs):
+    """
+    List-view fields from a SUMMARY_FETCH response: subject, from, to,
+    date, message_id (raw header text), flags, size, has_attachments.
+    """
+    env = attrs.get('ENVELOPE') or []
+    env = list(env) + [None] * (10 - len(env))
+    flags = [str(f) for f in attrs.get('FLAGS') or []]
+    return {
+        "subject": _text(env[1]),
+        "from": envelope_addresses(env[2]),
+        "to": envelope_addresses(env[5]),
+        "date": _text(env[0]),
+        "message_id": _text(env[9]),
+        "flags": flags,
+        "size": attrs.get('RFC822.SIZE') or 0,
+        "has_attachments": has_attachment(attrs.get('BODYSTRUCTURE')),
+    }
+
+
+def fetch_messages(mail, ids, items="(RFC822)", uid=False, batch_size=FETCH_BATCH_SIZE):
+    """
+    Yield (id, attrs) for `ids`, sending one FETCH per `batch_size` ids.
+    `ids` are sequence numbers, or UIDs with uid=True; the yielded id is
+    of the same kind. Results stream back a batch at a time in server
+    order, and ids the server did not return are simply absent.
+    """
+    ids = [int(i) for i in ids]
+    for start in range(0, len(ids), batch_size):
+        batch = sequence_set(ids[start:start + batch_size])
+        if uid:
+            status, data = mail.uid('FETCH', batch, items)
+        else:
+            status, data = mail.fetch(batch, items)
+        if status != 'OK':
+            raise mail.error(f"FETCH {batch} failed: {data}")
+        for seq, attrs in parse_fetch_response(data):
+            if uid:
+                if 'UID' in attrs:
+                    yield attrs['UID'], attrs
+            else:
+                yield seq, attrs
+
+
+def uid_fetch(mail, uids, items):
+    """Fetch `items` for `uids` in bulk; returns {uid: attrs}"""
+    return dict(fetch_messages(mail, uids, items, uid=True))
+
+
+def uid_to_seq(mail, uids, batch_size=FETCH_BATCH_SIZE * 10):
+    """Current sequence numbers for `uids` as {uid: seq}; expunged UIDs are absent"""
+    uids = [int(u) for u in uids]
+    seqs = {}
+    for start in range(0, len(uids), batch_size):
+        status, data = mail.uid('FETCH', sequence_set(uids[start:start + batch_size]), '(UID)')
+        if status != 'OK':
+            raise mail.error(f"FETCH UID failed: {data}")
+        seqs.update((attrs['UID'], seq) for seq, attrs in parse_fetch_response(data) if 'UID' in attrs)
+    return seqs
+
+
+# ====== CONNECTION POOL ======
+
+class PooledSession:
+    """One pooled IMAP connection plus the folder it currently has selected"""
+
+    def __init__(self, mail, count):
+        self.mail = mail
+        self.count = count  # the pool's stats counter, IMAPPool._count
+        self.selected = None  # (folder, readonly) or None
+        self.uidvalidity = None  # of the selected folder, if the server reported it
+        self.last_used = time.monotonic()
+
+    def select(self, folder="INBOX", readonly=True):
+        """SELECT/EXAMINE `folder` unless this session already has it open"""
+        key = (folder, bool(readonly))
+        if self.selected == key:
+            self.count('select_skipped')
+            return 'OK', None
+        self.selected = None
+        self.uidvalidity = None
+        status, data = self.mail.select(folder, readonly=readonly)
+        if status == 'OK':
+            self.selected = key
+            self.uidvalidity = _parse_int(self.mail.response('UIDVALIDITY')[1][0])
+        return status, data
+
+
+class IMAPPool:
+    """
+    Bounded, thread-safe pool of authenticated IMAP sessions.
+
+    `factory` returns a new logged-in imaplib connection. Sessions idle for
+    longer than `health_check_after` seconds are probed with NOOP before
+    being handed out, and one that fails the probe is replaced before the
+    caller sees it. A connection error inside the `with` block is not
+    retried: the session is discarded and the error re-raised, so the
+    next borrow gets a fresh session.
+    """
+
+    def __init__(self, factory, max_size=4, health_check_after=30, acquire_timeout=30):
+        self.factory = factory
+        self.max_size = max_size
+        self.health_check_after = health_check_after
+        self.acquire_timeout = acquire_timeout
+        self._idle = []
+        self._size = 0
+        self._cond = threading.Condition()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'waits': 0,
+            'wait_time_ms': 0.0,
+            'reconnects': 0,
+            'discarded': 0,
+            'select_skipped': 0,
+        }
+
+    def _new_session(self):
+        return PooledSession(self.factory(), self._count)
+
+    def _count(self, key, n=1):
+        with self._cond:
+            self.stats[key] += n
+
+    def _acquire(self):
+        started = time.monotonic()
+        waited = False
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                waited = True
+                remaining = self.acquire_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise TimeoutError(f"No IMAP connection free after {self.acquire_timeout}s")
+                self._cond.wait(remaining)
+            if waited:
+                self.stats['waits'] += 1
+                self.stats['wait_time_ms'] += (time.monotonic() - started) * 1000
+            if self._idle:
+                session = self._idle.pop()
+                self.stats['hits'] += 1
+            else:
+                session = None
+                self._size += 1
+                self.stats['misses'] += 1
+
+        try:
+            if session is None:
+                return self._new_session()
+            if time.monotonic() - session.last_used > self.health_check_after:
+                try:
+                    session.mail.noop()
+                except Exception:
+                    self._close(session.mail)
+                    self._count('reconnects')
+                    return self._new_session()
+            return session
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, session):
+        session.last_used = time.monotonic()
+        # Drop EXISTS/RECENT/FETCH noise so it doesn't pile up across requests
+        session.mail.untagged_responses.clear()
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    def _discard(self, session):
+        self._close(session.mail)
+        with self._cond:
+            self.stats['discarded'] += 1
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _close(mail):
+        try:
+            mail.logout()
+        except Exception:
+            pass
+
+    @contextmanager
+    def connection(self):
+        """Borrow a session: `with pool.connection() as conn: conn.select(...); conn.mail...`"""
+        session = self._acquire()
+        try:
+            yield session
+        except (imaplib.IMAP4.abort, OSError):
+            self._discard(session)
+            raise
+        except BaseException:
+            self._release(session)
+            raise
+        else:
+            self._release(session)
+
+    def metrics(self):
+        """Pool counters for health endpoints"""
+        with self._cond:
+            metrics = dict(self.stats)
+            metrics['wait_time_ms'] = round(metrics['wait_time_ms'], 1)
+            metrics.update(size=self._size, idle=len(self._idle),
+                           in_use=self._size - len(self._idle), max_size=self.max_size)
+        return metrics
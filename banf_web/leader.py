@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+BANF Leader Election
+=====================
+Run background work (the Zelle poller, bulk mail delivery, search index
+sync) in exactly one process when a service is served by several worker
+processes.
+
+Every process tries to take an exclusive, non-blocking OS lock on a file
+next to the database. The one that gets it is the leader and starts the
+background threads; the rest keep retrying. The OS drops the lock when
+the leader exits for any reason (crash, timeout kill, reload), and a
+surviving worker takes over within `retry` seconds. Nothing has to clean
+up after a dead leader.
+
+Locks are taken after the worker has started, so they must not be
+acquired in a process that forks afterwards (no gunicorn preload_app).
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+if os.name == 'nt':
+    import msvcrt
+
+    # Lock one byte past the PID text so other processes can still read it
+    _LOCK_OFFSET = 64
+
+    def _lock(fd, blocking):
+        os.lseek(fd, _LOCK_OFFSET, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+
+    def _unlock(fd):
+        os.lseek(fd, _LOCK_OFFSET, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _lock(fd, blocking):
+        fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _unlock(fd):
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+
+RETRY_SECONDS = 5.0
+
+
+@contextmanager
+def file_lock(path):
+    """Blocking exclusive lock across processes, e.g. so only one worker runs migrations at a time"""
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        _lock(fd, blocking=True)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
+
+
+class LeaderLock:
+    """Held by at most one process at a time; `path` is the lock file"""
+
+    def __init__(self, path, retry=RETRY_SECONDS):
+        self.path = path
+        self.retry = retry
+        self._fd = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def is_leader(self):
+        return self._fd is not None
+
+    def try_acquire(self):
+        """Take the lock if it is free; True if this process holds it"""
+        with self._lock:
+            if self._fd is not None:
+                return True
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                _lock(fd, blocking=False)
+            except OSError:
+                os.close(fd)
+                return False
+            # Record who leads, for status endpoints in the other workers
+            os.ftruncate(fd, 0)
+            os.lseek(fd, 0, os.SEEK_SET)
+            os.write(fd, f"{os.getpid()}\n".encode())
+            self._fd = fd
+            return True
+
+    def release(self):
+        with self._lock:
+            if self._fd is not None:
+                try:
+                    _unlock(self._fd)
+                finally:
+                    os.close(self._fd)
+                    self._fd = None
+
+    def elect(self, on_elected):
+        """
+        Call on_elected() once, in a background thread, when this process
+        becomes leader (immediately if the lock is free). Only the first
+        call per process campaigns; later ones are no-ops.
+        """
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._campaign, args=(on_elected,),
+                                            name="leader-election", daemon=True)
+            self._thread.start()
+
+    def _campaign(self, on_elected):
+        while not self.try_acquire():
+            time.sleep(self.retry)
+        on_elected()
+
+    def holder(self):
+        """PID of the current leader, or None if no process holds the lock"""
+        if self.is_leader:
+            return os.getpid()
+        try:
+            fd = os.open(self.path, os.O_RDWR)
+        except OSError:
+            return None
+        try:
+            try:
+                _lock(fd, blocking=False)
+            except OSError:
+                pass  # held: the file names the holder
+            else:
+                _unlock(fd)
+                return None
+            try:
+                with open(self.path) as f:
+                    return int(f.read().strip() or 0) or None
+            except (OSError, ValueError):
+                return None
+        finally:
+            os.close(fd)
@@ -0,0 +1,173 @@
+"""
+BANF Load Test
+===============
+Requests per second for a service under serve.py as the worker count
+grows.
+
+Usage:
+  python loadtest.py zelle                                  # workers 1,2,4 on /api/zelle/stats
+  python loadtest.py gmail --workers 1,2,4,8 --path /api/gmail/contacts
+  python loadtest.py --url http://127.0.0.1:5002/api/zelle/stats   # a server that is already running
+
+Each run starts serve.py on a free port with a scratch database (the Zelle
+one seeded with its test data), the poller off and IMAP pointed nowhere,
+so nothing touches Gmail. It then keeps --concurrency keep-alive clients
+busy for --duration seconds. The clients share the machine with the
+server, so compare runs on the same host rather than reading absolutes.
+"""
+
+import argparse
+import http.client
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from benchmarks import SCRIPT_DIR, free_port, percentiles
+
+DEFAULT_PATHS = {
+    'zelle': '/api/zelle/stats',
+    'gmail': '/api/gmail/contacts',
+}
+HEALTH_PATHS = {
+    'zelle': '/api/zelle/health',
+    'gmail': '/api/gmail/health',
+}
+
+
+def start_server(service, workers, threads, scratch):
+    """serve.py on a free port; returns (process, port) once it answers its health check"""
+    port = free_port()
+    env = dict(os.environ,
+               ZELLE_DB_PATH=os.path.join(scratch, "zelle.db"),
+               GMAIL_DB_PATH=os.path.join(scratch, "gmail.db"),
+               ZELLE_POLLER_AUTOSTART="0",
+               IMAP_SERVER="127.0.0.1", IMAP_PORT="1", IMAP_USE_SSL="0")
+    proc = subprocess.Popen([sys.executable, str(SCRIPT_DIR / "serve.py"), service,
+                             "--workers", str(workers), "--threads", str(threads),
+                             "--bind", f"127.0.0.1:{port}"],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            status, _ = request("127.0.0.1", port, "GET", HEALTH_PATHS[service])
+            if status == 200:
+                return proc, port
+        except OSError:
+            pass
+        if proc.poll() is not None:
+            break
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"serve.py {service} did not come up on port {port}")
+
+
+def stop_server(proc):
+    proc.terminate()
+    try:
+        proc.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+def request(host, port, method, path):
+    conn = http.client.HTTPConnection(host, port, timeout=10)
+    try:
+        conn.request(method, path)
+        response = conn.getresponse()
+        return response.status, response.read()
+    finally:
+        conn.close()
+
+
+def run_load(host, port, path, concurrency, duration):
+    """Hammer one URL from `concurrency` keep-alive clients; returns (requests, errors, latencies_ms)"""
+    deadline = time.monotonic() + duration
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+
+    def client():
+        conn = http.client.HTTPConnection(host, port, timeout=30)
+        mine, failed = [], 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    failed += 1
+                    continue
+                mine.append((time.perf_counter() - started) * 1000)
+            except (OSError, http.client.HTTPException):
+                failed += 1
+                conn.close()
+                conn = http.client.HTTPConnection(host, port, timeout=30)
+        conn.close()
+        with lock:
+            latencies.extend(mine)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return len(latencies), errors[0], latencies
+
+
+def report(label, count, errors, latencies, duration, baseline=None):
+    rate = count / duration
+    scaling = f" ({rate / baseline:.2f}x)" if baseline else ""
+    summary = percentiles(latencies) if latencies else "no successful requests"
+    print(f"  {label:<22} {rate:8.0f} req/s{scaling:<9} {summary}, {errors} errors")
+    return rate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Throughput of a BANF service vs worker count")
+    parser.add_argument('service', nargs='?', choices=sorted(DEFAULT_PATHS))
+    parser.add_argument('--url', help="load an already-running server instead of starting serve.py")
+    parser.add_argument('--path', help="endpoint to load (default depends on the service)")
+    parser.add_argument('--workers', default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument('--threads', type=int, default=4, help="threads per worker")
+    parser.add_argument('--concurrency', type=int, default=16, help="concurrent clients")
+    parser.add_argument('--duration', type=float, default=10.0, help="seconds per run")
+    args = parser.parse_args(argv)
+
+    if args.url:
+        url = urlsplit(args.url)
+        path = (url.path or "/") + (f"?{url.query}" if url.query else "")
+        print(f"Load test: GET {args.url}, {args.concurrency} clients, {args.duration:.0f}s")
+        report("server", *run_load(url.hostname, url.port or 80, path, args.concurrency, args.duration),
+               args.duration)
+        return 0
+    if not args.service:
+        parser.error("give a service (gmail or zelle) or --url")
+
+    path = args.path or DEFAULT_PATHS[args.service]
+    print(f"Load test: serve.py {args.service}, GET {path}, {args.concurrency} clients, "
+          f"{args.duration:.0f}s per run, {os.cpu_count()} CPU(s)")
+    scratch = tempfile.mkdtemp(prefix="banf_loadtest_")
+    baseline = None
+    for workers in (int(w) for w in args.workers.split(",")):
+        proc, port = start_server(args.service, workers, args.threads, scratch)
+        try:
+            if args.service == 'zelle':
+                request("127.0.0.1", port, "POST", "/api/zelle/test/seed")
+            run_load("127.0.0.1", port, path, args.concurrency, 1.0)  # warm up every worker
+            count, errors, latencies = run_load("127.0.0.1", port, path, args.concurrency, args.duration)
+        finally:
+            stop_server(proc)
+        rate = report(f"{workers} worker(s) x {args.threads} threads", count, errors, latencies, args.duration,
+                      baseline)
+        baseline = baseline or rate
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
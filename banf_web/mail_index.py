@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+BANF Mailbox Search Index
+==========================
+Local full-text index (SQLite FTS5) over subject, from, to and text body
+for gmail_service.py search.
+
+IMAP `SEARCH (OR SUBJECT .. FROM .. BODY ..)` scans the whole folder on
+the server, and every hit then has to be downloaded just to show a
+snippet. The index is fed incrementally by UID sync, using the same
+(UIDVALIDITY, last UID) checkpoint scheme as the Zelle poller, from a
+background thread; searches only read it (is_ready/search). Only the
+header and the first TEXT_BYTES of each body are fetched, so attachments
+mostly stay on the server; a message that fails to fetch or parse is
+recorded in mail_index_failures and retried on later syncs. Queries
+are then ranked (bm25, subject weighted highest), support `term*` prefix
+matching, and return snippets without touching the server.
+
+Expunged messages are dropped lazily: callers map hits back to sequence
+numbers, and any UID that no longer exists is removed.
+"""
+
+import re
+import sqlite3
+import threading
+import time
+
+import imap_client
+
+SYNC_BATCH = 200          # messages indexed per sync() call by default
+TEXT_BYTES = 64 * 1024    # body bytes fetched per message; the rest (usually attachments) stays on the server
+FETCH_ITEMS = f"(BODY.PEEK[HEADER] BODY.PEEK[TEXT]<0.{TEXT_BYTES}>)"
+MAX_ATTEMPTS = 3          # fetches tried before a message is left in mail_index_failures
+SNIPPET_TOKENS = 32
+# bm25 column weights: subject, sender, recipients, body
+RANK_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+_TERM_RE = re.compile(r'[^\s"()*:^]+\*?')
+
+
+def fts_query(text):
+    """
+    Turn user input into a safe FTS5 query: every term quoted (so
+    operators and punctuation are literal) and ANDed; a trailing * keeps
+    prefix matching, e.g. 'puja vol*' -> '"puja" "vol"*'.
+    """
+    terms = []
+    for term in _TERM_RE.findall(text or ""):
+        word = term.rstrip('*')
+        if word:
+            terms.append(f'"{word}"' + ('*' if term.endswith('*') else ''))
+    return ' '.join(terms)
+
+
+class MailIndex:
+    """
+    `extract` turns raw RFC822 bytes into (subject, from, to, date, body)
+    strings. One index holds any number of folders; each is keyed by its
+    UIDVALIDITY and rebuilt from scratch when that changes.
+    """
+
+    def __init__(self, db_path, extract, sync_batch=SYNC_BATCH):
+        self.db_path = db_path
+        self.extract = extract
+        self.sync_batch = sync_batch
+        self._sync_lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {'syncs': 0, 'indexed': 0, 'removed': 0, 'searches': 0, 'search_time_ms': 0.0}
+        self.init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _reader(self):
+        """Per-thread connection for searches; keeps its page cache warm between queries"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def init_db(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS mail_index_state (
+                folder TEXT PRIMARY KEY,
+                uidvalidity INTEGER,
+                last_uid INTEGER DEFAULT 0,
+                synced_at REAL,
+                backlog INTEGER
+            )''')
+            # backlog (messages left to index after the last sync) came later
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(mail_index_state)")}
+            if 'backlog' not in columns:
+                conn.execute("ALTER TABLE mail_index_state ADD COLUMN backlog INTEGER")
+            conn.execute('''CREATE TABLE IF NOT EXISTS mail_index_docs (
+                id INTEGER PRIMARY KEY,
+                folder TEXT NOT NULL,
+                uidvalidity INTEGER NOT NULL,
+                uid INTEGER NOT NULL,
+                date TEXT,
+                UNIQUE (folder, uidvalidity, uid)
+            )''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS mail_index_failures (
+                folder TEXT NOT NULL,
+                uid INTEGER NOT NULL,
+                uidvalidity INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 1,
+                error TEXT,
+                failed_at REAL,
+                PRIMARY KEY (folder, uid)
+            )''')
+            # rowid = mail_index_docs.id
+            conn.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS mail_fts USING fts5(
+                subject, sender, recipients, body,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3'
+            )''')
+        conn.close()
+
+    # ====== SYNC ======
+
+    def sync(self, mail, folder, uidvalidity, limit=None):
+        """
+        Index up to `limit` (default sync_batch; 0 = all) messages that
+        arrived since the folder's checkpoint and, on the call that catches
+        up, retry messages that failed before. `mail` must have `folder`
+        selected. Returns {'indexed', 'pending', 'busy'}; pending > 0 means
+        the index is still catching up. If another thread is already
+        syncing, returns immediately with busy=True.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return {'indexed': 0, 'pending': None, 'busy': True}
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT uidvalidity, last_uid FROM mail_index_state WHERE folder = ?",
+                                   (folder,)).fetchone()
+                last_uid = row[1] if row and row[0] == uidvalidity else 0
+                if row and row[0] != uidvalidity:
+                    self._drop_folder(conn, folder)
+
+                uids = imap_client.new_uids_since(mail, last_uid)
+                limit = self.sync_batch if limit is None else limit
+                todo = uids[:limit] if limit else uids
+                # Earlier failures are retried once per catch-up: by the call that reaches the end
+                retry = [r[0] for r in conn.execute('''SELECT uid FROM mail_index_failures
+                    WHERE folder = ? AND uidvalidity = ? AND attempts < ? ORDER BY uid''',
+                    (folder, uidvalidity, MAX_ATTEMPTS))] if len(todo) == len(uids) else []
+
+                indexed = 0
+                # Retries first (they leave the checkpoint alone), then new mail in order
+                size = imap_client.FETCH_BATCH_SIZE
+                chunks = ([(retry[i:i + size], False) for i in range(0, len(retry), size)] +
+                          [(todo[i:i + size], True) for i in range(0, len(todo), size)])
+                done = 0
+                for chunk, new in chunks:
+                    docs, failures = self._fetch_docs(mail, chunk)
+                    if new:
+                        done += len(chunk)
+                        last_uid = max(chunk)
+                    with conn:
+                        for uid, subject, sender, recipients, date, body in docs:
+                            cur = conn.execute('''INSERT OR IGNORE INTO mail_index_docs (folder, uidvalidity, uid, date)
+                                VALUES (?, ?, ?, ?)''', (folder, uidvalidity, uid, date))
+                            if cur.rowcount:
+                                conn.execute('''INSERT INTO mail_fts (rowid, subject, sender, recipients, body)
+                                    VALUES (?, ?, ?, ?, ?)''', (cur.lastrowid, subject, sender, recipients, body))
+                                indexed += 1
+                        # Failed UIDs are recorded for retry, so the checkpoint can move past them
+                        conn.executemany("DELETE FROM mail_index_failures WHERE folder = ? AND uid = ?",
+                                         [(folder, doc[0]) for doc in docs])
+                        conn.executemany('''INSERT INTO mail_index_failures
+                            (folder, uid, uidvalidity, attempts, error, failed_at) VALUES (?, ?, ?, 1, ?, ?)
+                            ON CONFLICT(folder, uid) DO UPDATE SET
+                            attempts = attempts + 1, error = excluded.error, failed_at = excluded.failed_at''',
+                            [(folder, uid, uidvalidity, error, time.time()) for uid, error in failures.items()])
+                        conn.execute('''INSERT INTO mail_index_state (folder, uidvalidity, last_uid, synced_at, backlog)
+                            VALUES (?, ?, ?, ?, ?) ON CONFLICT(folder) DO UPDATE SET
+                            uidvalidity = excluded.uidvalidity, last_uid = excluded.last_uid,
+                            synced_at = excluded.synced_at, backlog = excluded.backlog''',
+                            (folder, uidvalidity, last_uid, time.time(), len(uids) - done))
+                if not todo:
+                    with conn:
+                        conn.execute('''INSERT INTO mail_index_state (folder, uidvalidity, last_uid, synced_at, backlog)
+                            VALUES (?, ?, ?, ?, 0) ON CONFLICT(folder) DO UPDATE SET
+                            uidvalidity = excluded.uidvalidity, synced_at = excluded.synced_at, backlog = 0''',
+                            (folder, uidvalidity, last_uid, time.time()))
+            finally:
+                conn.close()
+            self.stats['syncs'] += 1
+            self.stats['indexed'] += indexed
+            return {'indexed': indexed, 'pending': len(uids) - len(todo), 'busy': False}
+        finally:
+            self._sync_lock.release()
+
+    def _fetch_docs(self, mail, uids):
+        """
+        Fetch and extract `uids`: ([(uid, subject, from, to, date, body)],
+        {uid: error}). Only the header and the first TEXT_BYTES of the body
+        are downloaded, which covers the text parts of ordinary mail and
+        leaves most attachment bytes on the server.
+        """
+        docs, failures = [], {uid: "not returned by the server" for uid in uids}
+        for uid, attrs in imap_client.fetch_messages(mail, uids, FETCH_ITEMS, uid=True):
+            header = imap_client.section(attrs, 'BODY[HEADER')
+            if header is None:
+                continue
+            try:
+                docs.append((uid,) + tuple(self.extract(header + (imap_client.section(attrs, 'BODY[TEXT') or b""))))
+            except Exception as e:
+                failures[uid] = f"{type(e).__name__}: {e}"
+                continue
+            del failures[uid]
+        return docs, failures
+
+    def failures(self, folder):
+        """Messages that could not be indexed; each is retried until it has failed MAX_ATTEMPTS times"""
+        conn = self._connect()
+        try:
+            return [dict(zip(('uid', 'attempts', 'error', 'failed_at'), row)) for row in conn.execute(
+                "SELECT uid, attempts, error, failed_at FROM mail_index_failures WHERE folder = ? ORDER BY uid",
+                (folder,))]
+        finally:
+            conn.close()
+
+    def is_ready(self, folder, uidvalidity):
+        """
+        True once the folder has been indexed to the end for this
+        UIDVALIDITY (mail newer than the last sync may still be missing).
+        Reads local state only. A folder the index has never seen is
+        registered, so the background sync picks it up.
+        """
+        conn = self._reader()
+        row = conn.execute("SELECT uidvalidity, backlog FROM mail_index_state WHERE folder = ?",
+                           (folder,)).fetchone()
+        if row is None:
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO mail_index_state (folder) VALUES (?)", (folder,))
+            return False
+        return row[0] == uidvalidity and row[1] == 0
+
+    def folders(self, defaults=()):
+        """Folders to keep synced: `defaults` plus every folder searched so far"""
+        known = [row[0] for row in self._reader().execute("SELECT folder FROM mail_index_state ORDER BY folder")]
+        return list(dict.fromkeys(list(defaults) + known))
+
+    def remove(self, folder, uidvalidity, uids):
+        """Drop expunged messages from the index"""
+        conn = self._connect()
+        with conn:
+            for uid in uids:
+                row = conn.execute("SELECT id FROM mail_index_docs WHERE folder = ? AND uidvalidity = ? AND uid = ?",
+                                   (folder, uidvalidity, int(uid))).fetchone()
+                if row:
+                    conn.execute("DELETE FROM mail_fts WHERE rowid = ?", row)
+                    conn.execute("DELETE FROM mail_index_docs WHERE id = ?", row)
+                    self.stats['removed'] += 1
+        conn.close()
+
+    @staticmethod
+    def _drop_folder(conn, folder):
+        with conn:
+            conn.execute("DELETE FROM mail_fts WHERE rowid IN (SELECT id FROM mail_index_docs WHERE folder = ?)",
+                         (folder,))
+            conn.execute("DELETE FROM mail_index_docs WHERE folder = ?", (folder,))
+            conn.execute("DELETE FROM mail_index_failures WHERE folder = ?", (folder,))
+            conn.execute("DELETE FROM mail_index_state WHERE folder = ?", (folder,))
+
+    # ====== SEARCH ======
+
+    def search(self, folder, uidvalidity, text, limit=20, offset=0, newest_first=False):
+        """
+        Match `text` in one folder. Returns (total, hits); hits are dicts
+        with uid, subject, from, to, date, snippet and score (lower is a
+        better bm25 rank). Ordered by rank, or by UID descending with
+        newest_first (inbox order).
+        """
+        query = fts_query(text)
+        if not query:
+            return 0, []
+        started = time.perf_counter()
+        order = "d.uid DESC" if newest_first else "score, d.uid DESC"
+        conn = self._reader()
+        # CROSS JOIN pins the FTS table as the outer loop; left to itself the
+        # planner walks every doc in the folder and runs MATCH once per row.
+        # Snippets are only built for the page, not for every match.
+        total = conn.execute('''SELECT COUNT(*) FROM mail_fts CROSS JOIN mail_index_docs d ON d.id = mail_fts.rowid
+            WHERE mail_fts MATCH ? AND d.folder = ? AND d.uidvalidity = ?''',
+            (query, folder, uidvalidity)).fetchone()[0]
+        rows = conn.execute(f'''WITH page AS (
+                SELECT d.id, d.uid, d.date, bm25(mail_fts, {", ".join(map(str, RANK_WEIGHTS))}) AS score
+                FROM mail_fts CROSS JOIN mail_index_docs d ON d.id = mail_fts.rowid
+                WHERE mail_fts MATCH ?1 AND d.folder = ?2 AND d.uidvalidity = ?3
+                ORDER BY {order} LIMIT ?4 OFFSET ?5)
+            SELECT page.uid, mail_fts.subject, mail_fts.sender, mail_fts.recipients, page.date,
+                snippet(mail_fts, 3, '', '', '...', {SNIPPET_TOKENS}), page.score
+            FROM page CROSS JOIN mail_fts ON mail_fts.rowid = page.id
+            WHERE mail_fts MATCH ?1
+            ORDER BY {order.replace("d.", "page.")}''',
+            (query, folder, uidvalidity, limit, offset)).fetchall()
+        self.stats['searches'] += 1
+        self.stats['search_time_ms'] += (time.perf_counter() - started) * 1000
+        hits = [{"uid": uid, "subject": subject, "from": sender, "to": recipients, "date": date,
+                 "snippet": snippet, "score": round(score, 3)}
+                for uid, subject, sender, recipients, date, snippet, score in rows]
+        return total, hits
+
+    def metrics(self):
+        """Per-folder document counts plus search counters for health endpoints"""
+        conn = self._connect()
+        folders = {folder: {"documents": docs, "last_uid": last_uid, "synced_at": synced_at, "backlog": backlog,
+                            "failed": failed}
+                   for folder, docs, last_uid, synced_at, backlog, failed in conn.execute('''
+                       SELECT s.folder, (SELECT COUNT(*) FROM mail_index_docs d
+                                         WHERE d.folder = s.folder AND d.uidvalidity = s.uidvalidity),
+                              s.last_uid, s.synced_at, s.backlog,
+                              (SELECT COUNT(*) FROM mail_index_failures f WHERE f.folder = s.folder)
+                       FROM mail_index_state s''')}
+        conn.close()
+        metrics = dict(self.stats, folders=folders)
+        metrics['search_time_ms'] = round(metrics['search_time_ms'], 1)
+        return metrics
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+BANF Bulk Mail Jobs
+====================
+Background delivery queue for gmail_service.py.
+
+A bulk send (e.g. an evite to the whole member list) is stored as a job
+with one row per recipient in SQLite and returned to the caller right
+away. A small pool of worker threads drains the queue through the SMTP
+pool, throttled by a shared rate limit so we stay under Gmail's sending
+quota. Temporary failures (421, dropped connections) are retried with
+exponential backoff; permanent ones (5xx, refused recipients) fail the
+recipient. Jobs survive a restart: anything left mid-send is re-queued.
+"""
+
+import json
+import smtplib
+import sqlite3
+import threading
+import time
+import uuid
+from datetime import datetime
+
+import smtp_client
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 30      # seconds; doubles per attempt
+BACKOFF_MAX = 900
+
+
+def _is_temporary(exc):
+    """True for failures worth retrying later (transient SMTP/network errors)"""
+    if smtp_client.is_retryable(exc) or isinstance(exc, TimeoutError):
+        return True
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return bool(exc.recipients) and all(400 <= code < 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500
+    return False
+
+
+class RateLimiter:
+    """
+    Token bucket shared by all workers: `rate` sends per `per` seconds, at
+    most `burst` of them back to back. The bucket starts with one token,
+    so a new job is paced from its first send instead of spending a whole
+    period's quota at once.
+    """
+
+    def __init__(self, rate, per=60.0, burst=1):
+        self.rate = max(1.0, float(rate))
+        self.fill_rate = self.rate / per
+        self.capacity = max(1.0, min(float(burst), self.rate))
+        self.tokens = 1.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop_event=None):
+        """Block until a send is allowed; False if stop_event fired first"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.fill_rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.fill_rate
+            if stop_event is not None:
+                if stop_event.wait(min(wait, 1.0)):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class MailJobQueue:
+    """
+    Persistent bulk-mail queue.
+
+    `send` is called as send(from_addr, [recipient], message) and returns
+    sendmail's refused dict (SMTPPool.send). Workers start lazily on the
+    first submit, or explicitly via start(). With autostart=False only
+    start() starts them: when several processes share the database, only
+    the one elected to deliver (see leader.py) should call it.
+    """
+
+    def __init__(self, db_path, send, from_addr, workers=3, rate_per_minute=60,
+                 max_attempts=MAX_ATTEMPTS, backoff_base=BACKOFF_BASE, autostart=True):
+        self.db_path = db_path
+        self.send = send
+        self.from_addr = from_addr
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.autostart = autostart
+        self.limiter = RateLimiter(rate_per_minute)
+        self._claim_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self.init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_db(self):
+        """Create job tables"""
+        conn = self._connect()
+        c = conn.cursor()
+        c.execute('''CREATE TABLE IF NOT EXISTS mail_jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            status TEXT DEFAULT 'queued',
+            total INTEGER DEFAULT 0,
+            meta TEXT,
+            created_at TEXT,
+            started_at TEXT,
+            finished_at TEXT
+        )''')
+        c.execute('''CREATE TABLE IF NOT EXISTS mail_job_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT NOT NULL,
+            email TEXT NOT NULL,
+            message TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            attempts INTEGER DEFAULT 0,
+            next_attempt_at REAL DEFAULT 0,
+            last_error TEXT,
+            sent_at TEXT
+        )''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_mail_job_items_due
+            ON mail_job_items (status, next_attempt_at)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_mail_job_items_job
+            ON mail_job_items (job_id, status)''')
+        conn.commit()
+        conn.close()
+
+    # ====== PRODUCER SIDE ======
+
+    def submit(self, kind, messages, meta=None):
+        """Queue (recipient_email, message) pairs as one job; returns the job id"""
+        job_id = uuid.uuid4().hex
+        conn = self._connect()
+        with conn:
+            conn.execute('''INSERT INTO mail_jobs (id, kind, status, total, meta, created_at)
+                VALUES (?, ?, 'queued', ?, ?, ?)''',
+                (job_id, kind, len(messages), json.dumps(meta or {}), datetime.now().isoformat()))
+            conn.executemany('''INSERT INTO mail_job_items (job_id, email, message)
+                VALUES (?, ?, ?)''', [(job_id, email, message) for email, message in messages])
+        conn.close()
+        if not messages:
+            self._finish_if_done(job_id)
+        if self.autostart:
+            self.start()
+        self._wakeup.set()
+        return job_id
+
+    def get_job(self, job_id):
+        """Job summary with sent/failed/pending counts, or None if unknown"""
+        conn = self._connect()
+        job = conn.execute("SELECT * FROM mail_jobs WHERE id = ?", (job_id,)).fetchone()
+        if not job:
+            conn.close()
+            return None
+        counts = dict(conn.execute('''SELECT status, COUNT(*) FROM mail_job_items
+            WHERE job_id = ? GROUP BY status''', (job_id,)).fetchall())
+        failed = [dict(r) for r in conn.execute('''SELECT email, last_error AS error, attempts
+            FROM mail_job_items WHERE job_id = ? AND status = 'failed' ORDER BY id''', (job_id,))]
+        retrying = conn.execute('''SELECT COUNT(*) FROM mail_job_items
+            WHERE job_id = ? AND status = 'pending' AND attempts > 0''', (job_id,)).fetchone()[0]
+        conn.close()
+        return {
+            "job_id": job["id"],
+            "kind": job["kind"],
+            "status": job["status"],
+            "total": job["total"],
+            "sent_count": counts.get('sent', 0),
+            "failed_count": counts.get('failed', 0),
+            "pending_count": counts.get('pending', 0) + counts.get('sending', 0),
+            "retrying_count": retrying,
+            "failed": failed,
+            "meta": json.loads(job["meta"] or "{}"),
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+        }
+
+    # ====== WORKERS ======
+
+    def start(self):
+        """Re-queue anything interrupted mid-send, then start the worker threads (idempotent)"""
+        with self._claim_lock:
+            if any(t.is_alive() for t in self._threads):
+                return
+            # A crash between claim and result leaves rows in 'sending'; send them again.
+            # Done here rather than in init_db() so a process that never delivers
+            # can't re-queue rows another process is sending right now.
+            conn = self._connect()
+            with conn:
+                conn.execute("UPDATE mail_job_items SET status = 'pending' WHERE status = 'sending'")
+            conn.close()
+            self._stop.clear()
+            self._threads = [threading.Thread(target=self._worker, name=f"mail-job-{i}", daemon=True)
+                             for i in range(self.workers)]
+            for t in self._threads:
+                t.start()
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join(timeout)
+
+    def _claim(self):
+        """Mark the next due item 'sending' and return it, or the seconds until one is due"""
+        with self._claim_lock:
+            conn = self._connect()
+            try:
+                now = time.time()
+                row = conn.execute('''SELECT id, job_id, email, message, attempts FROM mail_job_items
+                    WHERE status = 'pending' AND next_attempt_at <= ?
+                    ORDER BY next_attempt_at, id LIMIT 1''', (now,)).fetchone()
+                if row is None:
+                    upcoming = conn.execute('''SELECT MIN(next_attempt_at) FROM mail_job_items
+                        WHERE status = 'pending' ''').fetchone()[0]
+                    return None, (upcoming - now if upcoming is not None else None)
+                with conn:
+                    conn.execute("UPDATE mail_job_items SET status = 'sending' WHERE id = ?", (row['id'],))
+                    conn.execute('''UPDATE mail_jobs SET status = 'running', started_at = COALESCE(started_at, ?)
+                        WHERE id = ? AND status = 'queued' ''', (datetime.now().isoformat(), row['job_id']))
+                return dict(row), None
+            finally:
+                conn.close()
+
+    def _worker(self):
+        while not self._stop.is_set():
+            item, wait = self._claim()
+            if item is None:
+                self._wakeup.clear()
+                self._wakeup.wait(min(wait, 5) if wait is not None else 5)
+                continue
+            if not self.limiter.acquire(self._stop):
+                self._set_item(item, 'pending', item['attempts'], 0, None)
+                return
+            self._deliver(item)
+
+    def _deliver(self, item):
+        attempts = item['attempts'] + 1
+        try:
+            refused = self.send(self.from_addr, [item['email']], item['message'])
+            if refused:
+                raise smtplib.SMTPRecipientsRefused(refused)
+        except smtplib.SMTPAuthenticationError:
+            # Bad credentials fail every recipient; stop the job instead of retrying into a lockout
+            self._fail_job(item['job_id'],
+                           "Gmail auth failed. Use an App Password (see https://myaccount.google.com/apppasswords)")
+            return
+        except Exception as e:
+            if _is_temporary(e) and attempts < self.max_attempts:
+                delay = min(BACKOFF_MAX, self.backoff_base * 2 ** (attempts - 1))
+                self._set_item(item, 'pending', attempts, time.time() + delay, str(e))
+            else:
+                self._set_item(item, 'failed', attempts, 0, str(e))
+            return
+        self._set_item(item, 'sent', attempts, 0, None)
+
+    def _set_item(self, item, status, attempts, next_attempt_at, error):
+        conn = self._connect()
+        with conn:
+            conn.execute('''UPDATE mail_job_items
+                SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, sent_at = ?
+                WHERE id = ?''',
+                (status, attempts, next_attempt_at, error,
+                 datetime.now().isoformat() if status == 'sent' else None, item['id']))
+        conn.close()
+        if status != 'pending':
+            self._finish_if_done(item['job_id'])
+
+    def _fail_job(self, job_id, error):
+        conn = self._connect()
+        with conn:
+            conn.execute('''UPDATE mail_job_items SET status = 'failed', last_error = ?
+                WHERE job_id = ? AND status IN ('pending', 'sending')''', (error, job_id))
+        conn.close()
+        self._finish_if_done(job_id)
+
+    def _finish_if_done(self, job_id):
+        conn = self._connect()
+        with conn:
+            open_items = conn.execute('''SELECT COUNT(*) FROM mail_job_items
+                WHERE job_id = ? AND status IN ('pending', 'sending')''', (job_id,)).fetchone()[0]
+            if not open_items:
+                sent = conn.execute('''SELECT COUNT(*) FROM mail_job_items
+                    WHERE job_id = ? AND status = 'sent' ''', (job_id,)).fetchone()[0]
+                total = conn.execute("SELECT total FROM mail_jobs WHERE id = ?", (job_id,)).fetchone()[0]
+                status = 'completed' if sent or not total else 'failed'
+                conn.execute('''UPDATE mail_jobs SET status = ?, finished_at = ?
+                    WHERE id = ? AND finished_at IS NULL''', (status, datetime.now().isoformat(), job_id))
+        conn.close()
+
+    def metrics(self):
+        """Queue depth for health endpoints"""
+        conn = self._connect()
+        counts = dict(conn.execute('''SELECT status, COUNT(*) FROM mail_job_items
+            WHERE status IN ('pending', 'sending') GROUP BY status''').fetchall())
+        active = conn.execute("SELECT COUNT(*) FROM mail_jobs WHERE status IN ('queued', 'running')").fetchone()[0]
+        conn.close()
+        return {
+            "active_jobs": active,
+            "pending": counts.get('pending', 0),
+            "sending": counts.get('sending', 0),
+            "workers": sum(1 for t in self._threads if t.is_alive()),
+            "rate_per_minute": self.limiter.rate,
+        }
@@ -0,0 +1,295 @@
+# -*- coding: utf-8 -*-
+"""
+BANF Message Cache
+===================
+Two-tier cache of mailbox messages for gmail_service.py.
+
+A message never changes once it has a UID, so (folder, UIDVALIDITY, UID)
+identifies its content for good. Opening the same mail again should not
+download and MIME-parse it again.
+
+  Tier 1: in-process LRU of parsed message dicts, bounded by approximate
+          size and age.
+  Tier 2: raw RFC822 bytes in SQLite, bounded by total size and age. It
+          survives restarts and is shared by every worker using the same
+          database file. A hit here only re-parses; it does not touch IMAP.
+
+Flag changes (mark read, delete) invalidate the entry in both tiers. Each
+invalidation is also logged in message_invalidations, and every worker
+applies that log to its own memory tier at most INVALIDATION_CHECK seconds
+later, so no worker serves stale flags for longer than that. The disk
+tier's byte total is a running count kept by triggers, so a put never sums
+the whole table.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+MEMORY_BYTES = 32 * 1024 * 1024
+DISK_BYTES = 256 * 1024 * 1024
+MAX_AGE = 30 * 86400          # seconds
+MAX_BLOB_BYTES = 10 * 1024 * 1024  # bigger messages (attachments) skip the disk tier
+INVALIDATION_CHECK = 1.0      # seconds; max staleness of the memory tier after another worker's flag change
+EVICT_BATCH = 64              # rows read per step while evicting from the disk tier
+
+# message_blobs row counters in message_cache_meta, kept current by these triggers
+_META_TRIGGERS = [
+    '''CREATE TRIGGER IF NOT EXISTS message_blobs_meta_ai AFTER INSERT ON message_blobs BEGIN
+        UPDATE message_cache_meta SET value = value + NEW.size WHERE key = 'bytes';
+        UPDATE message_cache_meta SET value = value + 1 WHERE key = 'entries'; END''',
+    '''CREATE TRIGGER IF NOT EXISTS message_blobs_meta_ad AFTER DELETE ON message_blobs BEGIN
+        UPDATE message_cache_meta SET value = value - OLD.size WHERE key = 'bytes';
+        UPDATE message_cache_meta SET value = value - 1 WHERE key = 'entries'; END''',
+    '''CREATE TRIGGER IF NOT EXISTS message_blobs_meta_au AFTER UPDATE OF size ON message_blobs BEGIN
+        UPDATE message_cache_meta SET value = value - OLD.size + NEW.size WHERE key = 'bytes'; END''',
+]
+
+
+def _parsed_size(parsed):
+    """Rough in-memory footprint of a parsed message dict"""
+    return 512 + sum(len(v) for v in parsed.values() if isinstance(v, str))
+
+
+class MessageCache:
+    """
+    `parse` turns raw RFC822 bytes into the dict the API returns (without
+    the sequence-number "id", which changes as mail is deleted). Keys are
+    (folder, uidvalidity, uid) tuples.
+    """
+
+    def __init__(self, db_path, parse, memory_bytes=MEMORY_BYTES, disk_bytes=DISK_BYTES, max_age=MAX_AGE):
+        self.db_path = db_path
+        self.parse = parse
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.max_age = max_age
+        self._memory = OrderedDict()  # key -> (parsed, size, stored_at)
+        self._memory_used = 0
+        self._invalidations_seen = 0  # last message_invalidations.seq applied to the memory tier
+        self._invalidations_checked = 0.0
+        self._lock = threading.Lock()
+        self.stats = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0,
+            'invalidations': 0,
+        }
+        self.init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def init_db(self):
+        """Create the blob and invalidation tables and drop anything past max_age"""
+        conn = self._connect()
+        with conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS message_cache_meta (
+                key TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS message_invalidations (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                folder TEXT NOT NULL,
+                uidvalidity INTEGER NOT NULL,
+                uid INTEGER NOT NULL,
+                logged_at REAL NOT NULL
+            )''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS message_blobs (
+                folder TEXT NOT NULL,
+                uidvalidity INTEGER NOT NULL,
+                uid INTEGER NOT NULL,
+                raw BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (folder, uidvalidity, uid)
+            )''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_message_blobs_accessed ON message_blobs (accessed_at)")
+            # Counters start from the table as it is (a one-off scan when they are first added)
+            if conn.execute("SELECT COUNT(*) FROM message_cache_meta").fetchone()[0] < 2:
+                conn.execute('''INSERT OR REPLACE INTO message_cache_meta (key, value)
+                    SELECT 'bytes', COALESCE(SUM(size), 0) FROM message_blobs''')
+                conn.execute('''INSERT OR REPLACE INTO message_cache_meta (key, value)
+                    SELECT 'entries', COUNT(*) FROM message_blobs''')
+            for sql in _META_TRIGGERS:
+                conn.execute(sql)
+            cutoff = time.time() - self.max_age
+            conn.execute("DELETE FROM message_blobs WHERE stored_at < ?", (cutoff,))
+            # Memory entries older than max_age are gone anyway, so their invalidations are too
+            conn.execute("DELETE FROM message_invalidations WHERE logged_at < ?", (cutoff,))
+            self._invalidations_seen = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) FROM message_invalidations").fetchone()[0]
+        conn.close()
+
+    # ====== LOOKUPS ======
+
+    def get_many(self, keys):
+        """{key: parsed} for every key found in either tier; misses are absent"""
+        found = {}
+        now = time.time()
+        self._apply_invalidations(now)
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is None:
+                    continue
+                if now - entry[2] > self.max_age:
+                    self._drop_memory(key)
+                    continue
+                self._memory.move_to_end(key)
+                found[key] = entry[0]
+            self.stats['memory_hits'] += len(found)
+
+        remaining = [k for k in keys if k not in found]
+        if remaining:
+            for key, raw in self._load_raw(remaining, now).items():
+                try:
+                    parsed = self.parse(raw)
+                except Exception:
+                    continue
+                found[key] = parsed
+                self._remember(key, parsed, now)
+            with self._lock:
+                self.stats['disk_hits'] += sum(1 for k in remaining if k in found)
+                self.stats['misses'] += sum(1 for k in remaining if k not in found)
+        return found
+
+    def put(self, key, raw):
+        """Parse freshly fetched bytes, cache them in both tiers, return the dict"""
+        parsed = self.parse(raw)
+        now = time.time()
+        self._remember(key, parsed, now)
+        if len(raw) <= MAX_BLOB_BYTES:
+            self._store_raw(key, raw, now)
+        with self._lock:
+            self.stats['stores'] += 1
+        return parsed
+
+    def invalidate(self, folder, uidvalidity, uids):
+        """Forget messages in `folder` (after a flag change or delete)"""
+        keys = [(folder, uidvalidity, int(uid)) for uid in uids]
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._drop_memory(key)
+            self.stats['invalidations'] += len(keys)
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.executemany("DELETE FROM message_blobs WHERE folder = ? AND uidvalidity = ? AND uid = ?", keys)
+            # Tell the other workers, whose memory tiers may hold the same keys
+            conn.executemany('''INSERT INTO message_invalidations (folder, uidvalidity, uid, logged_at)
+                VALUES (?, ?, ?, ?)''', [key + (now,) for key in keys])
+        conn.close()
+
+    def _apply_invalidations(self, now):
+        """Drop memory entries other workers have invalidated since the last check"""
+        if now - self._invalidations_checked < INVALIDATION_CHECK:
+            return
+        self._invalidations_checked = now
+        conn = self._connect()
+        try:
+            rows = conn.execute('''SELECT seq, folder, uidvalidity, uid FROM message_invalidations
+                WHERE seq > ? ORDER BY seq''', (self._invalidations_seen,)).fetchall()
+        finally:
+            conn.close()
+        with self._lock:
+            for seq, folder, uidvalidity, uid in rows:
+                if (folder, uidvalidity, uid) in self._memory:
+                    self._drop_memory((folder, uidvalidity, uid))
+                self._invalidations_seen = max(self._invalidations_seen, seq)
+
+    # ====== TIER 1: MEMORY ======
+
+    def _remember(self, key, parsed, now):
+        size = _parsed_size(parsed)
+        with self._lock:
+            if key in self._memory:
+                self._drop_memory(key)
+            self._memory[key] = (parsed, size, now)
+            self._memory_used += size
+            while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+                self._drop_memory(next(iter(self._memory)))
+                self.stats['memory_evictions'] += 1
+
+    def _drop_memory(self, key):
+        _, size, _ = self._memory.pop(key)
+        self._memory_used -= size
+
+    # ====== TIER 2: DISK ======
+
+    def _load_raw(self, keys, now):
+        conn = self._connect()
+        try:
+            found = {}
+            for key in keys:
+                row = conn.execute('''SELECT raw FROM message_blobs
+                    WHERE folder = ? AND uidvalidity = ? AND uid = ? AND stored_at >= ?''',
+                    key + (now - self.max_age,)).fetchone()
+                if row is not None:
+                    found[key] = row[0]
+            if found:
+                with conn:
+                    conn.executemany('''UPDATE message_blobs SET accessed_at = ?
+                        WHERE folder = ? AND uidvalidity = ? AND uid = ?''',
+                        [(now,) + key for key in found])
+            return found
+        finally:
+            conn.close()
+
+    def _store_raw(self, key, raw, now):
+        conn = self._connect()
+        try:
+            with conn:
+                # An upsert, not INSERT OR REPLACE: REPLACE's implicit delete skips the counter triggers
+                conn.execute('''INSERT INTO message_blobs
+                    (folder, uidvalidity, uid, raw, size, stored_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(folder, uidvalidity, uid) DO UPDATE SET raw = excluded.raw, size = excluded.size,
+                    stored_at = excluded.stored_at, accessed_at = excluded.accessed_at''',
+                    key + (raw, len(raw), now, now))
+                # Least recently read first, until the store fits its budget again
+                used = self._disk_counter(conn, 'bytes')
+                evicted = 0
+                while used > self.disk_bytes:
+                    oldest = conn.execute('''SELECT folder, uidvalidity, uid, size FROM message_blobs
+                        ORDER BY accessed_at LIMIT ?''', (EVICT_BATCH,)).fetchall()
+                    if not oldest:
+                        break
+                    for folder, uidvalidity, uid, size in oldest:
+                        if used <= self.disk_bytes:
+                            break
+                        conn.execute("DELETE FROM message_blobs WHERE folder = ? AND uidvalidity = ? AND uid = ?",
+                                     (folder, uidvalidity, uid))
+                        used -= size
+                        evicted += 1
+                if evicted:
+                    with self._lock:
+                        self.stats['disk_evictions'] += evicted
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _disk_counter(conn, key):
+        row = conn.execute("SELECT value FROM message_cache_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def metrics(self):
+        """Hit/miss counters and tier sizes for health endpoints"""
+        conn = self._connect()
+        entries, used = self._disk_counter(conn, 'entries'), self._disk_counter(conn, 'bytes')
+        conn.close()
+        with self._lock:
+            metrics = dict(self.stats)
+            metrics.update(memory_entries=len(self._memory), memory_bytes=self._memory_used,
+                           memory_limit=self.memory_bytes, disk_entries=entries, disk_bytes=used,
+                           disk_limit=self.disk_bytes, max_age_s=self.max_age)
+        lookups = metrics['memory_hits'] + metrics['disk_hits'] + metrics['misses']
+        metrics['hit_rate'] = round((metrics['memory_hits'] + metrics['disk_hits']) / lookups, 3) if lookups else None
+        return metrics
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+"""
+BANF RSVP Store
+================
+Persistent RSVP tally for gmail_service.py /api/gmail/rsvp-check.
+
+Replies to evites ("RSVP YES - <Event> - <Name>") are read from INBOX
+incrementally by UID, using the same (UIDVALIDITY, last UID) checkpoint
+as the Zelle poller and the search index, so each reply is fetched and
+parsed once; a reply that fails to parse is recorded in rsvp_failures
+and retried on later syncs. A reply whose Date header does not parse is
+dated by its INTERNALDATE (arrival in the mailbox) instead. Replies are
+keyed by (event, sender): a newer reply from the same person replaces
+their earlier one. Per-event totals live in rsvp_tallies and are kept
+current by triggers, so reading them costs one small query however many
+replies there are; totals over a recent window are one grouped query on
+the replied_at index.
+"""
+
+import email
+import re
+import sqlite3
+import threading
+import time
+from email.header import decode_header
+from email.utils import parseaddr, parsedate_to_datetime
+
+import imap_client
+
+SEARCH_CRITERIA = 'SUBJECT "RSVP"'
+SYNC_BATCH = 100          # replies read per sync() call by default
+MAX_ATTEMPTS = 3          # parses tried before a reply is left in rsvp_failures
+
+STATUSES = (
+    ("RSVP YES", "attending"),
+    ("RSVP MAYBE", "maybe"),
+    ("RSVP NO", "not_attending"),
+)
+
+_SUBJECT_RE = re.compile(r'RSVP\s+\w+\s*-\s*([^-]+)-\s*(.+)', re.IGNORECASE)
+_ADULTS_RE = re.compile(r'Adults?:\s*(\d+)', re.IGNORECASE)
+_KIDS_RE = re.compile(r'Kids?:\s*(\d+)', re.IGNORECASE)
+_DIETARY_RE = re.compile(r'Dietary:\s*(.+)', re.IGNORECASE)
+
+# rsvp_replies.status -> tally column
+_STATUS_COLUMNS = {'attending': 'attending', 'maybe': 'maybe', 'not_attending': 'declined', 'unknown': 'unknown'}
+
+# Tally columns: name -> per-reply SQL expression over a rsvp_replies row (NEW./OLD.)
+_TALLY_COLUMNS = {
+    'total': "1",
+    'attending': "({r}.status = 'attending')",
+    'maybe': "({r}.status = 'maybe')",
+    'declined': "({r}.status = 'not_attending')",
+    'unknown': "({r}.status = 'unknown')",
+    'adults': "(CASE WHEN {r}.status = 'attending' THEN COALESCE({r}.adults, 0) ELSE 0 END)",
+    'kids': "(CASE WHEN {r}.status = 'attending' THEN COALESCE({r}.kids, 0) ELSE 0 END)",
+}
+
+
+def _decode(value):
+    if not value:
+        return ""
+    return "".join(part.decode(enc or 'utf-8', errors='replace') if isinstance(part, bytes) else part
+                   for part, enc in decode_header(value))
+
+
+def event_key(name):
+    """Normalized event name used as the tally key"""
+    return " ".join((name or "").lower().split())
+
+
+def parse_rsvp(raw):
+    """Parse one RSVP reply (RFC822 bytes) into the fields stored in rsvp_replies"""
+    msg = email.message_from_bytes(raw)
+    subject = _decode(msg.get("Subject", ""))
+    from_addr = _decode(msg.get("From", ""))
+    date_str = msg.get("Date", "")
+
+    subject_upper = subject.upper()
+    status = next((s for marker, s in STATUSES if marker in subject_upper), "unknown")
+
+    body = ""
+    for part in (msg.walk() if msg.is_multipart() else [msg]):
+        if part.get_content_type() == "text/plain" or not msg.is_multipart():
+            payload = part.get_payload(decode=True)
+            if payload:
+                body = payload.decode(part.get_content_charset() or 'utf-8', errors='replace')
+            break
+
+    # Subject: RSVP YES - EventName - MemberName
+    subject_match = _SUBJECT_RE.search(subject)
+    adults = _ADULTS_RE.search(body)
+    kids = _KIDS_RE.search(body)
+    dietary = _DIETARY_RE.search(body)
+    try:
+        replied_at = parsedate_to_datetime(date_str).timestamp()
+    except (TypeError, ValueError, IndexError):
+        replied_at = 0.0
+
+    return {
+        "event": event_key(subject_match.group(1)) if subject_match else "",
+        "sender": (parseaddr(from_addr)[1] or from_addr).lower(),
+        "from": from_addr,
+        "name": subject_match.group(2).strip() if subject_match else from_addr,
+        "status": status,
+        "subject": subject,
+        "date": date_str,
+        "replied_at": replied_at,
+        "adults": int(adults.group(1)) if adults else None,
+        "kids": int(kids.group(1)) if kids else None,
+        "dietary": dietary.group(1).strip() if dietary else None,
+        "raw_body": body[:500],
+    }
+
+
+def _tally_trigger_sql():
+    """Triggers that keep rsvp_tallies equal to an aggregate over rsvp_replies"""
+    cols = list(_TALLY_COLUMNS)
+    add = ("INSERT INTO rsvp_tallies (event, " + ", ".join(cols) + ") VALUES (NEW.event, " +
+           ", ".join(_TALLY_COLUMNS[c].format(r='NEW') for c in cols) + ") ON CONFLICT(event) DO UPDATE SET " +
+           ", ".join(f"{c} = {c} + excluded.{c}" for c in cols) + ";")
+    sub = ("UPDATE rsvp_tallies SET " + ", ".join(f"{c} = {c} - {_TALLY_COLUMNS[c].format(r='OLD')}" for c in cols) +
+           " WHERE event = OLD.event;")
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS rsvp_replies_tally_ai AFTER INSERT ON rsvp_replies BEGIN {add} END",
+        f"CREATE TRIGGER IF NOT EXISTS rsvp_replies_tally_ad AFTER DELETE ON rsvp_replies BEGIN {sub} END",
+        f"CREATE TRIGGER IF NOT EXISTS rsvp_replies_tally_au AFTER UPDATE ON rsvp_replies BEGIN {sub} {add} END",
+    ]
+
+
+class RSVPStore:
+    """RSVP replies and per-event tallies in SQLite, synced from INBOX by UID"""
+
+    def __init__(self, db_path, sync_batch=SYNC_BATCH):
+        self.db_path = db_path
+        self.sync_batch = sync_batch
+        self._sync_lock = threading.Lock()
+        self.init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def init_db(self):
+        conn = self._connect()
+        with conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS rsvp_sync_state (
+                folder TEXT PRIMARY KEY,
+                uidvalidity INTEGER,
+                last_uid INTEGER DEFAULT 0,
+                synced_at REAL
+            )''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS rsvp_replies (
+                event TEXT NOT NULL,
+                sender TEXT NOT NULL,
+                from_addr TEXT,
+                name TEXT,
+                status TEXT NOT NULL,
+                adults INTEGER,
+                kids INTEGER,
+                dietary TEXT,
+                subject TEXT,
+                date TEXT,
+                replied_at REAL,
+                uid INTEGER,
+                raw_body TEXT,
+                PRIMARY KEY (event, sender)
+            )''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_rsvp_replies_replied ON rsvp_replies (replied_at)")
+            conn.execute('''CREATE TABLE IF NOT EXISTS rsvp_failures (
+                folder TEXT NOT NULL,
+                uid INTEGER NOT NULL,
+                uidvalidity INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 1,
+                error TEXT,
+                failed_at REAL,
+                PRIMARY KEY (folder, uid)
+            )''')
+            conn.execute('''CREATE TABLE IF NOT EXISTS rsvp_tallies (
+                event TEXT PRIMARY KEY,
+                ''' + ",\n                ".join(f"{c} INTEGER NOT NULL DEFAULT 0" for c in _TALLY_COLUMNS) + '''
+            )''')
+            for sql in _tally_trigger_sql():
+                conn.execute(sql)
+        conn.close()
+
+    # ====== SYNC ======
+
+    def sync(self, mail, uidvalidity, folder="INBOX", limit=None):
+        """
+        Ingest up to `limit` (default sync_batch; 0 = all) RSVP replies that
+        arrived since the checkpoint, oldest first, and, on the call that
+        catches up, retry replies that failed to parse before. `mail` must have `folder` selected. Returns
+        {'read', 'pending', 'failed', 'busy'}; pending > 0 means the store
+        is still catching up. If another thread is already syncing, returns
+        immediately with busy=True.
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return {'read': 0, 'pending': None, 'failed': 0, 'busy': True}
+        try:
+            conn = self._connect()
+            try:
+                row = conn.execute("SELECT uidvalidity, last_uid FROM rsvp_sync_state WHERE folder = ?",
+                                   (folder,)).fetchone()
+                # A new UIDVALIDITY just means re-reading everything; upserts keep it idempotent
+                last_uid = row['last_uid'] if row and row['uidvalidity'] == uidvalidity else 0
+                uids = imap_client.new_uids_since(mail, last_uid, SEARCH_CRITERIA)
+                limit = self.sync_batch if limit is None else limit
+                todo = uids[:limit] if limit else uids
+                # Earlier failures are retried once per catch-up: by the call that reaches the end
+                retry = [r[0] for r in conn.execute('''SELECT uid FROM rsvp_failures
+                    WHERE folder = ? AND uidvalidity = ? AND attempts < ?''',
+                    (folder, uidvalidity, MAX_ATTEMPTS))] if len(todo) == len(uids) else []
+
+                replies = []
+                failures = {uid: "not returned by the server" for uid in set(retry) | set(todo)}
+                for uid, attrs in imap_client.fetch_messages(mail, sorted(failures), "(INTERNALDATE BODY.PEEK[])",
+                                                             uid=True):
+                    raw = imap_client.section(attrs, 'BODY[')
+                    if raw is None:
+                        continue
+                    try:
+                        reply = dict(parse_rsvp(raw), uid=uid)
+                    except Exception as e:
+                        failures[uid] = f"{type(e).__name__}: {e}"
+                        continue
+                    if not reply['replied_at']:
+                        # No usable Date header: date the reply by its arrival in the mailbox
+                        reply['replied_at'] = imap_client.internal_date(attrs.get('INTERNALDATE')) or 0.0
+                    replies.append(reply)
+                    del failures[uid]
+
+                with conn:
+                    # Latest reply per (event, sender) wins; UID breaks ties in the Date header
+                    conn.executemany('''INSERT INTO rsvp_replies (event, sender, from_addr, name, status, adults,
+                            kids, dietary, subject, date, replied_at, uid, raw_body)
+                        VALUES (:event, :sender, :from, :name, :status, :adults, :kids, :dietary, :subject, :date,
+                            :replied_at, :uid, :raw_body)
+                        ON CONFLICT(event, sender) DO UPDATE SET
+                            from_addr = excluded.from_addr, name = excluded.name, status = excluded.status,
+                            adults = excluded.adults, kids = excluded.kids, dietary = excluded.dietary,
+                            subject = excluded.subject, date = excluded.date, replied_at = excluded.replied_at,
+                            uid = excluded.uid, raw_body = excluded.raw_body
+                        WHERE (excluded.replied_at, excluded.uid) > (rsvp_replies.replied_at, rsvp_replies.uid)''',
+                        replies)
+                    # Failed UIDs are recorded for retry, so the checkpoint can move past them
+                    conn.execute("DELETE FROM rsvp_failures WHERE folder = ? AND uidvalidity IS NOT ?",
+                                 (folder, uidvalidity))
+                    conn.executemany("DELETE FROM rsvp_failures WHERE folder = ? AND uid = ?",
+                                     [(folder, r['uid']) for r in replies])
+                    conn.executemany('''INSERT INTO rsvp_failures (folder, uid, uidvalidity, attempts, error, failed_at)
+                        VALUES (?, ?, ?, 1, ?, ?) ON CONFLICT(folder, uid) DO UPDATE SET
+                        attempts = attempts + 1, error = excluded.error, failed_at = excluded.failed_at''',
+                        [(folder, uid, uidvalidity, error, time.time()) for uid, error in failures.items()])
+                    conn.execute('''INSERT INTO rsvp_sync_state (folder, uidvalidity, last_uid, synced_at)
+                        VALUES (?, ?, ?, ?) ON CONFLICT(folder) DO UPDATE SET
+                        uidvalidity = excluded.uidvalidity, last_uid = excluded.last_uid,
+                        synced_at = excluded.synced_at''',
+                        (folder, uidvalidity, max(todo, default=last_uid), time.time()))
+                return {'read': len(replies), 'pending': len(uids) - len(todo), 'failed': len(failures),
+                        'busy': False}
+            finally:
+                conn.close()
+        finally:
+            self._sync_lock.release()
+
+    def failures(self, folder="INBOX"):
+        """Replies that could not be parsed; each is retried until it has failed MAX_ATTEMPTS times"""
+        conn = self._connect()
+        try:
+            return [dict(r) for r in conn.execute('''SELECT uid, attempts, error, failed_at FROM rsvp_failures
+                WHERE folder = ? ORDER BY uid''', (folder,))]
+        finally:
+            conn.close()
+
+    # ====== READS ======
+
+    def _events(self, conn, event_name):
+        """Event keys matching `event_name` (substring, like the IMAP SUBJECT search did); None = all"""
+        if not event_name:
+            return None
+        return [r[0] for r in conn.execute("SELECT event FROM rsvp_tallies WHERE instr(event, ?) > 0",
+                                           (event_key(event_name),))]
+
+    def tally(self, event_name="", since=None):
+        """
+        Totals for the matching events: the running totals, or with `since`
+        (a timestamp) one grouped count over the replies made since then
+        """
+        conn = self._connect()
+        try:
+            events = self._events(conn, event_name)
+            in_events = f"event IN ({','.join('?' * len(events))})" if events is not None else None
+            if since is None:
+                sql = "SELECT " + ", ".join(f"COALESCE(SUM({c}), 0) AS {c}" for c in _TALLY_COLUMNS) + " FROM rsvp_tallies"
+                if in_events:
+                    sql += f" WHERE {in_events}"
+                return dict(conn.execute(sql, events or []).fetchone())
+
+            sql = '''SELECT status, COUNT(*), SUM(COALESCE(adults, 0)), SUM(COALESCE(kids, 0))
+                FROM rsvp_replies WHERE replied_at >= ?'''
+            if in_events:
+                sql += f" AND {in_events}"
+            totals = dict.fromkeys(_TALLY_COLUMNS, 0)
+            for status, count, adults, kids in conn.execute(sql + " GROUP BY status", [since] + (events or [])):
+                totals['total'] += count
+                totals[_STATUS_COLUMNS.get(status, 'unknown')] += count
+                if status == 'attending':
+                    totals['adults'], totals['kids'] = adults, kids
+            return totals
+        finally:
+            conn.close()
+
+    def synced_at(self, folder="INBOX"):
+        """When `folder` was last synced (timestamp), or None"""
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT synced_at FROM rsvp_sync_state WHERE folder = ?", (folder,)).fetchone()
+            return row['synced_at'] if row else None
+        finally:
+            conn.close()
+
+    def replies(self, event_name="", since=None):
+        """Current reply per person for the matching events, newest first"""
+        conn = self._connect()
+        try:
+            events = self._events(conn, event_name)
+            clauses, params = [], []
+            if events is not None:
+                clauses.append(f"event IN ({','.join('?' * len(events))})")
+                params += events
+            if since is not None:
+                clauses.append("replied_at >= ?")
+                params.append(since)
+            where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+            rows = conn.execute(f'''SELECT event, from_addr, name, status, subject, date, adults, kids, dietary, raw_body
+                FROM rsvp_replies {where} ORDER BY replied_at DESC, uid DESC''', params).fetchall()
+            return [{"event": r['event'], "from": r['from_addr'], "name": r['name'], "status": r['status'],
+                     "subject": r['subject'], "date": r['date'], "adults": r['adults'], "kids": r['kids'],
+                     "dietary": r['dietary'], "raw_body": r['raw_body']} for r in rows]
+        finally:
+            conn.close()
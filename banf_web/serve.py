@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""
+BANF Service Runner
+====================
+Production entry point for gmail_service.py and zelle_payment_service.py.
+
+`python gmail_service.py` runs Flask's development server: one process
+starting a thread per request, with no limit, no timeouts and nothing to
+restart a wedged process. This runs the same app under gunicorn instead:
+several worker processes, each with a fixed thread pool.
+
+Usage:
+  python serve.py gmail                           # port 5001
+  python serve.py zelle --workers 4 --threads 8   # port 5002
+  python serve.py zelle --bind 127.0.0.1:8002 --pid /run/banf-zelle.pid
+
+Options fall back to SERVE_WORKERS, SERVE_THREADS, SERVE_TIMEOUT,
+SERVE_GRACEFUL_TIMEOUT and SERVE_MAX_REQUESTS.
+
+Reload: `kill -HUP <master pid>` starts workers on the current code and
+lets the old ones finish their requests (up to --graceful-timeout).
+
+Timeouts: IMAP (IMAP_TIMEOUT), SMTP and SQLite calls all have their own
+timeouts, so a slow upstream fails the request instead of holding a
+thread. --timeout restarts a worker that stops responding altogether.
+
+Background work (the Zelle poller, bulk mail delivery, search index and RSVP sync)
+runs in exactly one worker, chosen by a lock file (leader.py). If that
+worker exits, another takes over within seconds. Every worker keeps its
+own IMAP pool, so keep workers x IMAP_POOL_SIZE under Gmail's limit of
+about 15 sessions.
+
+Needs gunicorn (pip install gunicorn). On Windows, where gunicorn does not
+run, waitress (pip install waitress) serves one process with --threads.
+"""
+
+import argparse
+import importlib
+import importlib.util
+import os
+import sys
+import tempfile
+
+import leader
+
+SERVICES = {
+    'gmail': ('gmail_service', 5001),
+    'zelle': ('zelle_payment_service', 5002),
+}
+
+WORKERS = int(os.getenv("SERVE_WORKERS", "2"))
+THREADS = int(os.getenv("SERVE_THREADS", "8"))
+TIMEOUT = int(os.getenv("SERVE_TIMEOUT", "120"))             # seconds before a silent worker is restarted
+GRACEFUL_TIMEOUT = int(os.getenv("SERVE_GRACEFUL_TIMEOUT", "30"))  # seconds to finish requests on reload/stop
+MAX_REQUESTS = int(os.getenv("SERVE_MAX_REQUESTS", "0"))     # recycle workers after N requests (0 = never)
+GMAIL_SESSION_LIMIT = 15
+
+
+def load_app(service, init_lock):
+    """
+    Import a service in a worker and start its background election. Workers
+    import one at a time (init_lock) so schema setup never runs concurrently.
+    """
+    module_name, _ = SERVICES[service]
+    with leader.file_lock(init_lock):
+        module = importlib.import_module(module_name)
+        if service == 'zelle':
+            module.init_db()
+    module.start_background()
+    return module.app
+
+
+def serve_gunicorn(service, args, init_lock):
+    from gunicorn.app.base import BaseApplication
+
+    options = {
+        'bind': args.bind,
+        'workers': args.workers,
+        'worker_class': 'gthread',
+        'threads': args.threads,
+        'timeout': args.timeout,
+        'graceful_timeout': args.graceful_timeout,
+        'keepalive': 5,
+        'max_requests': args.max_requests,
+        'max_requests_jitter': args.max_requests // 10,
+        # Each worker imports the app itself: leader locks and pools must not be shared across fork()
+        'preload_app': False,
+        'reload': args.reload,
+        'pidfile': args.pid,
+        'accesslog': args.access_log,
+        'proc_name': f"banf-{service}",
+        'on_exit': lambda server: _remove(init_lock),
+    }
+
+    class ServiceApplication(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                if value is not None:
+                    self.cfg.set(key, value)
+
+        def load(self):
+            return load_app(service, init_lock)
+
+    ServiceApplication().run()
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def serve_waitress(service, args, init_lock):
+    import waitress
+
+    if args.workers > 1:
+        print(f"[SERVE] waitress runs a single process; ignoring --workers {args.workers}")
+    host, _, port = args.bind.rpartition(':')
+    waitress.serve(load_app(service, init_lock), host=host or '0.0.0.0', port=int(port),
+                   threads=args.threads, channel_timeout=args.timeout, ident=f"banf-{service}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a BANF service with worker processes")
+    parser.add_argument('service', choices=sorted(SERVICES))
+    parser.add_argument('--bind', help="host:port (default 0.0.0.0:<service port>)")
+    parser.add_argument('--workers', type=int, default=WORKERS)
+    parser.add_argument('--threads', type=int, default=THREADS, help="request threads per worker")
+    parser.add_argument('--timeout', type=int, default=TIMEOUT)
+    parser.add_argument('--graceful-timeout', type=int, default=GRACEFUL_TIMEOUT)
+    parser.add_argument('--max-requests', type=int, default=MAX_REQUESTS)
+    parser.add_argument('--reload', action='store_true', help="restart workers when code changes (development)")
+    parser.add_argument('--pid', help="write the master PID here (for kill -HUP)")
+    parser.add_argument('--access-log', help="'-' for stdout")
+    parser.add_argument('--server', choices=('gunicorn', 'waitress'),
+                        default='waitress' if os.name == 'nt' else 'gunicorn')
+    args = parser.parse_args(argv)
+    args.bind = args.bind or f"0.0.0.0:{SERVICES[args.service][1]}"
+
+    if args.service == 'gmail' and args.server == 'gunicorn':
+        sessions = args.workers * int(os.getenv("IMAP_POOL_SIZE", "4"))
+        if sessions > GMAIL_SESSION_LIMIT:
+            print(f"[SERVE] Warning: {args.workers} workers x IMAP_POOL_SIZE may open {sessions} IMAP sessions; "
+                  f"Gmail allows about {GMAIL_SESSION_LIMIT}")
+
+    if importlib.util.find_spec(args.server) is None:
+        print(f"[SERVE] {args.server} is not installed: pip install {args.server}")
+        return 1
+
+    init_lock = os.path.join(tempfile.gettempdir(), f"banf_{args.service}_{os.getpid()}.init.lock")
+    serve = serve_gunicorn if args.server == 'gunicorn' else serve_waitress
+    serve(args.service, args, init_lock)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
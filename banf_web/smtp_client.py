@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+BANF SMTP Helpers
+==================
+Pooled SMTP delivery for gmail_service.py.
+
+Opening smtplib.SMTP, STARTTLS and LOGIN per recipient costs several
+round-trips and an auth hit on Gmail every time. SMTPPool keeps a few
+authenticated sessions alive and reuses them for many `sendmail` calls.
+It reconnects on 421 / disconnects and reports an outcome per recipient.
+"""
+
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def is_retryable(exc):
+    """True if the session is dead (disconnect, 421, socket error) but the message may be retried"""
+    if isinstance(exc, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return exc.smtp_code == 421
+    # SMTPException subclasses OSError; only plain socket errors count here
+    return isinstance(exc, OSError) and not isinstance(exc, smtplib.SMTPException)
+
+
+class SMTPPool:
+    """
+    Bounded, thread-safe pool of authenticated SMTP sessions.
+
+    `factory` returns a connected, logged-in smtplib.SMTP. Sessions are
+    NOOP-checked when idle longer than `health_check_after` seconds and
+    recycled after `max_messages_per_session` sends, since Gmail closes
+    long-lived sessions on its own.
+    """
+
+    def __init__(self, factory, max_size=3, health_check_after=30,
+                 max_messages_per_session=100, acquire_timeout=60):
+        self.factory = factory
+        self.max_size = max_size
+        self.health_check_after = health_check_after
+        self.max_messages_per_session = max_messages_per_session
+        self.acquire_timeout = acquire_timeout
+        self._idle = []  # [server, last_used, sent_count]
+        self._size = 0
+        self._cond = threading.Condition()
+        self.stats = {
+            'sessions_opened': 0,
+            'reused': 0,
+            'reconnects': 0,
+            'sent': 0,
+            'failed': 0,
+        }
+
+    def _open(self):
+        server = self.factory()
+        with self._cond:
+            self.stats['sessions_opened'] += 1
+        return [server, time.monotonic(), 0]
+
+    def _acquire(self):
+        started = time.monotonic()
+        with self._cond:
+            while not self._idle and self._size >= self.max_size:
+                remaining = self.acquire_timeout - (time.monotonic() - started)
+                if remaining <= 0:
+                    raise TimeoutError(f"No SMTP session free after {self.acquire_timeout}s")
+                self._cond.wait(remaining)
+            if self._idle:
+                session = self._idle.pop()
+                self.stats['reused'] += 1
+            else:
+                session = None
+                self._size += 1
+
+        try:
+            if session is None:
+                return self._open()
+            if time.monotonic() - session[1] > self.health_check_after:
+                try:
+                    if session[0].noop()[0] != 250:
+                        raise smtplib.SMTPServerDisconnected("NOOP failed")
+                except Exception:
+                    self._quit(session[0])
+                    with self._cond:
+                        self.stats['reconnects'] += 1
+                    return self._open()
+            return session
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, session):
+        if session[2] >= self.max_messages_per_session:
+            self._discard(session)
+            return
+        session[1] = time.monotonic()
+        with self._cond:
+            self._idle.append(session)
+            self._cond.notify()
+
+    def _discard(self, session):
+        self._quit(session[0])
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    @staticmethod
+    def _quit(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def send(self, from_addr, to_addrs, message):
+        """
+        Send one message on a pooled session, reconnecting and retrying
+        once if the session was dropped. Returns sendmail's refused dict.
+        """
+        session = self._acquire()
+        try:
+            try:
+                refused = session[0].sendmail(from_addr, to_addrs, message)
+            except Exception as e:
+                if not is_retryable(e):
+                    raise
+                self._quit(session[0])
+                with self._cond:
+                    self.stats['reconnects'] += 1
+                session[:] = self._open()
+                refused = session[0].sendmail(from_addr, to_addrs, message)
+        except Exception as e:
+            if is_retryable(e) or isinstance(e, smtplib.SMTPAuthenticationError):
+                self._discard(session)
+            else:
+                # A refused recipient/message leaves the session usable
+                self._release(session)
+            raise
+        session[2] += 1
+        self._release(session)
+        return refused
+
+    def send_many(self, messages, from_addr, workers=None):
+        """
+        Deliver many single-recipient messages across the pooled sessions.
+        `messages` is a list of (recipient_email, message). Returns one
+        {"email", "status", "error"} outcome per message, in order.
+        """
+        auth_failed = threading.Event()
+
+        def deliver(item):
+            recipient, message = item
+            try:
+                # Don't hammer Gmail with LOGINs once the credentials are known bad
+                if auth_failed.is_set():
+                    raise smtplib.SMTPAuthenticationError(535, b"skipped after earlier auth failure")
+                refused = self.send(from_addr, [recipient], message)
+                if refused:
+                    raise smtplib.SMTPRecipientsRefused(refused)
+                outcome = {"email": recipient, "status": "sent"}
+            except smtplib.SMTPAuthenticationError:
+                auth_failed.set()
+                outcome = {"email": recipient, "status": "failed",
+                           "error": "Gmail auth failed. Use an App Password (see https://myaccount.google.com/apppasswords)"}
+            except Exception as e:
+                outcome = {"email": recipient, "status": "failed", "error": str(e)}
+            with self._cond:
+                self.stats['sent' if outcome['status'] == 'sent' else 'failed'] += 1
+            return outcome
+
+        if not messages:
+            return []
+        workers = min(workers or self.max_size, len(messages))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(deliver, messages))
+
+    def metrics(self):
+        """Pool counters for health endpoints"""
+        with self._cond:
+            metrics = dict(self.stats)
+            metrics.update(size=self._size, idle=len(self._idle), max_size=self.max_size)
+        return metrics
@@ -0,0 +1,45 @@
+"""
+Shared fixtures. The services read their database paths from the
+environment at import time, so those point at a scratch directory before
+anything imports them; each test then gets its own fresh database.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+SERVICE_DIR = Path(__file__).resolve().parent.parent
+TESTS_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(SERVICE_DIR))
+sys.path.insert(0, str(TESTS_DIR))
+
+SCRATCH_DIR = tempfile.mkdtemp(prefix="banf_tests_")
+os.environ.setdefault('GMAIL_DB_PATH', os.path.join(SCRATCH_DIR, 'gmail.db'))
+os.environ.setdefault('ZELLE_DB_PATH', os.path.join(SCRATCH_DIR, 'zelle.db'))
+os.environ.setdefault('ZELLE_POLLER_AUTOSTART', '0')
+
+
+@pytest.fixture
+def zps(tmp_path, monkeypatch):
+    """zelle_payment_service on a fresh, migrated database"""
+    import zelle_payment_service as zps
+
+    monkeypatch.setattr(zps, 'DB_PATH', str(tmp_path / "zelle.db"))
+    monkeypatch.setattr(zps, 'member_index', zps.MemberIndex())
+    zps.init_db()
+    yield zps
+    conn = zps._db_local.conns.pop(zps.DB_PATH, None)
+    if conn is not None:
+        conn.close()
+
+
+@pytest.fixture
+def imap_server():
+    """A FakeIMAPServer on a free local port, shut down after the test"""
+    from fake_imap import FakeIMAPServer
+
+    with FakeIMAPServer() as server:
+        yield server
@@ -0,0 +1,284 @@
+"""
+A local IMAP stand-in for tests: one INBOX served over plain TCP, enough
+of the protocol for imap_client and the Zelle poller (LOGIN, SELECT /
+EXAMINE, SEARCH, FETCH, STORE and their UID forms, EXPUNGE, IDLE, NOOP,
+LOGOUT). STORE and EXPUNGE are refused after EXAMINE, as a real server
+does. push() sends untagged lines to every client in IDLE; `commands`
+logs every command received.
+"""
+
+import re
+import socketserver
+import threading
+import time
+from datetime import datetime
+from email import message_from_bytes
+from email.utils import parsedate_to_datetime
+
+import imap_client
+
+
+def _uid_set(spec, largest):
+    """'1:3,7,9:*' -> set of UIDs"""
+    uids = set()
+    for part in spec.split(','):
+        lo, _, hi = part.partition(':')
+        lo = largest if lo == '*' else int(lo)
+        hi = lo if not hi else largest if hi == '*' else int(hi)
+        uids.update(range(min(lo, hi), max(lo, hi) + 1))
+    return uids
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def send(self, data):
+        self.wfile.write(data if isinstance(data, bytes) else data.encode())
+        self.wfile.flush()
+
+    def handle(self):
+        self.send("* OK [CAPABILITY IMAP4rev1 IDLE] fake IMAP ready\r\n")
+        for line in self.rfile:
+            tag, _, rest = line.decode().rstrip('\r\n').partition(' ')
+            with self.server.lock:
+                self.server.commands.append(rest)
+            command, _, args = rest.partition(' ')
+            command = command.upper()
+            if command == 'UID':
+                command, _, args = args.partition(' ')
+                command = 'UID ' + command.upper()
+            handler = getattr(self, 'do_' + command.replace(' ', '_'), None)
+            if handler is None:
+                self.send(f"{tag} BAD unknown command {command}\r\n")
+                continue
+            if handler(tag, args) is False:
+                return
+
+    def do_CAPABILITY(self, tag, args):
+        self.send(f"* CAPABILITY IMAP4rev1 IDLE\r\n{tag} OK CAPABILITY done\r\n")
+
+    def do_LOGIN(self, tag, args):
+        self.send(f"{tag} OK LOGIN done\r\n")
+
+    def do_NOOP(self, tag, args):
+        self.send(f"{tag} OK NOOP done\r\n")
+
+    def do_SELECT(self, tag, args, readonly=False):
+        server = self.server
+        self.readonly = readonly
+        with server.lock:
+            exists, uidvalidity, uidnext = len(server.messages), server.uidvalidity, server.uidnext
+        self.send(f"* {exists} EXISTS\r\n* OK [UIDVALIDITY {uidvalidity}] UIDs valid\r\n"
+                  f"* OK [UIDNEXT {uidnext}] next UID\r\n"
+                  f"{tag} OK [{'READ-ONLY' if readonly else 'READ-WRITE'}] SELECT done\r\n")
+
+    def do_EXAMINE(self, tag, args):
+        self.do_SELECT(tag, args, readonly=True)
+
+    def do_UID_SEARCH(self, tag, args):
+        self._search(tag, args, by_uid=True)
+
+    def do_SEARCH(self, tag, args):
+        self._search(tag, args, by_uid=False)
+
+    def _search(self, tag, args, by_uid):
+        with self.server.lock:
+            messages = dict(self.server.messages)
+        uids = set(messages)
+        match = re.match(r'UID (\S+)', args)
+        if match:
+            uids &= _uid_set(match.group(1), max(messages, default=0))
+        terms = re.findall(r'(?:BODY|SUBJECT|FROM) "([^"]*)"', args)
+        if terms:
+            # Any term anywhere in the message: enough for (OR SUBJECT .. BODY ..) searches
+            uids = {u for u in uids if any(t.lower().encode() in messages[u].lower() for t in terms)}
+        seq_of = {uid: seq for seq, uid in enumerate(sorted(messages), 1)}
+        found = sorted(uids) if by_uid else [seq_of[u] for u in sorted(uids)]
+        self.send(f"* SEARCH {' '.join(map(str, found))}\r\n{tag} OK SEARCH done\r\n")
+
+    def do_UID_FETCH(self, tag, args):
+        self._fetch(tag, args, by_uid=True)
+
+    def do_FETCH(self, tag, args):
+        self._fetch(tag, args, by_uid=False)
+
+    def _fetch(self, tag, args, by_uid):
+        spec, _, items = args.partition(' ')
+        with self.server.lock:
+            messages = dict(self.server.messages)
+        ordered = sorted(messages)
+        wanted = _uid_set(spec, max(ordered) if by_uid else len(ordered)) if ordered else set()
+        for seq, uid in enumerate(ordered, 1):
+            if (uid if by_uid else seq) not in wanted:
+                continue
+            out = f"* {seq} FETCH (UID {uid}".encode()
+            if 'INTERNALDATE' in items.upper():
+                out += f' INTERNALDATE "{self._arrived(messages[uid])}"'.encode()
+            for name, value in self._sections(messages[uid], items):
+                out += f" {name} {{{len(value)}}}\r\n".encode() + value
+            self.send(out + b")\r\n")
+        self.send(f"{tag} OK FETCH done\r\n")
+
+    @staticmethod
+    def _arrived(raw):
+        """INTERNALDATE: the Date header when it parses, else now (as if it just arrived)"""
+        try:
+            when = parsedate_to_datetime(message_from_bytes(raw).get("Date", ""))
+        except (TypeError, ValueError, IndexError):
+            when = None
+        return (when or datetime.now()).astimezone().strftime("%d-%b-%Y %H:%M:%S %z")
+
+    @staticmethod
+    def _sections(raw, items):
+        head, _, text = raw.partition(b"\r\n\r\n")
+        head += b"\r\n\r\n"
+        for spec, start, length in re.findall(r'BODY(?:\.PEEK)?\[([^\]]*)\](?:<(\d+)\.(\d+)>)?', items):
+            if spec.startswith('HEADER.FIELDS'):
+                wanted = re.search(r'\((.*)\)', spec).group(1).upper().split()
+                msg = message_from_bytes(head)
+                name, value = f"BODY[{spec}]", (''.join(f"{k}: {v}\r\n" for k, v in msg.items()
+                                                        if k.upper() in wanted) + "\r\n").encode()
+            elif spec == 'HEADER':
+                name, value = "BODY[HEADER]", head
+            elif spec == 'TEXT':
+                name, value = "BODY[TEXT]", text
+            else:
+                name, value = "BODY[]", raw
+            if start:
+                # Partial fetch: the response names only the origin octet, e.g. BODY[TEXT]<0>
+                name, value = f"{name}<{start}>", value[int(start):int(start) + int(length)]
+            yield name, value
+        if re.search(r'\bRFC822\b(?!\.)', items, re.IGNORECASE):
+            yield "RFC822", raw
+
+    def do_UID_STORE(self, tag, args):
+        self._store(tag, args, by_uid=True)
+
+    def do_STORE(self, tag, args):
+        self._store(tag, args, by_uid=False)
+
+    def _store(self, tag, args, by_uid):
+        if getattr(self, 'readonly', True):
+            self.send(f"{tag} NO [READ-ONLY] mailbox is read-only\r\n")
+            return
+        spec, _, rest = args.partition(' ')
+        action, _, flags = rest.partition(' ')
+        flags = set(flags.strip('()').split())
+        server = self.server
+        with server.lock:
+            ordered = sorted(server.messages)
+            wanted = _uid_set(spec, max(ordered) if by_uid else len(ordered)) if ordered else set()
+            for seq, uid in enumerate(ordered, 1):
+                if (uid if by_uid else seq) not in wanted:
+                    continue
+                current = server.flags.setdefault(uid, set())
+                if action.upper().startswith('-'):
+                    current -= flags
+                elif action.upper().startswith('+'):
+                    current |= flags
+                else:
+                    current.clear()
+                    current |= flags
+        self.send(f"{tag} OK STORE done\r\n")
+
+    def do_EXPUNGE(self, tag, args):
+        if getattr(self, 'readonly', True):
+            self.send(f"{tag} NO [READ-ONLY] mailbox is read-only\r\n")
+            return
+        server = self.server
+        with server.lock:
+            gone = [uid for uid in sorted(server.messages) if '\\Deleted' in server.flags.get(uid, ())]
+            seqs = [seq for seq, uid in enumerate(sorted(server.messages), 1) if uid in gone]
+            for uid in gone:
+                del server.messages[uid]
+                server.flags.pop(uid, None)
+        # Sequence numbers shift down as each message goes, so report from the highest
+        self.send("".join(f"* {seq} EXPUNGE\r\n" for seq in reversed(seqs)) + f"{tag} OK EXPUNGE done\r\n")
+
+    def do_IDLE(self, tag, args):
+        server = self.server
+        with server.lock:
+            # One write, so idle_greeting arrives in the same packet as the continuation
+            self.send(b"+ idling\r\n" + server.idle_greeting)
+            server.idlers.append(self)
+        try:
+            line = self.rfile.readline()
+        finally:
+            with server.lock:
+                server.idlers.remove(self)
+        if line.strip().upper() != b'DONE':
+            self.send(f"{tag} BAD expected DONE\r\n")
+            return False
+        with server.lock:
+            self.send(f"{tag} OK IDLE terminated\r\n")
+
+    def do_LOGOUT(self, tag, args):
+        self.send(f"* BYE logging out\r\n{tag} OK LOGOUT done\r\n")
+        return False
+
+
+class FakeIMAPServer(socketserver.ThreadingTCPServer):
+    """
+    Serves `messages` ({uid: raw RFC 822 bytes}) as INBOX. Use as a
+    context manager; connect() opens an imaplib session to it.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, messages=None, uidvalidity=1):
+        super().__init__(('127.0.0.1', 0), _Handler)
+        self.lock = threading.Lock()
+        self.messages = dict(messages or {})
+        self.uidvalidity = uidvalidity
+        self.flags = {}  # uid -> set of flags set with STORE
+        self.idle_greeting = b""  # untagged lines sent along with "+ idling"
+        self.idlers = []
+        self.commands = []
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    @property
+    def uidnext(self):
+        return max(self.messages, default=0) + 1
+
+    def reset(self, messages, uidvalidity):
+        """Replace the mailbox, e.g. renumbered under a new UIDVALIDITY as after a Gmail rebuild"""
+        with self.lock:
+            self.messages = dict(messages)
+            self.uidvalidity = uidvalidity
+            self.flags = {}
+
+    def push(self, line):
+        """Send an untagged response (e.g. b"* 3 EXISTS\\r\\n") to every client in IDLE"""
+        with self.lock:
+            for handler in self.idlers:
+                handler.send(line)
+
+    def wait_for_idle(self, timeout=5):
+        """Block until a client is in IDLE"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self.lock:
+                if self.idlers:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def login(self):
+        """A logged-in imaplib session with nothing selected (an IMAPPool factory)"""
+        return imap_client.connect('127.0.0.1', 'user', 'password', port=self.port, use_ssl=False, timeout=5)
+
+    def connect(self, folder="INBOX", readonly=True):
+        mail = self.login()
+        mail.select(folder, readonly=readonly)
+        return mail
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
+        self.server_close()
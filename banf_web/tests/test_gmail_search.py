@@ -0,0 +1,158 @@
+"""Gmail search reads the local index; only the background sync downloads mail for it"""
+
+import threading
+
+import pytest
+
+import imap_client
+import mail_index
+import message_cache
+import rsvp_store
+
+
+def message(uid, subject, body):
+    return (f"Subject: {subject}\r\nFrom: Member {uid} <member{uid}@example.com>\r\n"
+            f"To: banfjax@gmail.com\r\nDate: Mon, 2 Feb 2026 09:00:00 -0500\r\n"
+            f"Message-ID: <m{uid}@example.com>\r\n\r\n{body}\r\n").encode()
+
+
+@pytest.fixture
+def gmail(tmp_path, monkeypatch, imap_server):
+    """gmail_service on the fake IMAP server, with its own index and message cache"""
+    import gmail_service as gs
+
+    db = str(tmp_path / "gmail.db")
+    monkeypatch.setattr(gs, 'imap_pool', imap_client.IMAPPool(imap_server.login, max_size=2))
+    monkeypatch.setattr(gs, 'search_index', mail_index.MailIndex(db, gs.index_fields, sync_batch=10))
+    monkeypatch.setattr(gs, 'message_store', message_cache.MessageCache(db, gs.parse_raw_message))
+    monkeypatch.setattr(gs, 'rsvp_tally', rsvp_store.RSVPStore(db))
+    imap_server.reset({uid: message(uid, f"Update {uid}", "Durga Puja carpool sign-up" if uid % 5 == 0
+                                    else "Monthly newsletter") for uid in range(1, 36)}, uidvalidity=7)
+    return gs
+
+
+def body_fetches(server):
+    with server.lock:
+        return [c for c in server.commands if 'BODY.PEEK[]' in c.upper() or 'RFC822)' in c.upper()]
+
+
+def test_search_before_the_index_is_ready_falls_back_to_imap_without_indexing(gmail, imap_server):
+    client = gmail.app.test_client()
+    body = client.get('/api/gmail/search?q=carpool').get_json()
+    assert body['source'] == 'imap'
+    assert body['count'] == 7
+    assert gmail.search_index.metrics()['folders']['INBOX']['documents'] == 0
+    # No index sync ran in the request: the fallback fetched only its 7 hits, and
+    # nothing went out as the sync's header + partial text batches
+    assert [c for c in imap_server.commands if 'BODY.PEEK[TEXT]<' in c.upper()] == []
+
+
+def test_background_sync_then_search_reads_only_the_index(gmail, imap_server):
+    assert gmail.sync_search_index_once() == 35
+    assert gmail.search_index.metrics()['folders']['INBOX']['backlog'] == 0
+
+    client = gmail.app.test_client()
+    with imap_server.lock:
+        imap_server.commands.clear()
+    body = client.get('/api/gmail/search?q=carpool').get_json()
+    assert body['source'] == 'index'
+    assert body['total'] == 7
+    assert {r['uid'] for r in body['results']} == {5, 10, 15, 20, 25, 30, 35}
+    assert body_fetches(imap_server) == []
+
+    inbox = client.get('/api/gmail/inbox?search=carpool&view=summary').get_json()
+    assert inbox['source'] == 'index'
+    assert inbox['total'] == 7
+
+
+def test_new_mail_is_indexed_by_the_next_sync(gmail, imap_server):
+    gmail.sync_search_index_once()
+    imap_server.messages[36] = message(36, "Kali Puja rehearsal", "Rehearsal moved to Friday")
+    client = gmail.app.test_client()
+    # Still served from the index (which lags until the next sync), never synced inline
+    assert client.get('/api/gmail/search?q=rehearsal').get_json()['total'] == 0
+    assert gmail.sync_search_index_once() == 1
+    assert client.get('/api/gmail/search?q=rehearsal').get_json()['total'] == 1
+
+
+def test_partial_backfill_is_not_ready(gmail, imap_server):
+    with gmail.imap_pool.connection() as conn:
+        conn.select('INBOX')
+        gmail.search_index.sync(conn.mail, 'INBOX', conn.uidvalidity)  # one batch of 10 out of 35
+        assert not gmail.index_ready(conn, 'INBOX')
+    assert gmail.app.test_client().get('/api/gmail/search?q=carpool').get_json()['source'] == 'imap'
+
+
+def test_searched_folders_are_picked_up_by_the_background_sync(gmail):
+    gmail.app.test_client().get('/api/gmail/search?q=carpool&folder=Archive')
+    assert 'Archive' in gmail.search_index.folders(gmail.MAIL_INDEX_FOLDERS)
+
+
+def test_mail_syncer_stops(gmail, monkeypatch):
+    monkeypatch.setattr(gmail, 'MAIL_INDEX_SYNC_INTERVAL', 0.05)
+    stop = threading.Event()
+    thread = threading.Thread(target=gmail.mail_syncer, args=(stop,))
+    thread.start()
+    try:
+        for _ in range(100):
+            if gmail.search_index.metrics()['folders'].get('INBOX', {}).get('backlog') == 0:
+                break
+            stop.wait(0.05)
+        assert gmail.search_index.metrics()['folders']['INBOX']['documents'] == 35
+    finally:
+        stop.set()
+        thread.join(5)
+    assert not thread.is_alive()
+
+
+def with_attachment(uid, text, attachment_bytes):
+    import base64
+    payload = base64.encodebytes(b"%PDF" + b"\0" * attachment_bytes).decode()
+    return (f"Subject: Flyer {uid}\r\nFrom: Member {uid} <member{uid}@example.com>\r\n"
+            f"Date: Mon, 2 Feb 2026 09:00:00 -0500\r\nMIME-Version: 1.0\r\n"
+            f'Content-Type: multipart/mixed; boundary="b{uid}"\r\n\r\n'
+            f"--b{uid}\r\nContent-Type: text/plain\r\n\r\n{text}\r\n"
+            f"--b{uid}\r\nContent-Type: application/pdf\r\nContent-Transfer-Encoding: base64\r\n\r\n"
+            f"{payload}--b{uid}--\r\n").encode()
+
+
+def test_index_sync_leaves_attachments_on_the_server(gmail, imap_server, monkeypatch):
+    import mail_index
+
+    monkeypatch.setattr(mail_index, 'FETCH_ITEMS', "(BODY.PEEK[HEADER] BODY.PEEK[TEXT]<0.4096>)")
+    imap_server.reset({1: with_attachment(1, "Saraswati Puja flyer attached", 500_000)}, uidvalidity=7)
+    sent = []
+    send = imap_server.RequestHandlerClass.send
+
+    def counting_send(handler, data):
+        sent.append(len(data))
+        send(handler, data)
+
+    monkeypatch.setattr(imap_server.RequestHandlerClass, 'send', counting_send)
+    assert gmail.sync_search_index_once() == 1
+    assert sum(sent) < 20_000
+    assert not [c for c in imap_server.commands if 'BODY.PEEK[]' in c.upper()]
+    total, hits = gmail.search_index.search('INBOX', 7, 'saraswati')
+    assert total == 1 and hits[0]['subject'] == 'Flyer 1'
+
+
+def test_messages_that_fail_to_index_are_retried(gmail, imap_server, monkeypatch):
+    extract = gmail.search_index.extract
+
+    def flaky(raw):
+        if b"Update 10" in raw:
+            raise ValueError("bad MIME")
+        return extract(raw)
+
+    monkeypatch.setattr(gmail.search_index, 'extract', flaky)
+    assert gmail.sync_search_index_once() == 34
+    state = gmail.search_index.metrics()['folders']['INBOX']
+    # The checkpoint moved on (the folder is ready), with the failure kept for retry
+    assert (state['backlog'], state['last_uid'], state['failed']) == (0, 35, 1)
+    [failure] = gmail.search_index.failures('INBOX')
+    assert (failure['uid'], failure['error']) == (10, "ValueError: bad MIME")
+
+    monkeypatch.setattr(gmail.search_index, 'extract', extract)
+    assert gmail.sync_search_index_once() == 1
+    assert gmail.search_index.failures('INBOX') == []
+    assert gmail.search_index.search('INBOX', 7, 'carpool')[0] == 7
@@ -0,0 +1,59 @@
+"""imap_client.idle_wait against the local fake IMAP server"""
+
+import threading
+import time
+
+import imap_client
+
+
+def test_exists_in_the_same_packet_as_the_continuation(imap_server):
+    # imaplib buffers both lines on the first read; select() on the socket sees nothing more
+    imap_server.idle_greeting = b"* 4 EXISTS\r\n"
+    mail = imap_server.connect()
+    started = time.monotonic()
+    assert imap_client.idle_wait(mail, timeout=3, poll_slice=0.5) is True
+    assert time.monotonic() - started < 1
+    assert mail.noop()[0] == 'OK'  # the session is still in step after DONE
+    mail.logout()
+
+
+def test_exists_pushed_while_idle(imap_server):
+    mail = imap_server.connect()
+    pusher = threading.Thread(target=lambda: imap_server.wait_for_idle() and imap_server.push(b"* 5 EXISTS\r\n"))
+    pusher.start()
+    started = time.monotonic()
+    assert imap_client.idle_wait(mail, timeout=3, poll_slice=0.5) is True
+    assert time.monotonic() - started < 1
+    pusher.join()
+    assert mail.noop()[0] == 'OK'
+    mail.logout()
+
+
+def test_two_lines_pushed_together_are_both_read(imap_server):
+    # The EXISTS sits in imaplib's buffer behind a line idle_wait reads first
+    mail = imap_server.connect()
+    pusher = threading.Thread(target=lambda: imap_server.wait_for_idle() and
+                              imap_server.push(b"* 3 FETCH (FLAGS (\\Seen))\r\n* 6 EXISTS\r\n"))
+    pusher.start()
+    started = time.monotonic()
+    assert imap_client.idle_wait(mail, timeout=3, poll_slice=0.5) is True
+    assert time.monotonic() - started < 1
+    pusher.join()
+    mail.logout()
+
+
+def test_timeout_without_mail(imap_server):
+    mail = imap_server.connect()
+    assert imap_client.idle_wait(mail, timeout=0.3, poll_slice=0.1) is False
+    assert mail.noop()[0] == 'OK'
+    mail.logout()
+
+
+def test_should_stop_ends_idle(imap_server):
+    mail = imap_server.connect()
+    stop = threading.Event()
+    threading.Timer(0.2, stop.set).start()
+    started = time.monotonic()
+    assert imap_client.idle_wait(mail, timeout=5, should_stop=stop.is_set, poll_slice=0.1) is False
+    assert time.monotonic() - started < 1
+    mail.logout()
@@ -0,0 +1,95 @@
+"""IMAPPool against the local fake IMAP server: replacement of dead sessions and its counters"""
+
+import imaplib
+import threading
+
+import pytest
+
+import imap_client
+
+
+def test_stale_dead_session_is_replaced_before_it_is_handed_out(imap_server):
+    pool = imap_client.IMAPPool(imap_server.login, max_size=1, health_check_after=0)
+    with pool.connection() as conn:
+        first = conn.mail
+        first.shutdown()  # the server dropped it while it sat idle
+    with pool.connection() as conn:
+        assert conn.mail is not first
+        assert conn.select('INBOX')[0] == 'OK'
+    assert pool.metrics()['reconnects'] == 1
+
+
+def test_connection_error_in_the_block_discards_and_reraises(imap_server):
+    pool = imap_client.IMAPPool(imap_server.login, max_size=1)
+    with pytest.raises(imaplib.IMAP4.abort):
+        with pool.connection() as conn:
+            first = conn.mail
+            raise imaplib.IMAP4.abort("socket error: EOF")
+    metrics = pool.metrics()
+    assert (metrics['discarded'], metrics['size']) == (1, 0)
+    with pool.connection() as conn:
+        assert conn.mail is not first
+        assert conn.select('INBOX')[0] == 'OK'
+
+
+def test_counters_add_up_across_threads(imap_server):
+    pool = imap_client.IMAPPool(imap_server.login, max_size=3)
+    rounds, workers = 40, 6
+
+    def borrow():
+        for _ in range(rounds):
+            with pool.connection() as conn:
+                conn.select('INBOX')
+
+    threads = [threading.Thread(target=borrow) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(30)
+    metrics = pool.metrics()
+    assert metrics['hits'] + metrics['misses'] == rounds * workers
+    # Every borrow either re-selected INBOX or skipped it; new sessions select once each
+    assert metrics['select_skipped'] == rounds * workers - metrics['size']
+
+
+@pytest.fixture
+def gmail(tmp_path, monkeypatch, imap_server):
+    """gmail_service on the fake IMAP server with one pooled session, so routes reuse it"""
+    import gmail_service as gs
+    import mail_index
+    import message_cache
+
+    db = str(tmp_path / "gmail.db")
+    monkeypatch.setattr(gs, 'imap_pool', imap_client.IMAPPool(imap_server.login, max_size=1))
+    monkeypatch.setattr(gs, 'search_index', mail_index.MailIndex(db, gs.index_fields))
+    monkeypatch.setattr(gs, 'message_store', message_cache.MessageCache(db, gs.parse_raw_message))
+    imap_server.reset({uid: f"Subject: Note {uid}\r\n\r\nBody {uid}\r\n".encode() for uid in (11, 12, 13)},
+                      uidvalidity=5)
+    with gs.imap_pool.connection() as conn:
+        conn.select('INBOX')  # the pooled session now has INBOX open read-only (EXAMINE)
+    return gs
+
+
+def test_mark_read_sets_the_flag_on_a_session_left_in_examine(gmail, imap_server):
+    response = gmail.app.test_client().post('/api/gmail/mark-read/2')
+    assert response.status_code == 200
+    assert imap_server.flags[12] == {'\\Seen'}
+
+
+def test_delete_expunges_the_message(gmail, imap_server):
+    response = gmail.app.test_client().delete('/api/gmail/delete/1')
+    assert response.status_code == 200
+    assert sorted(imap_server.messages) == [12, 13]
+
+
+def test_refused_store_is_reported(gmail, imap_server, monkeypatch):
+    select = imap_client.PooledSession.select
+    monkeypatch.setattr(imap_client.PooledSession, 'select',
+                        lambda self, folder="INBOX", readonly=True: select(self, folder, True))
+    client = gmail.app.test_client()
+
+    response = client.post('/api/gmail/mark-read/2')
+    assert response.status_code == 500
+    assert 'READ-ONLY' in response.get_json()['error']
+    assert client.delete('/api/gmail/delete/1').status_code == 500
+    assert imap_server.flags == {} and sorted(imap_server.messages) == [11, 12, 13]
@@ -0,0 +1,39 @@
+"""mail_jobs: send pacing and which failures are retried"""
+
+import smtplib
+import time
+
+import mail_jobs
+import smtp_client
+
+
+def sends_within(limiter, seconds):
+    sent, deadline = 0, time.monotonic() + seconds
+    while limiter.acquire() and time.monotonic() <= deadline:
+        sent += 1
+    return sent
+
+
+def test_a_new_limiter_does_not_burst_a_periods_quota():
+    limiter = mail_jobs.RateLimiter(600, per=60.0)  # one send every 0.1s
+    assert sends_within(limiter, 0.35) <= 4
+
+
+def test_an_idle_limiter_refills_only_up_to_the_burst():
+    limiter = mail_jobs.RateLimiter(600, per=60.0, burst=3)
+    limiter.acquire()
+    time.sleep(1.0)  # 10 tokens' worth of idle time
+    started = time.monotonic()
+    for _ in range(3):
+        limiter.acquire()
+    assert time.monotonic() - started < 0.05
+    limiter.acquire()
+    assert time.monotonic() - started >= 0.08
+
+
+def test_temporary_failures_follow_smtp_client():
+    assert smtp_client.is_retryable(smtplib.SMTPServerDisconnected())
+    assert smtp_client.is_retryable(smtplib.SMTPResponseException(421, b"try later"))
+    assert not smtp_client.is_retryable(smtplib.SMTPResponseException(550, b"no such user"))
+    assert mail_jobs._is_temporary(smtplib.SMTPServerDisconnected())
+    assert mail_jobs._is_temporary(TimeoutError())
@@ -0,0 +1,90 @@
+"""MessageCache: the disk tier's running byte total and invalidation across workers"""
+
+import sqlite3
+import time
+
+import pytest
+
+import message_cache
+
+
+def parse(raw):
+    return {"body": raw.decode()}
+
+
+@pytest.fixture
+def db(tmp_path):
+    return str(tmp_path / "cache.db")
+
+
+def summed(db):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM message_blobs").fetchone()
+    finally:
+        conn.close()
+
+
+def disk(cache):
+    metrics = cache.metrics()
+    return metrics['disk_entries'], metrics['disk_bytes']
+
+
+def test_running_total_tracks_puts_overwrites_invalidations_and_evictions(db):
+    cache = message_cache.MessageCache(db, parse, disk_bytes=1000)
+    for uid in range(1, 6):
+        cache.put(("INBOX", 1, uid), b"x" * 150)
+    cache.put(("INBOX", 1, 3), b"y" * 90)  # same key, new size
+    cache.invalidate("INBOX", 1, [4])
+    assert disk(cache) == summed(db) == (4, 540)
+
+    for uid in range(6, 12):
+        cache.put(("INBOX", 1, uid), b"z" * 150)
+    entries, used = disk(cache)
+    assert (entries, used) == summed(db)
+    assert used <= 1000
+    assert cache.metrics()['disk_evictions'] > 0
+
+
+def test_put_does_not_sum_the_blob_table(db, monkeypatch):
+    cache = message_cache.MessageCache(db, parse)
+    statements = []
+    connect = cache._connect
+
+    def traced():
+        conn = connect()
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    monkeypatch.setattr(cache, '_connect', traced)
+    for uid in range(1, 20):
+        cache.put(("INBOX", 1, uid), b"body %d" % uid)
+    assert statements
+    assert not [s for s in statements if 'SUM(' in s.upper()]
+
+
+def test_counters_are_seeded_from_an_existing_table(db):
+    cache = message_cache.MessageCache(db, parse)
+    cache.put(("INBOX", 1, 1), b"a" * 40)
+    cache.put(("INBOX", 1, 2), b"b" * 60)
+    conn = sqlite3.connect(db)
+    with conn:
+        conn.execute("DROP TABLE message_cache_meta")
+        for name in ('ai', 'ad', 'au'):
+            conn.execute(f"DROP TRIGGER message_blobs_meta_{name}")
+    conn.close()
+    assert disk(message_cache.MessageCache(db, parse)) == (2, 100)
+
+
+def test_invalidation_in_one_worker_reaches_the_others(db, monkeypatch):
+    monkeypatch.setattr(message_cache, 'INVALIDATION_CHECK', 0.05)
+    key = ("INBOX", 1, 7)
+    worker_a = message_cache.MessageCache(db, parse)
+    worker_b = message_cache.MessageCache(db, parse)
+    worker_a.put(key, b"unread")
+    assert worker_b.get_many([key]) == {key: {"body": "unread"}}  # now in B's memory tier
+
+    worker_a.invalidate("INBOX", 1, [7])  # e.g. mark-read handled by worker A
+    time.sleep(0.06)
+    assert worker_b.get_many([key]) == {}
+    assert worker_b.metrics()['misses'] == 1
@@ -0,0 +1,315 @@
+"""Zelle DB: schema migrations, stats rollup triggers, keyset cursors and dashboard query plans"""
+
+import random
+import re
+import sqlite3
+
+import pytest
+
+# Every SELECT these run must be served by an index
+DASHBOARD_ROUTES = [
+    '/api/zelle/payments?limit=50',
+    '/api/zelle/payments?status=pending&limit=50',
+    '/api/zelle/payments?limit=50&cursor={next}',
+    '/api/zelle/payments?status=pending&limit=50&cursor={prev}',
+    '/api/zelle/members/m_sen/payments',
+    '/api/zelle/history?limit=50',
+    '/api/zelle/history?limit=50&cursor={next}',
+    '/api/zelle/stats',
+]
+
+# Tables whose scans only ever touch a handful of rows: poll_log is read
+# newest-first with LIMIT, zelle_payment_totals has a row per status/auto
+PLAN_SCAN_ALLOWED = {'poll_log', 'zelle_payment_totals'}
+
+STATUSES = ['pending', 'auto_verified', 'verified', 'rejected']
+
+
+def seed(zps, payments, history=0, created_at=None):
+    """Insert `payments` Zelle rows (and `history` payment_history rows) straight into the DB"""
+    rng = random.Random(7)
+    conn = zps.get_db()
+    conn.executemany('''INSERT INTO zelle_payments
+        (email_id, sender_name, amount, memo, status, auto_matched, created_at)
+        VALUES (?, ?, ?, 'Membership', ?, ?, ?)''',
+        [(f"1:{i}", f"Member {i}", rng.choice([50.0, 75.0, 100.1, 250.0]), rng.choice(STATUSES),
+          rng.randint(0, 1), created_at or f"2026-{1 + i * 9 // payments:02d}-01T00:00:00.{i:06d}")
+         for i in range(payments)])
+    conn.executemany('''INSERT INTO payment_history
+        (member_id, member_name, payment_type, amount, zelle_payment_id, created_at)
+        VALUES (?, '', 'Membership', 100.0, ?, ?)''',
+        [(rng.choice(['m_sen', 'm_roy', 'm_das']), rng.randint(1, payments), f"2026-01-01T00:00:00.{i:06d}")
+         for i in range(history)])
+    conn.commit()
+
+
+def schema_objects(conn):
+    return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE name NOT LIKE 'sqlite_%'")}
+
+
+# ====== MIGRATIONS ======
+
+@pytest.fixture
+def unmigrated(zps, tmp_path, monkeypatch):
+    """A database with the base tables only (user_version 0), as an old install left it"""
+    monkeypatch.setattr(zps, 'DB_PATH', str(tmp_path / "v0.db"))
+    migrations = zps.SCHEMA_MIGRATIONS
+    monkeypatch.setattr(zps, 'SCHEMA_MIGRATIONS', [])
+    zps.init_db()
+    monkeypatch.setattr(zps, 'SCHEMA_MIGRATIONS', migrations)
+    yield zps.get_db()
+    zps._db_local.conns.pop(zps.DB_PATH).close()
+
+
+def test_fresh_database_is_at_the_latest_version(zps):
+    conn = zps.get_db()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == zps.SCHEMA_MIGRATIONS[-1][0]
+    assert [v for v, _, _ in zps.SCHEMA_MIGRATIONS] == list(range(1, len(zps.SCHEMA_MIGRATIONS) + 1))
+
+
+def test_migrations_step_by_step(zps, unmigrated, monkeypatch):
+    conn = unmigrated
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 0
+    seed(zps, 20)
+    expected = {
+        1: {'idx_zelle_payments_auto_matched', 'idx_payment_history_member_created', 'idx_members_balance_due'},
+        2: {'zelle_payment_rollup', 'zelle_payment_totals', 'zelle_payment_rollup_ins',
+            'zelle_payment_rollup_del', 'zelle_payment_rollup_upd'},
+        3: {'idx_zelle_payments_created_id', 'idx_zelle_payments_status_created_id',
+            'idx_payment_history_created_id'},
+        4: {'zelle_seen_messages'},
+    }
+    dropped_by_v3 = {'idx_zelle_payments_status_created', 'idx_zelle_payments_created', 'idx_payment_history_created'}
+    migrations = zps.SCHEMA_MIGRATIONS
+    for version in sorted(expected):
+        monkeypatch.setattr(zps, 'SCHEMA_MIGRATIONS', migrations[:version])
+        zps.migrate_db(conn)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == version
+        objects = schema_objects(conn)
+        assert expected[version] <= objects
+        if version == 1:
+            assert dropped_by_v3 <= objects
+        if version >= 3:
+            assert not dropped_by_v3 & objects
+    # v2 built the rollup from the rows already there
+    assert conn.execute("SELECT SUM(payment_count) FROM zelle_payment_totals").fetchone()[0] == 20
+    assert conn.execute("SELECT COUNT(*) FROM zelle_payments").fetchone()[0] == 20
+
+
+def test_migrate_is_idempotent(zps):
+    conn = zps.get_db()
+    before = schema_objects(conn)
+    zps.migrate_db(conn)
+    zps.init_db()
+    assert schema_objects(conn) == before
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == zps.SCHEMA_MIGRATIONS[-1][0]
+
+
+def test_failed_migration_rolls_back_and_keeps_the_version(zps, monkeypatch):
+    conn = zps.get_db()
+    version = zps.SCHEMA_MIGRATIONS[-1][0]
+    monkeypatch.setattr(zps, 'SCHEMA_MIGRATIONS', zps.SCHEMA_MIGRATIONS + [
+        (version + 1, "broken", ["CREATE TABLE half_done (x)", "CREATE TABLE oops ("]),
+    ])
+    with pytest.raises(sqlite3.Error):
+        zps.migrate_db(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == version
+    assert 'half_done' not in schema_objects(conn)
+
+
+# ====== STATS ROLLUP TRIGGERS ======
+
+def rollups(conn):
+    return {table: sorted(tuple(r) for r in conn.execute(f"SELECT * FROM {table} WHERE payment_count != 0"))
+            for table in ('zelle_payment_rollup', 'zelle_payment_totals')}
+
+
+def test_triggers_match_a_full_rebuild(zps):
+    seed(zps, 300)
+    conn = zps.get_db()
+    rng = random.Random(3)
+    for payment_id in rng.sample(range(1, 301), 80):
+        conn.execute("UPDATE zelle_payments SET status = ?, auto_matched = ? WHERE id = ?",
+                     (rng.choice(STATUSES), rng.randint(0, 1), payment_id))
+    for payment_id in rng.sample(range(1, 301), 30):
+        conn.execute("UPDATE zelle_payments SET amount = amount + 0.1, created_at = '2026-12-31T10:00:00' "
+                     "WHERE id = ?", (payment_id,))
+    conn.execute("DELETE FROM zelle_payments WHERE id % 7 = 0")
+    conn.commit()
+
+    incremental = rollups(conn)
+    zps.rebuild_stats_rollup(conn)
+    assert incremental == rollups(conn)
+
+
+def test_stats_endpoint_agrees_with_the_payments_table(zps):
+    seed(zps, 200)
+    conn = zps.get_db()
+    conn.execute("UPDATE zelle_payments SET status = 'verified' WHERE id <= 50")
+    conn.execute("DELETE FROM zelle_payments WHERE id > 180")
+    conn.commit()
+
+    stats = zps.app.test_client().get('/api/zelle/stats').get_json()
+    expected = {status: (count, round(amount, 2)) for status, count, amount in conn.execute(
+        "SELECT status, COUNT(*), SUM(amount) FROM zelle_payments GROUP BY status")}
+    assert {s: (v['count'], v['amount']) for s, v in stats['by_status'].items()} == expected
+    assert stats['total_payments'] == 180
+    assert stats['pending_count'] == expected.get('pending', (0, 0))[0]
+
+
+def test_amounts_do_not_drift(zps):
+    conn = zps.get_db()
+    for _ in range(10):
+        conn.execute("INSERT INTO zelle_payments (email_id, amount, status) VALUES (NULL, 0.1, 'pending')")
+    conn.commit()
+    cents = conn.execute("SELECT amount_cents FROM zelle_payment_totals WHERE status = 'pending'").fetchone()[0]
+    assert cents == 100
+
+
+# ====== KEYSET CURSORS ======
+
+def walk(client, url):
+    """Every page of `url` following `next` tokens; returns the pages as id lists and the last response"""
+    pages, body = [], client.get(url).get_json()
+    pages.append([p['id'] for p in body['payments']])
+    while body['next']:
+        body = client.get(f"{url}&cursor={body['next']}").get_json()
+        pages.append([p['id'] for p in body['payments']])
+    return pages, body
+
+
+def test_cursor_walk_visits_every_row_once_in_order(zps):
+    # Ties on created_at are broken by id
+    seed(zps, 95, created_at='2026-03-01T00:00:00')
+    seed_more = [(f"2:{i}", f"2026-0{1 + i % 4}-15T00:00:00") for i in range(40)]
+    zps.get_db().executemany("INSERT INTO zelle_payments (email_id, amount, status, created_at) "
+                             "VALUES (?, 10, 'pending', ?)", seed_more)
+    zps.get_db().commit()
+    client = zps.app.test_client()
+
+    pages, _ = walk(client, '/api/zelle/payments?limit=20&include_total=false')
+    ids = [i for page in pages for i in page]
+    expected = [r[0] for r in zps.get_db().execute("SELECT id FROM zelle_payments ORDER BY created_at DESC, id DESC")]
+    assert ids == expected
+    assert [len(p) for p in pages] == [20] * 6 + [15]
+
+
+def test_prev_tokens_return_the_same_pages(zps):
+    seed(zps, 70)
+    client = zps.app.test_client()
+    url = '/api/zelle/payments?limit=25&include_total=false'
+    forward, last = walk(client, url)
+    assert last['next'] is None
+
+    backward = [[p['id'] for p in last['payments']]]
+    body = last
+    while body['prev']:
+        body = client.get(f"{url}&cursor={body['prev']}").get_json()
+        backward.append([p['id'] for p in body['payments']])
+    assert backward[::-1] == forward
+    assert body['prev'] is None
+
+
+def test_cursor_with_status_filter(zps):
+    seed(zps, 120)
+    client = zps.app.test_client()
+    pages, _ = walk(client, '/api/zelle/payments?status=pending&limit=10&include_total=false')
+    expected = [r[0] for r in zps.get_db().execute(
+        "SELECT id FROM zelle_payments WHERE status = 'pending' ORDER BY created_at DESC, id DESC")]
+    assert [i for page in pages for i in page] == expected
+
+
+def test_new_rows_do_not_shift_a_cursor_walk(zps):
+    seed(zps, 40)
+    client = zps.app.test_client()
+    url = '/api/zelle/payments?limit=10&include_total=false'
+    first = client.get(url).get_json()
+    zps.get_db().execute("INSERT INTO zelle_payments (email_id, amount, status, created_at) "
+                         "VALUES ('new', 1, 'pending', '2027-01-01T00:00:00')")
+    zps.get_db().commit()
+    second = client.get(f"{url}&cursor={first['next']}").get_json()
+    expected = [r[0] for r in zps.get_db().execute(
+        "SELECT id FROM zelle_payments WHERE email_id != 'new' ORDER BY created_at DESC, id DESC LIMIT 10 OFFSET 10")]
+    assert [p['id'] for p in second['payments']] == expected
+
+
+def test_offset_is_still_honoured_without_a_cursor(zps):
+    seed(zps, 30)
+    body = zps.app.test_client().get('/api/zelle/payments?limit=10&offset=10').get_json()
+    expected = [r[0] for r in zps.get_db().execute(
+        "SELECT id FROM zelle_payments ORDER BY created_at DESC, id DESC LIMIT 10 OFFSET 10")]
+    assert [p['id'] for p in body['payments']] == expected
+    assert body['total'] == 30
+    assert body['prev'] is not None
+
+
+def test_cursor_round_trip_and_bad_tokens(zps):
+    token = zps.encode_cursor('2026-01-01T00:00:00', 42, 'prev')
+    assert zps.decode_cursor(token) == ('2026-01-01T00:00:00', 42, 'prev')
+    for bad in ('garbage', zps.encode_cursor('2026-01-01', 'x', 'next'), zps.encode_cursor('2026-01-01', 1, 'up')):
+        with pytest.raises(zps.CursorError):
+            zps.decode_cursor(bad)
+
+    client = zps.app.test_client()
+    for route in ('/api/zelle/payments?cursor=garbage', '/api/zelle/history?cursor=garbage'):
+        response = client.get(route)
+        assert response.status_code == 400
+        assert 'error' in response.get_json()
+
+
+# ====== QUERY PLANS ======
+
+def test_dashboard_queries_use_indexes(zps):
+    """EXPLAIN QUERY PLAN every SELECT the dashboard routes run: no full table scans or temp sorts"""
+    seed(zps, 20000, history=5000)
+    conn = zps.get_db()
+    conn.execute("ANALYZE")
+    client = zps.app.test_client()
+    problems = []
+
+    for route in DASHBOARD_ROUTES:
+        if '{' in route:
+            # Cursor routes: take the token from the second page of the same listing
+            base = route.split('&cursor=')[0]
+            token = client.get(base).get_json()['next']
+            page2 = client.get(f"{base}&cursor={token}").get_json()
+            route = route.format(next=token, prev=page2['prev'])
+        statements = []
+        conn.set_trace_callback(statements.append)
+        assert client.get(route).status_code == 200
+        conn.set_trace_callback(None)
+        for sql in statements:
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql)]
+            tables = {m.group(1) for m in (re.match(r'(?:SCAN|SEARCH) (\w+)', d) for d in plan) if m}
+            for detail in plan:
+                scan = re.match(r'SCAN (\w+)', detail)
+                full_scan = scan and 'INDEX' not in detail and scan.group(1) not in PLAN_SCAN_ALLOWED
+                big_sort = 'TEMP B-TREE' in detail and not tables <= PLAN_SCAN_ALLOWED
+                if full_scan or big_sort:
+                    problems.append((route, ' '.join(sql.split())[:90], detail))
+
+    assert problems == []
+
+
+def test_member_index_rebuild_swaps_in_a_whole_snapshot(zps):
+    conn = zps.get_db()
+    conn.execute('''INSERT INTO members (id, first_name, last_name, full_name, email)
+        VALUES ('m1', 'Zorawar', 'Quill', 'Zorawar Quill', 'zorawar@example.com')''')
+    conn.commit()
+    assert zps.match_member('', 'Durga Puja - Zorawar Quill', 50)[1] == 'memo_match'
+    before = zps.member_index.tables
+
+    conn.execute("UPDATE members SET last_name = 'Thistle', full_name = 'Zorawar Thistle', email = 'zthistle@example.com'"
+                 " WHERE id = 'm1'")
+    conn.commit()
+    member, how = zps.match_member('', 'Durga Puja - Zorawar Thistle', 50, 'zthistle@example.com')
+    assert (member['id'], how) == ('m1', 'email_match')
+    after = zps.member_index.tables
+    assert after is not before and after.version != before.version
+    # The old snapshot is left whole for any match() still reading it
+    assert 'zorawar@example.com' in before.by_email and 'zthistle@example.com' not in before.by_email
+    assert 'quill' in before.by_last_name and 'thistle' not in before.by_last_name
+    assert 'zthistle@example.com' in after.by_email and 'zorawar@example.com' not in after.by_email
+    assert 'thistle' in after.by_last_name and 'quill' not in after.by_last_name
@@ -0,0 +1,121 @@
+"""Re-polling mail the Zelle poller has already stored must not credit anyone twice"""
+
+import pytest
+
+PAYMENT_DATE = "Mon, 2 Feb 2026 09:00:00 -0500"
+
+
+def zelle_message(message_id="<zelle-1@alerts.chase.com>", confirmation="BAC123456789"):
+    """A Chase notification of $150 from Sunil Banerjee, who the seeded members table owes $150"""
+    lines = [
+        "Subject: You received $150.00 from Sunil Banerjee",
+        "From: Chase <no.reply.alerts@chase.com>",
+        f"Date: {PAYMENT_DATE}",
+    ]
+    if message_id:
+        lines.append(f"Message-ID: {message_id}")
+    body = "Sunil Banerjee sent you $150.00 with Zelle.\r\nMemo: Membership - Sunil Banerjee\r\n"
+    if confirmation:
+        body += f"Confirmation number: {confirmation}\r\n"
+    return ("\r\n".join(lines) + "\r\n\r\n" + body).encode()
+
+
+def poll(zps, server):
+    mail = server.connect()
+    try:
+        return zps.poll_gmail_for_zelle(mail=mail)
+    finally:
+        mail.logout()
+
+
+def ledger(zps):
+    """(payment rows, history rows, Sunil's total_paid, balance_due)"""
+    c = zps.get_db().cursor()
+    payments = c.execute("SELECT COUNT(*) FROM zelle_payments").fetchone()[0]
+    history = c.execute("SELECT COUNT(*) FROM payment_history").fetchone()[0]
+    total_paid, balance_due = c.execute(
+        "SELECT total_paid, balance_due FROM members WHERE id = 'm_banerjee'").fetchone()
+    return payments, history, total_paid, balance_due
+
+
+def test_first_poll_credits_the_member(zps, imap_server):
+    imap_server.reset({5: zelle_message()}, uidvalidity=1)
+    result = poll(zps, imap_server)
+    assert result['errors'] == []
+    assert (result['new_payments'], result['auto_matched']) == (1, 1)
+    assert ledger(zps) == (1, 1, 150.0, 0.0)
+
+
+@pytest.mark.parametrize("message_id, confirmation", [
+    ("<zelle-1@alerts.chase.com>", "BAC123456789"),
+    ("<zelle-1@alerts.chase.com>", None),
+    (None, "BAC123456789"),
+])
+def test_repoll_after_uidvalidity_change_credits_nothing(zps, imap_server, message_id, confirmation):
+    imap_server.reset({5: zelle_message(message_id, confirmation)}, uidvalidity=1)
+    assert poll(zps, imap_server)['new_payments'] == 1
+
+    # Gmail rebuilt the mailbox: same message, new UIDVALIDITY and UID
+    imap_server.reset({41: zelle_message(message_id, confirmation)}, uidvalidity=2)
+    result = poll(zps, imap_server)
+    assert result['sync_mode'] == 'full'
+    assert result['new_payments'] == 0
+    assert ledger(zps) == (1, 1, 150.0, 0.0)
+
+
+def test_known_message_id_is_skipped_before_fetching_the_body(zps, imap_server):
+    imap_server.reset({5: zelle_message()}, uidvalidity=1)
+    poll(zps, imap_server)
+    imap_server.reset({41: zelle_message()}, uidvalidity=2)
+    result = poll(zps, imap_server)
+    assert result['skipped_known'] == 1
+    assert result['bodies_fetched'] == 0
+
+
+@pytest.mark.parametrize("confirmation", ["BAC123456789", None])
+def test_repoll_over_legacy_rows_credits_nothing(zps, imap_server, confirmation):
+    # A row stored by the sequence-number poller, already credited to the member
+    conn = zps.get_db()
+    conn.execute('''INSERT INTO zelle_payments
+        (email_id, email_date, sender_name, amount, memo, confirmation_code,
+         matched_member_id, status, auto_matched)
+        VALUES ('17', ?, 'Sunil Banerjee', 150.0, 'Membership - Sunil Banerjee', ?,
+                'm_banerjee', 'auto_verified', 1)''', (PAYMENT_DATE, confirmation))
+    conn.execute("UPDATE members SET total_paid = 150, balance_due = 0 WHERE id = 'm_banerjee'")
+    conn.commit()
+    before = ledger(zps)
+
+    imap_server.reset({5: zelle_message(confirmation=confirmation)}, uidvalidity=1)
+    result = poll(zps, imap_server)
+    assert result['errors'] == []
+    assert result['new_payments'] == 0
+    assert ledger(zps) == before
+
+    # The legacy row picked up its Message-ID, so later polls skip it on headers alone
+    assert conn.execute("SELECT message_id FROM zelle_payments WHERE email_id = '17'").fetchone()[0] == \
+        "<zelle-1@alerts.chase.com>"
+    imap_server.reset({9: zelle_message(confirmation=confirmation)}, uidvalidity=3)
+    assert poll(zps, imap_server)['skipped_known'] == 1
+    assert ledger(zps) == before
+
+
+def test_same_date_and_amount_with_different_codes_are_both_stored(zps, imap_server):
+    imap_server.reset({5: zelle_message(None, "BAC100001"),
+                       6: zelle_message(None, "BAC100002")}, uidvalidity=1)
+    assert poll(zps, imap_server)['new_payments'] == 2
+
+
+def test_v5_migration_keeps_legacy_rows(zps, tmp_path, monkeypatch):
+    migrations = zps.SCHEMA_MIGRATIONS
+    monkeypatch.setattr(zps, 'DB_PATH', str(tmp_path / "v4.db"))
+    monkeypatch.setattr(zps, 'SCHEMA_MIGRATIONS', migrations[:4])
+    zps.init_db()
+    conn = zps.get_db()
+    conn.execute("INSERT INTO zelle_payments (email_id, email_date, amount) VALUES ('17', ?, 150.0)",
+                 (PAYMENT_DATE,))
+    conn.commit()
+
+    monkeypatch.setattr(zps, 'SCHEMA_MIGRATIONS', migrations)
+    zps.migrate_db(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == 5
+    assert [tuple(r) for r in conn.execute("SELECT email_id, message_id FROM zelle_payments")] == [("17", None)]
@@ -0,0 +1,28 @@
+"""/api/zelle/export compresses only for clients that accept gzip"""
+
+import gzip
+
+import pytest
+
+
+@pytest.mark.parametrize("accept, gzipped", [
+    ("gzip", True),
+    ("br, GZIP;q=0.5", True),
+    ("*", True),
+    ("gzip;q=0", False),
+    ("gzip;q=0.000, deflate", False),
+    ("deflate, *;q=0", False),
+    ("identity", False),
+    (None, False),
+])
+def test_accept_encoding_q_values(zps, accept, gzipped):
+    conn = zps.get_db()
+    conn.execute('''INSERT INTO zelle_payments (email_id, sender_name, amount, memo, status, created_at)
+        VALUES ('1:1', 'Member 1', 100.0, 'Membership', 'pending', '2026-01-01T00:00:00')''')
+    conn.commit()
+    headers = {'Accept-Encoding': accept} if accept else {}
+    response = zps.app.test_client().get('/api/zelle/export', headers=headers)
+    assert response.status_code == 200
+    assert (response.headers.get('Content-Encoding') == 'gzip') is gzipped
+    body = gzip.decompress(response.data) if gzipped else response.data
+    assert b'"Member 1"' in body
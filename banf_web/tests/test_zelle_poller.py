@@ -0,0 +1,88 @@
+"""Starting, stopping and switching the Zelle poller never leaves two poller threads running"""
+
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def poller(zps, monkeypatch):
+    """The poller controls with both loops replaced by a thread that records overlap"""
+    state = {'alive': 0, 'most_alive': 0, 'started': 0, 'busy': threading.Event()}
+    lock = threading.Lock()
+
+    def fake_poller(stop):
+        with lock:
+            state['alive'] += 1
+            state['started'] += 1
+            state['most_alive'] = max(state['most_alive'], state['alive'])
+        stop.wait()
+        state['busy'].wait(5)  # a poll in progress when stop was set
+        with lock:
+            state['alive'] -= 1
+
+    state['busy'].set()
+    monkeypatch.setattr(zps, 'background_poller', fake_poller)
+    monkeypatch.setattr(zps, 'idle_watcher', fake_poller)
+    monkeypatch.setattr(zps, '_poller_thread', None)
+    monkeypatch.setattr(zps, '_poller_running', False)
+    monkeypatch.setattr(zps, 'POLLER_STOP_TIMEOUT', 0.2)
+    yield state
+    state['busy'].set()
+    zps.stop_poller()
+    if zps._poller_thread is not None:
+        zps._poller_thread.join(5)
+
+
+def configure(zps, enabled, mode='interval'):
+    conn = zps.get_db()
+    zps.set_setting(conn.cursor(), 'poller_enabled', '1' if enabled else '0')
+    zps.set_setting(conn.cursor(), 'poller_mode', mode)
+    conn.commit()
+
+
+def test_concurrent_applies_start_one_poller(zps, poller):
+    configure(zps, True)
+    barrier = threading.Barrier(8)
+
+    def apply():
+        barrier.wait()
+        zps.apply_poller_settings()
+
+    threads = [threading.Thread(target=apply) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert poller['started'] == 1
+    assert poller['most_alive'] == 1
+
+
+def test_mode_switch_waits_for_the_old_thread(zps, poller):
+    configure(zps, True, 'interval')
+    zps.apply_poller_settings()
+    old = zps._poller_thread
+
+    # The old poller is mid-poll and ignores stop for now: no second thread yet
+    poller['busy'].clear()
+    configure(zps, True, 'idle')
+    zps.apply_poller_settings()
+    assert zps._poller_thread is old and old.is_alive()
+    assert not zps._poller_running
+
+    # Once it finishes, the next supervisor check starts the new mode
+    poller['busy'].set()
+    old.join(5)
+    zps.apply_poller_settings()
+    assert zps._poller_thread is not old and zps._poller_mode == 'idle'
+    assert poller['started'] == 2
+    assert poller['most_alive'] == 1
+
+
+def test_stop_then_start_joins_the_old_thread(zps, poller):
+    assert zps.start_poller('interval')
+    old = zps._poller_thread
+    zps.stop_poller()
+    assert zps.start_poller('interval')
+    assert not old.is_alive()
+    assert poller['most_alive'] == 1
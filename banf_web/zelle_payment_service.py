@@ -14,21 +14,31 @@ Usage:
   # Runs on http://localhost:5002
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import imaplib
+import base64
+import csv
 import email
+import hashlib
 from email.header import decode_header
 import sqlite3
 import json
+import multiprocessing
 import os
 import re
 import threading
 import time
 import traceback
+import zlib
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
+from io import StringIO
 from dotenv import load_dotenv
 
+import imap_client
+import leader
+
 load_dotenv()
 
 app = Flask(__name__)
@@ -37,9 +47,24 @@ CORS(app)
 # ====== CONFIGURATION ======
 GMAIL_ADDRESS = os.getenv("GMAIL_ADDRESS", "banfjax@gmail.com")
 GMAIL_APP_PASSWORD = os.getenv("GMAIL_APP_PASSWORD", "skmxlbejaryowvkt")
-IMAP_SERVER = "imap.gmail.com"
-DB_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "zelle_payments.db")
+IMAP_SERVER = os.getenv("IMAP_SERVER", "imap.gmail.com")
+IMAP_PORT = int(os.getenv("IMAP_PORT", "0")) or None  # None = library default (993)
+IMAP_USE_SSL = os.getenv("IMAP_USE_SSL", "1") != "0"  # set 0 for a local IMAP stand-in
+IMAP_TIMEOUT = float(os.getenv("IMAP_TIMEOUT", "60"))  # seconds per socket read; a hung server can't pin a worker
+DB_PATH = os.getenv("ZELLE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "zelle_payments.db"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "16384"))  # page cache per connection
+SQLITE_MMAP_BYTES = int(os.getenv("SQLITE_MMAP_BYTES", str(64 * 1024 * 1024)))
 POLL_INTERVAL = int(os.getenv("ZELLE_POLL_INTERVAL", "60"))  # seconds
+POLL_MODE = os.getenv("ZELLE_POLL_MODE", "interval")  # 'interval' (sleep loop) or 'idle' (IMAP IDLE push)
+POLLER_AUTOSTART = os.getenv("ZELLE_POLLER_AUTOSTART", "1") != "0"  # until /api/zelle/poller/stop says otherwise
+POLLER_LOCK_FILE = os.getenv("ZELLE_POLLER_LOCK", DB_PATH + ".poller.lock")  # one poller across workers
+POLLER_SUPERVISE_INTERVAL = 2  # seconds between the leader's checks of the poller settings
+POLLER_STOP_TIMEOUT = 10  # seconds start_poller waits for a stopped poller to finish its last poll
+IDLE_TIMEOUT = int(os.getenv("ZELLE_IDLE_TIMEOUT", "1500"))  # re-IDLE before Gmail's ~29 min cutoff
+PARSE_WORKERS = int(os.getenv("ZELLE_PARSE_WORKERS", "0")) or (os.cpu_count() or 1)  # backfill parser processes
+PARSE_POOL_MIN = int(os.getenv("ZELLE_PARSE_POOL_MIN", "200"))  # smaller scans parse inline
+PARSE_CHUNK = 25  # messages per pool task
 
 # Zelle email patterns (subjects that indicate Zelle payments)
 ZELLE_SUBJECT_PATTERNS = [
@@ -58,6 +83,9 @@ ZELLE_SUBJECT_PATTERNS = [
     r'Bank\s+of\s+America.*Zelle',
 ]
 
+# Phase-1 fetch: just enough headers to run the subject/sender classifier
+ZELLE_HEADER_FETCH = "(BODY.PEEK[HEADER.FIELDS (SUBJECT FROM DATE MESSAGE-ID)])"
+
 # Common Zelle sender email domains (bank notification senders)
 ZELLE_SENDER_DOMAINS = [
     'chase.com', 'bankofamerica.com', 'wellsfargo.com',
@@ -65,12 +93,247 @@ ZELLE_SENDER_DOMAINS = [
     'notify.zelle.com', 'alerts.chase.com', 'ealerts.bankofamerica.com',
 ]
 
+# Field extractors, in priority order (the first pattern that matches wins)
+ZELLE_AMOUNT_PATTERNS = [
+    r'\$\s*([\d,]+(?:\.\d{2})?)',       # $150.00 or $1,500.00
+    r'([\d,]+(?:\.\d{2})?)\s*(?:USD|dollars?)',  # 150.00 USD
+    r'amount[:\s]*\$?\s*([\d,]+(?:\.\d{2})?)',   # amount: $150
+    r'received[:\s]*\$?\s*([\d,]+(?:\.\d{2})?)',  # received $150
+]
+
+ZELLE_SENDER_PATTERNS = [  # case-sensitive: names are capitalized
+    r'from\s+([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+){0,3})',  # "from John Smith"
+    r'([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+){0,3})\s+sent\s+you',  # "John Smith sent you"
+    r'(?:sent|paid)\s+by\s+([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+){0,3})',  # "paid by John"
+    r'Zelle.*?from\s+([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+){0,3})',
+]
+SENDER_NAME_NOISE = {'Zelle', 'Chase', 'Wells', 'Fargo', 'Bank', 'America', 'Direct', 'Deposit', 'Payment', 'Your', 'The'}
+
+ZELLE_MEMO_PATTERNS = [
+    r'(?:memo|note|message|description)[:\s]*[""]?([^""\n]{3,80})[""]?',
+    r'(?:for|regarding)[:\s]*[""]?([^""\n]{3,80})[""]?',
+    r'Membership\s*[-–]\s*([A-Z][a-zA-Z\s]+)',
+]
+
+ZELLE_CONFIRMATION_PATTERNS = [
+    r'(?:confirmation|reference|transaction|ref)\s*(?:#|number|code|id)?[:\s]*([A-Z0-9]{6,20})',
+    r'(?:ID|Id)[:\s]*([A-Z0-9]{6,20})',
+]
+
+# (substring of lowercased from+body, bank name), checked in order
+BANK_SOURCES = [
+    ('chase', 'Chase'),
+    ('bankofamerica', 'Bank of America'),
+    ('wellsfargo', 'Wells Fargo'),
+    ('usbank', 'US Bank'),
+    ('pnc', 'PNC'),
+    ('capitalone', 'Capital One'),
+    ('zelle', 'Zelle Direct'),
+]
+
 
 # ====== DATABASE SETUP ======
 
+_db_local = threading.local()
+
+
+def get_db():
+    """
+    This thread's connection to DB_PATH, opened on first use and reused.
+    WAL lets dashboard reads run while the poller writes; rows come back
+    as sqlite3.Row. Routes get uncommitted work rolled back on teardown.
+    """
+    conns = getattr(_db_local, 'conns', None)
+    if conns is None:
+        conns = _db_local.conns = {}
+    conn = conns.get(DB_PATH)
+    if conn is None:
+        conn = conns[DB_PATH] = open_db()
+    return conn
+
+
+def open_db():
+    """A new tuned connection to DB_PATH (get_db() caches one per thread)"""
+    conn = sqlite3.connect(DB_PATH, timeout=SQLITE_BUSY_TIMEOUT_MS / 1000)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")  # safe with WAL; fsync at checkpoints only
+    conn.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_BYTES}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    return conn
+
+
+def release_db():
+    """Roll back anything left uncommitted on this thread's connection (what close() used to do)"""
+    conn = getattr(_db_local, 'conns', {}).get(DB_PATH)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+
+@app.teardown_appcontext
+def _release_db_after_request(exc):
+    release_db()
+
+
+# Materialized /api/zelle/stats. zelle_payment_rollup holds payment
+# counts and amounts (in cents, so incremental updates don't drift) per
+# day, status and auto/manual; zelle_payment_totals is the same without
+# the day, so all-time figures read a handful of rows. Triggers keep both
+# in step with every write to zelle_payments.
+_ROLLUP_COLUMNS = {
+    'day': "COALESCE(substr({p}.created_at, 1, 10), '')",
+    'status': "COALESCE({p}.status, 'unknown')",
+    'auto_matched': "COALESCE({p}.auto_matched, 0)",
+}
+_ROLLUP_CENTS = "CAST(ROUND(COALESCE({p}.amount, 0) * 100) AS INTEGER)"
+STATS_ROLLUPS = {
+    'zelle_payment_rollup': ('day', 'status', 'auto_matched'),
+    'zelle_payment_totals': ('status', 'auto_matched'),
+}
+
+
+def _rollup_upsert(table, prefix, sign):
+    keys = STATS_ROLLUPS[table]
+    values = ', '.join(_ROLLUP_COLUMNS[k].format(p=prefix) for k in keys)
+    return f'''INSERT INTO {table} ({', '.join(keys)}, payment_count, amount_cents)
+                VALUES ({values}, {sign}1, {sign}{_ROLLUP_CENTS.format(p=prefix)})
+                ON CONFLICT ({', '.join(keys)}) DO UPDATE SET
+                    payment_count = payment_count + excluded.payment_count,
+                    amount_cents = amount_cents + excluded.amount_cents;'''
+
+
+def _rollup_trigger_sql(event, *changes):
+    body = ' '.join(_rollup_upsert(table, prefix, sign) for prefix, sign in changes for table in STATS_ROLLUPS)
+    name = event.split()[0].lower()[:3]
+    return f"CREATE TRIGGER IF NOT EXISTS zelle_payment_rollup_{name} AFTER {event} ON zelle_payments BEGIN {body} END"
+
+
+def _rollup_rebuild_sql():
+    statements = []
+    for table, keys in STATS_ROLLUPS.items():
+        columns = ', '.join(_ROLLUP_COLUMNS[k].format(p='zelle_payments') for k in keys)
+        statements += [
+            f"DELETE FROM {table}",
+            f'''INSERT INTO {table} ({', '.join(keys)}, payment_count, amount_cents)
+                SELECT {columns}, COUNT(*), SUM({_ROLLUP_CENTS.format(p='zelle_payments')})
+                FROM zelle_payments GROUP BY {', '.join(str(i + 1) for i in range(len(keys)))}''',
+        ]
+    return statements
+
+
+STATS_ROLLUP_REBUILD = _rollup_rebuild_sql()
+
+# Schema changes after the base CREATE TABLEs, applied in order and
+# tracked in PRAGMA user_version. Append new steps; never edit old ones.
+SCHEMA_MIGRATIONS = [
+    (1, "dashboard indexes", [
+        # get_payments: WHERE status = ? ORDER BY created_at; get_stats: GROUP BY status + SUM(amount)
+        "CREATE INDEX IF NOT EXISTS idx_zelle_payments_status_created ON zelle_payments (status, created_at, amount)",
+        # get_payments unfiltered ORDER BY created_at; get_stats last-7-days range + SUM(amount)
+        "CREATE INDEX IF NOT EXISTS idx_zelle_payments_created ON zelle_payments (created_at, amount)",
+        # get_stats: GROUP BY auto_matched
+        "CREATE INDEX IF NOT EXISTS idx_zelle_payments_auto_matched ON zelle_payments (auto_matched)",
+        # get_member_payments: WHERE member_id = ? ORDER BY created_at
+        "CREATE INDEX IF NOT EXISTS idx_payment_history_member_created ON payment_history (member_id, created_at)",
+        # get_payment_history: ORDER BY created_at LIMIT
+        "CREATE INDEX IF NOT EXISTS idx_payment_history_created ON payment_history (created_at)",
+        # history rows for a Zelle payment (verify/match/reject paths)
+        "CREATE INDEX IF NOT EXISTS idx_payment_history_zelle_payment ON payment_history (zelle_payment_id)",
+        # get_stats: members with balance_due > 0
+        "CREATE INDEX IF NOT EXISTS idx_members_balance_due ON members (balance_due)",
+    ]),
+    (2, "stats rollup", [
+        '''CREATE TABLE IF NOT EXISTS zelle_payment_rollup (
+            day TEXT NOT NULL,
+            status TEXT NOT NULL,
+            auto_matched INTEGER NOT NULL,
+            payment_count INTEGER NOT NULL DEFAULT 0,
+            amount_cents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, status, auto_matched)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS zelle_payment_totals (
+            status TEXT NOT NULL,
+            auto_matched INTEGER NOT NULL,
+            payment_count INTEGER NOT NULL DEFAULT 0,
+            amount_cents INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (status, auto_matched)
+        )''',
+        _rollup_trigger_sql("INSERT", ('NEW', '')),
+        _rollup_trigger_sql("DELETE", ('OLD', '-')),
+        _rollup_trigger_sql("UPDATE OF status, auto_matched, amount, created_at", ('OLD', '-'), ('NEW', '')),
+    ] + STATS_ROLLUP_REBUILD),
+    (3, "keyset pagination indexes", [
+        # Cursor pages walk (created_at, id) straight off these, with or without a status filter
+        "CREATE INDEX IF NOT EXISTS idx_zelle_payments_created_id ON zelle_payments (created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_zelle_payments_status_created_id ON zelle_payments (status, created_at, id)",
+        "CREATE INDEX IF NOT EXISTS idx_payment_history_created_id ON payment_history (created_at, id)",
+        # Superseded: the amount column sat between created_at and the id tiebreak
+        "DROP INDEX IF EXISTS idx_zelle_payments_status_created",
+        "DROP INDEX IF EXISTS idx_zelle_payments_created",
+        "DROP INDEX IF EXISTS idx_payment_history_created",
+    ]),
+    (4, "seen-message cache", [
+        # Messages the classifier rejected, so later scans skip them without a FETCH
+        '''CREATE TABLE IF NOT EXISTS zelle_seen_messages (
+            uidvalidity INTEGER NOT NULL,
+            uid INTEGER NOT NULL,
+            verdict TEXT NOT NULL,
+            parser_version TEXT NOT NULL,
+            seen_at TEXT,
+            PRIMARY KEY (uidvalidity, uid)
+        ) WITHOUT ROWID''',
+    ]),
+    (5, "stable payment dedup key", [
+        # email_id was the IMAP sequence number, then UIDVALIDITY:UID; neither
+        # survives a mailbox rebuild. Message-ID does. Rows stored before this
+        # step have none: find_stored_payment() matches them on confirmation
+        # code (or date + amount) the next time their message is seen, and
+        # fills it in.
+        "ALTER TABLE zelle_payments ADD COLUMN message_id TEXT",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_zelle_payments_message_id ON zelle_payments (message_id)",
+        "CREATE INDEX IF NOT EXISTS idx_zelle_payments_confirmation ON zelle_payments (confirmation_code, amount)",
+        "CREATE INDEX IF NOT EXISTS idx_zelle_payments_unkeyed ON zelle_payments (email_date, amount) "
+        "WHERE message_id IS NULL",
+    ]),
+]
+
+
+def rebuild_stats_rollup(conn):
+    """Recompute the stats rollups from zelle_payments in one transaction"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for sql in STATS_ROLLUP_REBUILD:
+            conn.execute(sql)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def migrate_db(conn):
+    """Apply pending SCHEMA_MIGRATIONS, each atomically with its user_version bump"""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+    for version, description, statements in SCHEMA_MIGRATIONS:
+        if version <= current:
+            continue
+        # Explicit BEGIN: sqlite3 doesn't open a transaction for DDL on its own
+        conn.execute("BEGIN")
+        try:
+            for sql in statements:
+                conn.execute(sql)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"[DB] Migrated schema to v{version}: {description}")
+
+
 def init_db():
     """Initialize SQLite database with payment tables"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
 
     # Zelle payments table
@@ -147,6 +410,17 @@ def init_db():
         updated_at TEXT DEFAULT CURRENT_TIMESTAMP
     )''')
 
+    # Bump members_version on any change that affects matching, so the
+    # in-memory MemberIndex knows to rebuild
+    for name, event in (('ins', 'INSERT'), ('del', 'DELETE'),
+                        ('upd', 'UPDATE OF first_name, last_name, full_name, email')):
+        c.execute(f'''CREATE TRIGGER IF NOT EXISTS members_version_{name}
+            AFTER {event} ON members
+            BEGIN
+                INSERT INTO settings (key, value, updated_at) VALUES ('members_version', '1', datetime('now'))
+                ON CONFLICT(key) DO UPDATE SET value = CAST(value AS INTEGER) + 1, updated_at = excluded.updated_at;
+            END''')
+
     # Seed demo members if empty
     c.execute("SELECT COUNT(*) FROM members")
     if c.fetchone()[0] == 0:
@@ -165,10 +439,24 @@ def init_db():
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', demo_members)
 
     conn.commit()
-    conn.close()
+    migrate_db(conn)
     print(f"[DB] Database initialized: {DB_PATH}")
 
 
+def get_setting(c, key, default=None):
+    """Read a value from the settings table"""
+    c.execute("SELECT value FROM settings WHERE key = ?", (key,))
+    row = c.fetchone()
+    return row[0] if row else default
+
+
+def set_setting(c, key, value):
+    """Write a value to the settings table (caller commits)"""
+    c.execute('''INSERT INTO settings (key, value, updated_at) VALUES (?, ?, ?)
+        ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at''',
+        (key, str(value), datetime.now().isoformat()))
+
+
 # ====== EMAIL PARSING ======
 
 def decode_email_header(header_value):
@@ -209,13 +497,7 @@ def is_zelle_email(subject, from_addr, body=""):
 
 def parse_zelle_amount(text):
     """Extract dollar amount from text"""
-    patterns = [
-        r'\$\s*([\d,]+(?:\.\d{2})?)',       # $150.00 or $1,500.00
-        r'([\d,]+(?:\.\d{2})?)\s*(?:USD|dollars?)',  # 150.00 USD
-        r'amount[:\s]*\$?\s*([\d,]+(?:\.\d{2})?)',   # amount: $150
-        r'received[:\s]*\$?\s*([\d,]+(?:\.\d{2})?)',  # received $150
-    ]
-    for pattern in patterns:
+    for pattern in ZELLE_AMOUNT_PATTERNS:
         match = re.search(pattern, text, re.IGNORECASE)
         if match:
             amount_str = match.group(1).replace(',', '')
@@ -228,32 +510,20 @@ def parse_zelle_amount(text):
 
 def parse_zelle_sender(subject, body):
     """Extract sender name from Zelle email"""
-    patterns = [
-        r'from\s+([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+){0,3})',  # "from John Smith"
-        r'([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+){0,3})\s+sent\s+you',  # "John Smith sent you"
-        r'(?:sent|paid)\s+by\s+([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+){0,3})',  # "paid by John"
-        r'Zelle.*?from\s+([A-Z][a-zA-Z]+(?:\s+[A-Z][a-zA-Z]+){0,3})',
-    ]
     combined = f"{subject}\n{body}"
-    for pattern in patterns:
+    for pattern in ZELLE_SENDER_PATTERNS:
         match = re.search(pattern, combined)
         if match:
             name = match.group(1).strip()
             # Filter out common false positives
-            noise = {'Zelle', 'Chase', 'Wells', 'Fargo', 'Bank', 'America', 'Direct', 'Deposit', 'Payment', 'Your', 'The'}
-            if name.split()[0] not in noise:
+            if name.split()[0] not in SENDER_NAME_NOISE:
                 return name
     return "Unknown Sender"
 
 
 def parse_zelle_memo(body):
     """Extract memo/note from Zelle email body"""
-    patterns = [
-        r'(?:memo|note|message|description)[:\s]*[""]?([^""\n]{3,80})[""]?',
-        r'(?:for|regarding)[:\s]*[""]?([^""\n]{3,80})[""]?',
-        r'Membership\s*[-–]\s*([A-Z][a-zA-Z\s]+)',
-    ]
-    for pattern in patterns:
+    for pattern in ZELLE_MEMO_PATTERNS:
         match = re.search(pattern, body, re.IGNORECASE)
         if match:
             return match.group(1).strip()
@@ -262,11 +532,7 @@ def parse_zelle_memo(body):
 
 def parse_zelle_confirmation(body):
     """Extract confirmation/reference code"""
-    patterns = [
-        r'(?:confirmation|reference|transaction|ref)\s*(?:#|number|code|id)?[:\s]*([A-Z0-9]{6,20})',
-        r'(?:ID|Id)[:\s]*([A-Z0-9]{6,20})',
-    ]
-    for pattern in patterns:
+    for pattern in ZELLE_CONFIRMATION_PATTERNS:
         match = re.search(pattern, body, re.IGNORECASE)
         if match:
             return match.group(1).strip()
@@ -276,21 +542,137 @@ def parse_zelle_confirmation(body):
 def parse_bank_source(from_addr, body):
     """Identify which bank sent the notification"""
     text = f"{from_addr} {body}".lower()
-    bank_map = {
-        'chase': 'Chase',
-        'bankofamerica': 'Bank of America',
-        'wellsfargo': 'Wells Fargo',
-        'usbank': 'US Bank',
-        'pnc': 'PNC',
-        'capitalone': 'Capital One',
-        'zelle': 'Zelle Direct',
-    }
-    for key, name in bank_map.items():
+    for key, name in BANK_SOURCES:
         if key in text:
             return name
     return "Unknown Bank"
 
 
+# ====== COMPILED CLASSIFIER ======
+
+class ZelleParser:
+    """
+    Compiled Zelle classifier/extractor.
+
+    Same decisions as is_zelle_email and the parse_* helpers above, but
+    every pattern is compiled once, the subject patterns run as a single
+    named-group alternation, and subject/from/body are lower-cased once
+    per message. Extractor lists keep their priority order (a merged
+    alternation would pick the leftmost match instead of the first
+    pattern), so each field is still first-pattern-wins.
+
+    `version` fingerprints REVISION plus every pattern list, so verdicts
+    cached under an older parser are re-evaluated automatically; bump
+    REVISION when the matching logic itself changes.
+    """
+
+    REVISION = 1
+
+    def __init__(self):
+        self.subject_re = re.compile(
+            '|'.join(f'(?P<subject_{i}>{p})' for i, p in enumerate(ZELLE_SUBJECT_PATTERNS)),
+            re.IGNORECASE)
+        self.money_re = re.compile(r'\$[\d,]+(?:\.\d{2})?')
+        self.sender_domains = [d.lower() for d in ZELLE_SENDER_DOMAINS]
+
+        # Each extractor carries literals it cannot match without; a cheap
+        # substring check skips regexes that would backtrack through the
+        # whole body for nothing. () means always try.
+        self.amount_res = self._compile(ZELLE_AMOUNT_PATTERNS, re.IGNORECASE,
+                                        [(), ('usd', 'dollar'), ('amount',), ('received',)])
+        self.sender_res = self._compile(ZELLE_SENDER_PATTERNS, 0,
+                                        [('from',), ('sent',), ('sent', 'paid'), ('Zelle',)])
+        self.memo_res = self._compile(ZELLE_MEMO_PATTERNS, re.IGNORECASE,
+                                      [('memo', 'note', 'message', 'description'), ('for', 'regarding'),
+                                       ('membership',)])
+        self.confirmation_res = self._compile(ZELLE_CONFIRMATION_PATTERNS, re.IGNORECASE,
+                                              [('confirmation', 'reference', 'transaction', 'ref'), ('id',)])
+        fingerprint = json.dumps([ZELLE_SUBJECT_PATTERNS, ZELLE_SENDER_DOMAINS, ZELLE_AMOUNT_PATTERNS,
+                                  ZELLE_SENDER_PATTERNS, ZELLE_MEMO_PATTERNS, ZELLE_CONFIRMATION_PATTERNS])
+        self.version = f"{self.REVISION}-{hashlib.sha1(fingerprint.encode()).hexdigest()[:12]}"
+
+    @staticmethod
+    def _compile(patterns, flags, needles):
+        return [(re.compile(p, flags), n) for p, n in zip(patterns, needles)]
+
+    @staticmethod
+    def _candidates(regexes, haystack):
+        """Regexes (in priority order) whose required literals occur in haystack"""
+        for regex, needles in regexes:
+            if not needles or any(n in haystack for n in needles):
+                yield regex
+
+    def classify(self, subject, from_addr, body=""):
+        """Why a message counts as Zelle ('subject_<n>', 'sender_domain', 'keyword_amount'), or None"""
+        match = self.subject_re.search(subject)
+        if match:
+            return match.lastgroup
+
+        parts = (subject.lower(), from_addr.lower(), body.lower())
+        mentions_zelle = any('zelle' in part for part in parts)
+        if mentions_zelle and any(d in parts[1] for d in self.sender_domains):
+            return 'sender_domain'
+        if mentions_zelle and any(self.money_re.search(part) for part in parts):
+            return 'keyword_amount'
+        return None
+
+    def parse(self, subject, from_addr, body):
+        """
+        Classify and extract in one call. Returns None for non-Zelle mail,
+        else a dict with classification, amount, sender_name, memo,
+        confirmation_code and bank_source.
+        """
+        classification = self.classify(subject, from_addr, body)
+        if classification is None:
+            return None
+        text = f"{subject} {body}"
+        body_lower = body.lower()
+        return {
+            'classification': classification,
+            'amount': self._amount(text, text.lower()),
+            'sender_name': self._sender(f"{subject}\n{body}"),
+            'memo': self._first_group(self.memo_res, body, body_lower),
+            'confirmation_code': self._first_group(self.confirmation_res, body, body_lower),
+            'bank_source': self._bank(f"{from_addr} {body}".lower()),
+        }
+
+    def _amount(self, text, text_lower):
+        for regex in self._candidates(self.amount_res, text_lower):
+            match = regex.search(text)
+            if match:
+                try:
+                    return float(match.group(1).replace(',', ''))
+                except ValueError:
+                    continue
+        return None
+
+    def _sender(self, text):
+        for regex in self._candidates(self.sender_res, text):
+            match = regex.search(text)
+            if match:
+                name = match.group(1).strip()
+                if name.split()[0] not in SENDER_NAME_NOISE:
+                    return name
+        return "Unknown Sender"
+
+    def _first_group(self, regexes, text, text_lower):
+        for regex in self._candidates(regexes, text_lower):
+            match = regex.search(text)
+            if match:
+                return match.group(1).strip()
+        return ""
+
+    @staticmethod
+    def _bank(text):
+        for key, name in BANK_SOURCES:
+            if key in text:
+                return name
+        return "Unknown Bank"
+
+
+zelle_parser = ZelleParser()
+
+
 def get_email_body(msg):
     """Extract text body from email message"""
     body = ""
@@ -319,60 +701,258 @@ def get_email_body(msg):
     return body[:5000]  # Limit to 5KB
 
 
+def might_be_zelle_header(subject, from_addr):
+    """
+    Header-only prefilter: True for anything is_zelle_email could accept
+    without looking at the body. Body-only mentions are caught separately
+    by a server-side BODY search.
+    """
+    return zelle_parser.classify(subject, from_addr) is not None or 'zelle' in f"{subject} {from_addr}".lower()
+
+
 # ====== MEMBER MATCHING ======
 
+_NAME_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def name_tokens(text):
+    """Lower-cased alphanumeric tokens of a name or memo"""
+    return _NAME_TOKEN_RE.findall(text.lower()) if text else []
+
+
+class MemberIndex:
+    """
+    In-memory lookup tables over the members table for match_member.
+
+    Built once and rebuilt only when the `members_version` setting moves;
+    triggers in init_db bump it whenever a member is added, removed or has
+    a name/email change (balance updates don't count). Holds email ->
+    member, full-name token tuple -> members, token -> members and a
+    last-name inverted index, so a match is a handful of dict lookups
+    instead of a table scan per payment.
+
+    The tables live in one immutable Tables snapshot that a rebuild swaps in
+    with a single assignment, and match() reads the snapshot once, so a
+    concurrent rebuild can't pair the new email map with the old name maps.
+    """
+
+    COLUMNS = "id, first_name, last_name, full_name, email"
+    Tables = namedtuple('Tables', 'version by_email by_full_name by_token by_last_name max_name_len')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.tables = self.Tables(None, {}, {}, {}, {}, 0)
+
+    def refresh(self, c):
+        """Rebuild from the members table if it changed since the last build"""
+        version = get_setting(c, 'members_version', '0')
+        if version == self.tables.version:
+            return
+        with self._lock:
+            if version == self.tables.version:
+                return
+            by_email, by_full_name, by_token, by_last_name = {}, {}, {}, {}
+            max_name_len = 0
+            c.execute(f"SELECT {self.COLUMNS} FROM members ORDER BY rowid")
+            for row in c.fetchall():
+                m = dict(zip(('id', 'first_name', 'last_name', 'full_name', 'email'), row))
+                if m['email']:
+                    by_email.setdefault(m['email'].lower(), m)
+                full = tuple(name_tokens(m['full_name']))
+                if full:
+                    by_full_name.setdefault(full, []).append(m)
+                    max_name_len = max(max_name_len, len(full))
+                for token in set(full) | set(name_tokens(m['first_name'])):
+                    by_token.setdefault(token, []).append(m)
+                for token in name_tokens(m['last_name']):
+                    by_last_name.setdefault(token, []).append(m)
+            self.tables = self.Tables(version, by_email, by_full_name, by_token, by_last_name, max_name_len)
+
+    @staticmethod
+    def _pick(candidates, tokens):
+        """Prefer the candidate whose first name also appears; else the oldest row"""
+        if len(candidates) > 1:
+            for m in candidates:
+                first = name_tokens(m['first_name'])
+                if first and all(t in tokens for t in first):
+                    return m
+        return candidates[0]
+
+    @staticmethod
+    def _full_name_in(t, tokens):
+        """Members whose full name appears as consecutive tokens"""
+        for n in range(min(t.max_name_len, len(tokens)), 0, -1):
+            for i in range(len(tokens) - n + 1):
+                found = t.by_full_name.get(tuple(tokens[i:i + n]))
+                if found:
+                    return found
+        return None
+
+    @staticmethod
+    def _last_name_in(t, tokens):
+        """Members with a last-name token among `tokens`, in table order"""
+        seen, hits = set(), []
+        for token in tokens:
+            for m in t.by_last_name.get(token, ()):
+                if m['id'] not in seen:
+                    seen.add(m['id'])
+                    hits.append(m)
+        return hits
+
+    def match(self, sender_name, memo, sender_email=""):
+        """(member dict, match_type) or (None, 'no_match')"""
+        t = self.tables  # one snapshot for the whole match
+        # Strategy 1: Match by email (strongest signal)
+        if sender_email:
+            member = t.by_email.get(sender_email.strip().lower())
+            if member:
+                return dict(member), 'email_match'
+
+        # Strategy 2: Match by name in memo (e.g., "Membership - Sunil Banerjee")
+        memo_tokens = name_tokens(memo)
+        if memo_tokens:
+            found = self._full_name_in(t, memo_tokens) or self._last_name_in(t, memo_tokens)
+            if found:
+                return dict(self._pick(found, set(memo_tokens))), 'memo_match'
+
+        # Strategy 3: Match by sender name
+        if sender_name and sender_name != "Unknown Sender":
+            sender_tokens = name_tokens(sender_name)
+            found = t.by_full_name.get(tuple(sender_tokens))
+            if found:
+                return dict(found[0]), 'name_exact'
+            found = self._last_name_in(t, sender_tokens)
+            if not found and sender_tokens:
+                # Sender gave part of the name ("Priya") - every token must hit the same member
+                ids = None
+                for token in sender_tokens:
+                    token_ids = {m['id'] for m in t.by_token.get(token, ())}
+                    ids = token_ids if ids is None else ids & token_ids
+                found = [m for m in t.by_token.get(sender_tokens[0], ()) if m['id'] in ids]
+            if found:
+                return dict(self._pick(found, set(sender_tokens))), 'name_partial'
+
+        return None, 'no_match'
+
+
+member_index = MemberIndex()
+
+
 def match_member(sender_name, memo, amount, sender_email=""):
     """Try to auto-match a Zelle payment to a member"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
-
-    # Strategy 1: Match by email (strongest signal)
-    if sender_email:
-        c.execute("SELECT * FROM members WHERE LOWER(email) = LOWER(?)", (sender_email,))
-        member = c.fetchone()
-        if member:
-            conn.close()
-            return dict(member), 'email_match'
-
-    # Strategy 2: Match by name in memo (e.g., "Membership - Sunil Banerjee")
-    if memo:
-        c.execute("SELECT * FROM members")
-        for m in c.fetchall():
-            m = dict(m)
-            full = m['full_name'].lower()
-            last = m['last_name'].lower()
-            if full in memo.lower() or last in memo.lower():
-                conn.close()
-                return m, 'memo_match'
-
-    # Strategy 3: Match by sender name
-    if sender_name and sender_name != "Unknown Sender":
-        name_lower = sender_name.lower()
-        c.execute("SELECT * FROM members")
-        for m in c.fetchall():
-            m = dict(m)
-            full = m['full_name'].lower()
-            last = m['last_name'].lower()
-            first = m['first_name'].lower()
-            # Exact match
-            if name_lower == full:
-                conn.close()
-                return m, 'name_exact'
-            # Last name match
-            if last in name_lower or name_lower in full:
-                conn.close()
-                return m, 'name_partial'
-
-    conn.close()
-    return None, 'no_match'
+    member_index.refresh(get_db().cursor())
+    return member_index.match(sender_name, memo, sender_email)
 
 
 # ====== GMAIL POLLING ======
 
-def poll_gmail_for_zelle(days_back=30, force_full_scan=False):
+def get_imap_connection():
+    """Create authenticated IMAP connection to Gmail"""
+    return imap_client.connect(IMAP_SERVER, GMAIL_ADDRESS, GMAIL_APP_PASSWORD,
+                               port=IMAP_PORT, use_ssl=IMAP_USE_SSL, timeout=IMAP_TIMEOUT)
+
+
+def normalize_message_id(value):
+    """A Message-ID header as a dedup key: '<id@host>' without folding whitespace, or None"""
+    value = ''.join(str(value or '').split())
+    return value or None
+
+
+def parse_zelle_message(raw):
+    """
+    Decode, classify and extract one raw message (header + text bytes).
+    Returns the payment fields, or None if it isn't a Zelle notification.
+    Runs in pool workers too, so it touches neither the DB nor IMAP.
+    """
+    msg = email.message_from_bytes(raw)
+    subject = decode_email_header(msg.get("Subject", ""))
+    from_addr = decode_email_header(msg.get("From", ""))
+    body = get_email_body(msg)
+
+    # Classify and parse payment details in one pass
+    parsed = zelle_parser.parse(subject, from_addr, body)
+    if parsed is None:
+        return None
+    return {
+        'message_id': normalize_message_id(msg.get("Message-ID")),
+        'email_date': msg.get("Date", ""),
+        'sender_name': parsed['sender_name'],
+        'sender_email': from_addr,
+        'amount': parsed['amount'] if parsed['amount'] is not None else 0.0,
+        'memo': parsed['memo'],
+        'confirmation_code': parsed['confirmation_code'],
+        'bank_source': parsed['bank_source'],
+        'raw_subject': subject,
+        'raw_body_snippet': body[:500],
+    }
+
+
+def _parse_chunk(raws):
+    """Pool task: parse a chunk of messages, returning results or exceptions in order"""
+    out = []
+    for raw in raws:
+        try:
+            out.append(parse_zelle_message(raw))
+        except Exception as e:
+            out.append(e)
+    return out
+
+
+def iter_parsed_messages(mail, uids, workers=1):
+    """
+    Fetch `uids` (header + text) and yield (uid, parse result) in fetch
+    order; the result is a dict, None (not Zelle) or the Exception raised.
+    With workers > 1 the IMAP download keeps streaming while a process
+    pool parses chunks of PARSE_CHUNK messages; at most workers * 4
+    chunks are in flight, so memory stays bounded on archive imports.
+    """
+    fetched = imap_client.fetch_messages(mail, uids, "(BODY.PEEK[HEADER] BODY.PEEK[TEXT])", uid=True)
+    raw_messages = ((uid, attrs['BODY[HEADER]'] + (attrs.get('BODY[TEXT]') or b''))
+                    for uid, attrs in fetched if attrs.get('BODY[HEADER]') is not None)
+
+    if workers <= 1:
+        for uid, raw in raw_messages:
+            yield uid, _parse_chunk([raw])[0]
+        return
+
+    # spawn, not fork: the service process has IMAP/Flask threads running
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+        in_flight = deque()
+        chunk = []
+        for uid, raw in raw_messages:
+            chunk.append((uid, raw))
+            if len(chunk) == PARSE_CHUNK:
+                in_flight.append(([u for u, _ in chunk], pool.submit(_parse_chunk, [r for _, r in chunk])))
+                chunk = []
+            while len(in_flight) >= workers * 4:
+                chunk_uids, future = in_flight.popleft()
+                yield from zip(chunk_uids, future.result())
+        if chunk:
+            in_flight.append(([u for u, _ in chunk], pool.submit(_parse_chunk, [r for _, r in chunk])))
+        while in_flight:
+            chunk_uids, future = in_flight.popleft()
+            yield from zip(chunk_uids, future.result())
+
+
+def poll_gmail_for_zelle(days_back=30, force_full_scan=False, mail=None, parse_workers=None):
     """
     Poll Gmail inbox for Zelle payment emails.
+
+    Sync is UID-based: the (UIDVALIDITY, last UID) checkpoint lives in the
+    settings table and each poll only searches `UID n:*`. A full SINCE
+    search over `days_back` runs on the first poll, when UIDVALIDITY
+    changes, or when `force_full_scan` is set. A resync never stores a
+    payment twice: messages whose Message-ID is on file are skipped on
+    headers, and store_payment_batch checks the rest (find_stored_payment).
+    Messages are screened on headers first; only survivors have their
+    text fetched and MIME-parsed.
+    Pass `mail` to reuse an open connection with INBOX already selected
+    (the IDLE watcher does); it is left open for the caller.
+    Rejected messages are remembered in zelle_seen_messages with the
+    parser version, so no scan fetches them again until the parser changes.
+    Bodies are parsed in a process pool of `parse_workers` (default:
+    PARSE_WORKERS once there are PARSE_POOL_MIN candidates); matching and
+    the DB write stay on this thread, in fetch order.
     Returns dict with results summary.
     """
     start_time = time.time()
@@ -380,219 +960,508 @@ def poll_gmail_for_zelle(days_back=30, force_full_scan=False):
         'emails_checked': 0,
         'new_payments': 0,
         'auto_matched': 0,
+        'sync_mode': 'full',
         'errors': [],
         'payments': []
     }
+    batch = []          # parsed payments, written together at the end
+    rejected = []       # (uid, verdict) for mail that isn't Zelle
+    sync_state = None   # (uidvalidity, last_uid) to store with them
+    uidvalidity = None
 
-    try:
-        mail = imaplib.IMAP4_SSL(IMAP_SERVER)
-        mail.login(GMAIL_ADDRESS, GMAIL_APP_PASSWORD)
-        mail.select("INBOX", readonly=True)
-    except Exception as conn_err:
-        results['errors'].append(f"Gmail connection failed: {str(conn_err)}")
-        print(f"[SCAN] Gmail connection failed: {conn_err}")
-        return results
-
-    try:
-        since_date = (datetime.now() - timedelta(days=days_back)).strftime("%d-%b-%Y")
-
-        # Search for emails with Zelle-related terms
-        search_criteria = f'(OR (SUBJECT "Zelle") (SUBJECT "zelle") (SUBJECT "received") (BODY "Zelle") SINCE {since_date})'
+    own_connection = mail is None
+    if own_connection:
         try:
-            status, msg_ids = mail.search(None, search_criteria)
-        except Exception:
-            # Fallback: simpler search
-            status, msg_ids = mail.search(None, f'SINCE {since_date}')
-
-        if status != 'OK' or not msg_ids[0]:
-            mail.logout()
+            mail = get_imap_connection()
+            mail.select("INBOX", readonly=True)
+        except Exception as conn_err:
+            results['errors'].append(f"Gmail connection failed: {str(conn_err)}")
+            print(f"[SCAN] Gmail connection failed: {conn_err}")
             return results
 
-        email_ids = msg_ids[0].split()
-        results['emails_checked'] = len(email_ids)
+    try:
+        uidvalidity, uidnext = imap_client.mailbox_uid_state(mail, "INBOX")
 
-        # Get existing email IDs to skip duplicates
-        conn = sqlite3.connect(DB_PATH)
+        # Load sync checkpoint and existing email IDs to skip duplicates
+        conn = get_db()
         c = conn.cursor()
+        saved_validity = get_setting(c, 'zelle_uidvalidity')
+        last_uid = int(get_setting(c, 'zelle_last_uid', 0) or 0)
         c.execute("SELECT email_id FROM zelle_payments")
         existing_ids = {row[0] for row in c.fetchall()}
-        conn.close()
+        c.execute("SELECT message_id FROM zelle_payments WHERE message_id IS NOT NULL")
+        known_message_ids = {row[0] for row in c.fetchall()}
+        c.execute("SELECT uid FROM zelle_seen_messages WHERE uidvalidity = ? AND parser_version = ?",
+                  (uidvalidity, zelle_parser.version))
+        seen_uids = {row[0] for row in c.fetchall()}
+        release_db()
+
+        incremental = (not force_full_scan and uidvalidity is not None
+                       and saved_validity == str(uidvalidity))
+
+        if incremental:
+            results['sync_mode'] = 'incremental'
+            uids = imap_client.new_uids_since(mail, last_uid)
+        else:
+            if saved_validity and uidvalidity is not None and saved_validity != str(uidvalidity):
+                print(f"[SCAN] UIDVALIDITY changed ({saved_validity} -> {uidvalidity}), full resync")
+            since_date = (datetime.now() - timedelta(days=days_back)).strftime("%d-%b-%Y")
 
-        for eid in email_ids:
+            # Search for emails with Zelle-related terms (IMAP OR is binary; SEARCH is case-insensitive)
+            search_criteria = f'(OR (OR (SUBJECT "Zelle") (SUBJECT "received")) (BODY "Zelle") SINCE {since_date})'
+            try:
+                uids = imap_client.uid_search(mail, search_criteria)
+            except Exception:
+                # Fallback: simpler search
+                uids = imap_client.uid_search(mail, f'SINCE {since_date}')
+
+        results['emails_checked'] = len(uids)
+        failed_uids = []
+
+        # UIDs are only unique within one UIDVALIDITY epoch
+        new_uids = [uid for uid in uids
+                    if f"{uidvalidity}:{uid}" not in existing_ids and uid not in seen_uids]
+        results['skipped_seen'] = sum(1 for uid in uids if uid in seen_uids)
+        results['skipped_known'] = 0
+
+        # Phase 1: headers only, in bulk, plus a server-side BODY search so
+        # mail that mentions Zelle only in its body still survives
+        headers = imap_client.uid_fetch(mail, new_uids, ZELLE_HEADER_FETCH)
+        body_hits = set()
+        if new_uids:
+            body_hits = set(imap_client.uid_search(mail, f'UID {imap_client.sequence_set(new_uids)} BODY "Zelle"'))
+
+        candidates = []
+        for uid in new_uids:
+            header_bytes = imap_client.section(headers.get(uid, {}), 'BODY[HEADER')
+            if header_bytes is None:
+                failed_uids.append(uid)
+                continue
+            hdr = email.message_from_bytes(header_bytes)
+            if normalize_message_id(hdr.get("Message-ID")) in known_message_ids:
+                # Already stored under another UID (e.g. before a UIDVALIDITY change)
+                results['skipped_known'] += 1
+                continue
+            if uid in body_hits or might_be_zelle_header(decode_email_header(hdr.get("Subject", "")),
+                                                         decode_email_header(hdr.get("From", ""))):
+                candidates.append(uid)
+            else:
+                rejected.append((uid, 'header'))
+
+        # Phase 2: full header + text only for the survivors, parsed as it
+        # streams in (in a process pool for big backfills)
+        workers = parse_workers or (PARSE_WORKERS if len(candidates) >= PARSE_POOL_MIN else 1)
+        results['bodies_fetched'] = len(candidates)
+        results['parse_workers'] = workers
+        parse_start = time.time()
+        fetched = set()
+
+        for uid, parsed in iter_parsed_messages(mail, candidates, workers):
+            fetched.add(uid)
+            if isinstance(parsed, Exception):
+                failed_uids.append(uid)
+                results['errors'].append(f"Email UID {uid}: {str(parsed)[:100]}")
+                continue
+            if parsed is None:
+                rejected.append((uid, 'body'))
+                continue
             try:
-                eid_str = eid.decode() if isinstance(eid, bytes) else str(eid)
-
-                # Skip if already processed
-                if eid_str in existing_ids:
-                    continue
-
-                status, msg_data = mail.fetch(eid, "(RFC822)")
-                if status != 'OK':
-                    continue
-
-                raw_email = msg_data[0][1]
-                msg = email.message_from_bytes(raw_email)
-
-                subject = decode_email_header(msg.get("Subject", ""))
-                from_addr = decode_email_header(msg.get("From", ""))
-                date_str = msg.get("Date", "")
-                body = get_email_body(msg)
-
-                # Check if this is a Zelle email
-                if not is_zelle_email(subject, from_addr, body):
-                    continue
-
-                # Parse payment details
-                amount = parse_zelle_amount(f"{subject} {body}")
-                sender_name = parse_zelle_sender(subject, body)
-                memo_text = parse_zelle_memo(body)
-                conf_code = parse_zelle_confirmation(body)
-                bank = parse_bank_source(from_addr, body)
-
-                if amount is None:
-                    amount = 0.0
-
                 # Try to auto-match to a member
-                member, match_type = match_member(sender_name, memo_text, amount)
+                member, match_type = match_member(parsed['sender_name'], parsed['memo'], parsed['amount'])
+                batch.append(dict(parsed, email_id=f"{uidvalidity}:{uid}", member=member, match_type=match_type))
+            except Exception as e:
+                failed_uids.append(uid)
+                results['errors'].append(f"Email UID {uid}: {str(e)[:100]}")
 
-                # Store in database
-                conn = sqlite3.connect(DB_PATH)
-                c = conn.cursor()
-                try:
-                    c.execute('''INSERT INTO zelle_payments
-                        (email_id, email_date, sender_name, sender_email, amount, memo,
-                         confirmation_code, bank_source, raw_subject, raw_body_snippet,
-                         matched_member_id, matched_member_name, matched_member_email,
-                         status, auto_matched, created_at)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                        (eid_str, date_str, sender_name, from_addr, amount, memo_text,
-                         conf_code, bank, subject, body[:500],
-                         member['id'] if member else None,
-                         member['full_name'] if member else None,
-                         member['email'] if member else None,
-                         'auto_verified' if member else 'pending',
-                         1 if member else 0,
-                         datetime.now().isoformat()))
-                    conn.commit()
-
-                    payment_id = c.lastrowid
-                    results['new_payments'] += 1
-
-                    if member:
-                        results['auto_matched'] += 1
-                        # Auto-update member balance
-                        c.execute('''UPDATE members SET
-                            total_paid = total_paid + ?,
-                            balance_due = MAX(0, balance_due - ?),
-                            updated_at = ?
-                            WHERE id = ?''',
-                            (amount, amount, datetime.now().isoformat(), member['id']))
-
-                        # Add to payment history
-                        receipt = f"ZP-{datetime.now().strftime('%Y%m%d')}-{payment_id:04d}"
-                        c.execute('''INSERT INTO payment_history
-                            (member_id, member_name, payment_type, amount, description,
-                             payment_method, zelle_payment_id, status, receipt_number)
-                            VALUES (?, ?, ?, ?, ?, 'Zelle', ?, 'completed', ?)''',
-                            (member['id'], member['full_name'], 'Membership',
-                             amount, f"Zelle from {sender_name}: {memo_text or 'No memo'}",
-                             payment_id, receipt))
-                        conn.commit()
-
-                    results['payments'].append({
-                        'id': payment_id,
-                        'sender': sender_name,
-                        'amount': amount,
-                        'memo': memo_text,
-                        'matched': member['full_name'] if member else None,
-                        'match_type': match_type,
-                        'status': 'auto_verified' if member else 'pending'
-                    })
-
-                except sqlite3.IntegrityError:
-                    pass  # Duplicate
-                finally:
-                    conn.close()
+        failed_uids += [uid for uid in candidates if uid not in fetched]
+        parse_secs = time.time() - parse_start
+        results['messages_per_sec'] = round(len(candidates) / parse_secs, 1) if candidates and parse_secs else 0
 
-            except Exception as e:
-                results['errors'].append(f"Email {eid}: {str(e)[:100]}")
+        # Advance the checkpoint, but never past a message that failed
+        if uidvalidity is not None:
+            if incremental:
+                checkpoint = max(uids, default=last_uid)
+            else:
+                checkpoint = uidnext - 1 if uidnext else max(uids, default=0)
+            if failed_uids:
+                checkpoint = min(checkpoint, min(failed_uids) - 1)
+            sync_state = (uidvalidity, checkpoint)
 
-        mail.logout()
+        if own_connection:
+            mail.logout()
 
     except Exception as e:
         results['errors'].append(f"IMAP error: {str(e)[:200]}")
 
-    # Log poll results
+    # Payments, balances, history, checkpoint and poll_log land in one
+    # transaction: one commit per poll, and a failed write leaves the
+    # checkpoint where it was so the next poll retries the same mail
     duration_ms = int((time.time() - start_time) * 1000)
+    conn = get_db()
     try:
-        conn = sqlite3.connect(DB_PATH)
-        c = conn.cursor()
-        c.execute('''INSERT INTO poll_log (poll_time, emails_checked, new_payments_found, auto_matched, errors, duration_ms)
+        conn.execute("BEGIN IMMEDIATE")
+        store_payment_batch(conn, batch, results)
+        if uidvalidity is not None:
+            store_seen_messages(conn, uidvalidity, rejected, prune=results['sync_mode'] == 'full')
+        if sync_state:
+            set_setting(conn, 'zelle_uidvalidity', sync_state[0])
+            set_setting(conn, 'zelle_last_uid', sync_state[1])
+            results['last_uid'] = sync_state[1]
+        conn.execute('''INSERT INTO poll_log (poll_time, emails_checked, new_payments_found, auto_matched, errors, duration_ms)
             VALUES (?, ?, ?, ?, ?, ?)''',
             (datetime.now().isoformat(), results['emails_checked'], results['new_payments'],
              results['auto_matched'], json.dumps(results['errors']), duration_ms))
         conn.commit()
-        conn.close()
-    except Exception:
-        pass
+    except Exception as e:
+        conn.rollback()
+        results['new_payments'] = results['auto_matched'] = 0
+        results['payments'] = []
+        results.pop('last_uid', None)
+        results['errors'].append(f"DB write failed: {str(e)[:200]}")
+        print(f"[SCAN] DB write failed, nothing stored: {e}")
 
     results['duration_ms'] = duration_ms
     return results
 
 
+def store_seen_messages(conn, uidvalidity, rejected, prune=False):
+    """
+    Record classifier rejections as (uid, verdict) under the current
+    parser version. Runs inside the caller's transaction; a full scan
+    also prunes entries from older parsers or UIDVALIDITY epochs.
+    """
+    if prune:
+        conn.execute("DELETE FROM zelle_seen_messages WHERE uidvalidity != ? OR parser_version != ?",
+                     (uidvalidity, zelle_parser.version))
+    now = datetime.now().isoformat()
+    conn.executemany('''INSERT OR REPLACE INTO zelle_seen_messages
+        (uidvalidity, uid, verdict, parser_version, seen_at) VALUES (?, ?, ?, ?, ?)''',
+        [(uidvalidity, uid, verdict, zelle_parser.version, now) for uid, verdict in rejected])
+
+
+def find_stored_payment(conn, p):
+    """
+    The zelle_payments row (id, message_id) that parsed payment `p`
+    duplicates, or None. Message-ID decides; failing that the bank's
+    confirmation code with the same amount; failing that (no usable code),
+    a row stored before Message-IDs were recorded with the same Date
+    header and amount.
+    """
+    if p.get('message_id'):
+        row = conn.execute("SELECT id, message_id FROM zelle_payments WHERE message_id = ?",
+                           (p['message_id'],)).fetchone()
+        if row:
+            return row
+    code = p.get('confirmation_code') or ''
+    # The extractor can return a stray word ('number') when a code is short; real codes carry digits
+    if any(ch.isdigit() for ch in code):
+        return conn.execute('''SELECT id, message_id FROM zelle_payments
+            WHERE confirmation_code = ? AND amount = ? LIMIT 1''', (code, p['amount'])).fetchone()
+    if p.get('email_date'):
+        return conn.execute('''SELECT id, message_id FROM zelle_payments
+            WHERE message_id IS NULL AND email_date = ? AND amount = ? LIMIT 1''',
+            (p['email_date'], p['amount'])).fetchone()
+    return None
+
+
+def store_payment_batch(conn, batch, results):
+    """
+    Write a poll's parsed payments inside the caller's transaction.
+    Payments already stored (find_stored_payment) are skipped, and an old
+    row without a Message-ID gets this one. RETURNING hands back ids only
+    for rows actually inserted (executemany can't return rows, so those go
+    one statement each). Balance updates and history rows for the
+    auto-matched ones then go in with executemany.
+    """
+    now = datetime.now().isoformat()
+    member_updates, history_rows = [], []
+    for p in batch:
+        stored = find_stored_payment(conn, p)
+        if stored is not None:
+            if stored[1] is None and p.get('message_id'):
+                conn.execute("UPDATE zelle_payments SET message_id = ? WHERE id = ?", (p['message_id'], stored[0]))
+            continue  # Duplicate
+        member = p['member']
+        status = 'auto_verified' if member else 'pending'
+        row = conn.execute('''INSERT INTO zelle_payments
+            (email_id, message_id, email_date, sender_name, sender_email, amount, memo,
+             confirmation_code, bank_source, raw_subject, raw_body_snippet,
+             matched_member_id, matched_member_name, matched_member_email,
+             status, auto_matched, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+            RETURNING id''',
+            (p['email_id'], p.get('message_id'), p['email_date'], p['sender_name'], p['sender_email'], p['amount'], p['memo'],
+             p['confirmation_code'], p['bank_source'], p['raw_subject'], p['raw_body_snippet'],
+             member['id'] if member else None,
+             member['full_name'] if member else None,
+             member['email'] if member else None,
+             status, 1 if member else 0, now)).fetchone()
+        if row is None:
+            continue  # Duplicate
+        payment_id = row[0]
+        results['new_payments'] += 1
+
+        if member:
+            results['auto_matched'] += 1
+            # Auto-update member balance and add to payment history
+            member_updates.append((p['amount'], p['amount'], now, member['id']))
+            receipt = f"ZP-{datetime.now().strftime('%Y%m%d')}-{payment_id:04d}"
+            history_rows.append((member['id'], member['full_name'], 'Membership', p['amount'],
+                                 f"Zelle from {p['sender_name']}: {p['memo'] or 'No memo'}",
+                                 payment_id, receipt))
+
+        results['payments'].append({
+            'id': payment_id,
+            'sender': p['sender_name'],
+            'amount': p['amount'],
+            'memo': p['memo'],
+            'matched': member['full_name'] if member else None,
+            'match_type': p['match_type'],
+            'status': status
+        })
+
+    conn.executemany('''UPDATE members SET
+        total_paid = total_paid + ?,
+        balance_due = MAX(0, balance_due - ?),
+        updated_at = ?
+        WHERE id = ?''', member_updates)
+    conn.executemany('''INSERT INTO payment_history
+        (member_id, member_name, payment_type, amount, description,
+         payment_method, zelle_payment_id, status, receipt_number)
+        VALUES (?, ?, ?, ?, ?, 'Zelle', ?, 'completed', ?)''', history_rows)
+
+
 # ====== BACKGROUND POLLER ======
+# Only one process polls, however many workers serve the API: the poller
+# runs in whichever process holds the leader lock (leader.py). Whether it
+# should run, and in which mode, is kept in the settings table so that
+# /api/zelle/poller/start|stop work from any worker; the leader applies
+# changes within POLLER_SUPERVISE_INTERVAL.
 
 _poller_thread = None
 _poller_running = False
+_poller_mode = POLL_MODE
+_poller_stop = threading.Event()
+# start/stop/apply are called from the leader's supervisor loop and from request threads
+_poller_lock = threading.RLock()
 
+poller_leader = leader.LeaderLock(POLLER_LOCK_FILE)
 
-def background_poller():
-    """Background thread that polls Gmail periodically"""
-    global _poller_running
+
+def _report_poll(result):
+    """Print a one-line summary of a poll result"""
+    if result['new_payments'] > 0:
+        print(f"[POLLER] Found {result['new_payments']} new Zelle payment(s), {result['auto_matched']} auto-matched")
+    else:
+        print(f"[POLLER] No new payments ({result['emails_checked']} emails checked)")
+
+
+def background_poller(stop):
+    """Background thread that polls Gmail periodically until `stop` is set"""
     print(f"[POLLER] Background poller started (interval: {POLL_INTERVAL}s)")
     # Wait a bit before first poll to let Flask start up
-    time.sleep(5)
-    while _poller_running:
+    stop.wait(5)
+    while not stop.is_set():
         try:
-            result = poll_gmail_for_zelle(days_back=7)
-            if result['new_payments'] > 0:
-                print(f"[POLLER] Found {result['new_payments']} new Zelle payment(s), {result['auto_matched']} auto-matched")
-            else:
-                print(f"[POLLER] No new payments ({result['emails_checked']} emails checked)")
+            _report_poll(poll_gmail_for_zelle(days_back=7))
         except Exception as e:
             print(f"[POLLER] Error (will retry): {e}")
-        time.sleep(POLL_INTERVAL)
+        stop.wait(POLL_INTERVAL)
     print("[POLLER] Background poller stopped")
 
 
-def start_poller():
-    """Start background polling"""
-    global _poller_thread, _poller_running
-    if _poller_running:
-        return False
-    _poller_running = True
-    _poller_thread = threading.Thread(target=background_poller, daemon=True)
-    _poller_thread.start()
-    return True
+def idle_watcher(stop):
+    """
+    Background thread that holds one IMAP connection in IDLE and runs the
+    incremental scan only when the server pushes an EXISTS notification.
+    Reconnects with exponential backoff if the connection drops.
+    """
+    print(f"[POLLER] IDLE watcher started (re-IDLE every {IDLE_TIMEOUT}s)")
+    stop.wait(5)
+    backoff = 5
+    while not stop.is_set():
+        mail = None
+        try:
+            mail = get_imap_connection()
+            mail.select("INBOX", readonly=True)
+            backoff = 5
+            # Catch up on anything that arrived while we were disconnected
+            _report_poll(poll_gmail_for_zelle(days_back=7, mail=mail))
+            while not stop.is_set():
+                if imap_client.idle_wait(mail, IDLE_TIMEOUT, should_stop=stop.is_set):
+                    _report_poll(poll_gmail_for_zelle(days_back=7, mail=mail))
+        except Exception as e:
+            print(f"[POLLER] IDLE connection error (reconnecting in {backoff}s): {e}")
+            stop.wait(backoff)
+            backoff = min(backoff * 2, 300)
+        finally:
+            if mail is not None:
+                try:
+                    mail.logout()
+                except Exception:
+                    pass
+    print("[POLLER] IDLE watcher stopped")
+
+
+def start_poller(mode=None):
+    """
+    Start background polling in this process ('interval' sleep loop or
+    'idle' push). Returns False if a poller is already running, or if a
+    stopped one is still finishing its last poll after POLLER_STOP_TIMEOUT
+    (the leader's supervisor loop tries again on its next check).
+    """
+    global _poller_thread, _poller_running, _poller_mode, _poller_stop
+    with _poller_lock:
+        if _poller_running:
+            return False
+        # Never let two pollers overlap: the stopped thread may be mid-poll
+        if _poller_thread is not None:
+            _poller_thread.join(POLLER_STOP_TIMEOUT)
+            if _poller_thread.is_alive():
+                print("[POLLER] Previous poller is still finishing; not starting another yet")
+                return False
+        _poller_mode = mode or POLL_MODE
+        target = idle_watcher if _poller_mode == 'idle' else background_poller
+        # A fresh event per thread, so a stopped thread still sleeping can't resume
+        _poller_stop = threading.Event()
+        _poller_running = True
+        _poller_thread = threading.Thread(target=target, args=(_poller_stop,), name="zelle-poller", daemon=True)
+        _poller_thread.start()
+        return True
 
 
 def stop_poller():
-    """Stop background polling"""
+    """Stop background polling in this process; start_poller waits for the thread to exit"""
     global _poller_running
-    _poller_running = False
+    with _poller_lock:
+        _poller_running = False
+        _poller_stop.set()
     return True
 
 
+def poller_settings(c):
+    """(enabled, mode) the poller should be in, from the settings table"""
+    enabled = get_setting(c, 'poller_enabled', '1' if POLLER_AUTOSTART else '0') == '1'
+    return enabled, get_setting(c, 'poller_mode', POLL_MODE)
+
+
+def apply_poller_settings():
+    """Leader only: start, stop or switch mode of the local poller to match the settings"""
+    conn = open_db()
+    try:
+        enabled, mode = poller_settings(conn.cursor())
+    finally:
+        conn.close()
+    with _poller_lock:
+        if _poller_running and (not enabled or mode != _poller_mode):
+            stop_poller()
+        if enabled and not _poller_running:
+            start_poller(mode)
+
+
+def _lead_poller():
+    print(f"[POLLER] Worker {os.getpid()} elected poller leader")
+    while True:
+        try:
+            apply_poller_settings()
+        except Exception as e:
+            print(f"[POLLER] Could not read poller settings (will retry): {e}")
+        time.sleep(POLLER_SUPERVISE_INTERVAL)
+
+
+def start_background():
+    """Campaign for the poller leader lock; the winner runs the poller. Safe to call in every worker."""
+    poller_leader.elect(_lead_poller)
+
+
+def poller_state(c):
+    """Poller status as seen from this worker (the poller itself may run in another one)"""
+    enabled, mode = poller_settings(c)
+    leader_pid = poller_leader.holder()
+    return {
+        "active": enabled and leader_pid is not None,
+        "enabled": enabled,
+        "mode": mode,
+        "leader_pid": leader_pid,
+        "worker_pid": os.getpid(),
+    }
+
+
+# ====== KEYSET PAGINATION ======
+
+class CursorError(ValueError):
+    """Malformed or tampered pagination cursor"""
+
+
+def encode_cursor(created_at, row_id, direction):
+    """Opaque token for the page after ('next') or before ('prev') a row"""
+    raw = json.dumps([created_at, row_id, direction], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    try:
+        created_at, row_id, direction = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if direction not in ('next', 'prev') or not isinstance(row_id, int):
+            raise ValueError(direction)
+        return created_at, row_id, direction
+    except (ValueError, TypeError, json.JSONDecodeError) as e:
+        raise CursorError(f"Invalid cursor: {token}") from e
+
+
+def keyset_page(c, select_sql, filters, params, alias, limit, cursor=None, offset=0):
+    """
+    One page of `select_sql` newest-first on (created_at, id), which an
+    index serves directly, so page 500 costs the same as page 1 and rows
+    inserted meanwhile don't shift it. `alias` prefixes the key columns
+    ('zp.' / 'ph.' or ''). Returns (rows, next_token, prev_token).
+    `offset` is only honoured without a cursor, for old clients.
+    """
+    created, rid = f"{alias}created_at", f"{alias}id"
+    direction = 'next'
+    filters = list(filters)
+    params = list(params)
+    if cursor:
+        cursor_created, cursor_id, direction = decode_cursor(cursor)
+        filters.append(f"({created}, {rid}) {'<' if direction == 'next' else '>'} (?, ?)")
+        params += [cursor_created, cursor_id]
+        offset = 0
+
+    order = 'DESC' if direction == 'next' else 'ASC'
+    sql = select_sql
+    if filters:
+        sql += " WHERE " + " AND ".join(filters)
+    sql += f" ORDER BY {created} {order}, {rid} {order} LIMIT ? OFFSET ?"
+    c.execute(sql, params + [limit + 1, offset])
+    rows = [dict(row) for row in c.fetchall()]
+
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if direction == 'prev':
+        rows.reverse()
+    # One side is known from the extra row, the other from having come from there
+    has_next = more if direction == 'next' else True
+    has_prev = more if direction == 'prev' else bool(cursor or offset)
+    next_token = encode_cursor(rows[-1]['created_at'], rows[-1]['id'], 'next') if rows and has_next else None
+    prev_token = encode_cursor(rows[0]['created_at'], rows[0]['id'], 'prev') if rows and has_prev else None
+    return rows, next_token, prev_token
+
+
 # ====== REST API ENDPOINTS ======
 
 @app.route('/api/zelle/health', methods=['GET'])
 def health():
     """Health check"""
+    poller = poller_state(get_db().cursor())
     return jsonify({
         "service": "BANF Zelle Payment Automation",
         "status": "running",
-        "poller_active": _poller_running,
+        "poller_active": poller["active"],
+        "poll_mode": poller["mode"],
         "poll_interval": POLL_INTERVAL,
+        "poller_leader_pid": poller["leader_pid"],
+        "worker_pid": poller["worker_pid"],
         "database": DB_PATH,
         "gmail": GMAIL_ADDRESS,
         "timestamp": datetime.now().isoformat()
@@ -603,60 +1472,67 @@ def health():
 def manual_scan():
     """Trigger manual Gmail scan for Zelle payments"""
     days = 30
+    force_full = False
+    parse_workers = None
     try:
         data = request.get_json(silent=True)
         if data and 'days_back' in data:
             days = int(data['days_back'])
+        if data and data.get('force_full_scan'):
+            force_full = True
+        if data and data.get('parse_workers'):
+            parse_workers = int(data['parse_workers'])
     except Exception:
         pass
-    result = poll_gmail_for_zelle(days_back=days)
+    result = poll_gmail_for_zelle(days_back=days, force_full_scan=force_full, parse_workers=parse_workers)
     return jsonify(result)
 
 
 @app.route('/api/zelle/payments', methods=['GET'])
 def get_payments():
-    """Get all Zelle payments with optional filters"""
+    """
+    Get Zelle payments newest-first with optional status filter. Pass the
+    returned `next`/`prev` token as `cursor` to page; `include_total=false`
+    skips the COUNT(*).
+    """
     status_filter = request.args.get('status', '')
     limit = int(request.args.get('limit', 100))
     offset = int(request.args.get('offset', 0))
+    include_total = request.args.get('include_total', 'true').lower() not in ('false', '0', 'no')
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     c = conn.cursor()
 
-    query = "SELECT * FROM zelle_payments"
-    params = []
+    filters, params = [], []
     if status_filter:
-        query += " WHERE status = ?"
+        filters.append("status = ?")
         params.append(status_filter)
-    query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-    params.extend([limit, offset])
-
-    c.execute(query, params)
-    payments = [dict(row) for row in c.fetchall()]
+    try:
+        payments, next_token, prev_token = keyset_page(
+            c, "SELECT * FROM zelle_payments", filters, params, '', limit,
+            cursor=request.args.get('cursor'), offset=offset)
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
 
-    # Get total count
-    count_query = "SELECT COUNT(*) FROM zelle_payments"
-    if status_filter:
-        count_query += " WHERE status = ?"
-        c.execute(count_query, [status_filter])
-    else:
-        c.execute(count_query)
-    total = c.fetchone()[0]
+    total = None
+    if include_total:
+        count_query = "SELECT COUNT(*) FROM zelle_payments"
+        if status_filter:
+            count_query += " WHERE status = ?"
+        c.execute(count_query, params)
+        total = c.fetchone()[0]
 
-    conn.close()
-    return jsonify({"payments": payments, "total": total, "limit": limit, "offset": offset})
+    return jsonify({"payments": payments, "total": total, "limit": limit, "offset": offset,
+                    "next": next_token, "prev": prev_token})
 
 
 @app.route('/api/zelle/payments/<int:payment_id>', methods=['GET'])
 def get_payment(payment_id):
     """Get single payment detail"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     c = conn.cursor()
     c.execute("SELECT * FROM zelle_payments WHERE id = ?", (payment_id,))
     payment = c.fetchone()
-    conn.close()
     if payment:
         return jsonify(dict(payment))
     return jsonify({"error": "Payment not found"}), 404
@@ -673,15 +1549,13 @@ def verify_payment(payment_id):
     member_name = data.get('member_name', '')
     verified_by = data.get('verified_by', 'admin')
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     c = conn.cursor()
 
     # Get payment
     c.execute("SELECT * FROM zelle_payments WHERE id = ?", (payment_id,))
     payment = c.fetchone()
     if not payment:
-        conn.close()
         return jsonify({"error": "Payment not found"}), 404
 
     payment = dict(payment)
@@ -720,7 +1594,6 @@ def verify_payment(payment_id):
              payment_id, receipt))
 
     conn.commit()
-    conn.close()
     return jsonify({"success": True, "message": f"Payment #{payment_id} verified"})
 
 
@@ -732,13 +1605,12 @@ def reject_payment(payment_id):
     except Exception:
         data = {}
     reason = data.get('reason', '')
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
     c.execute('''UPDATE zelle_payments SET status = 'rejected', memo = COALESCE(memo,'') || ' [REJECTED: ' || ? || ']',
         updated_at = ? WHERE id = ?''',
         (reason, datetime.now().isoformat(), payment_id))
     conn.commit()
-    conn.close()
     return jsonify({"success": True, "message": f"Payment #{payment_id} rejected"})
 
 
@@ -753,14 +1625,12 @@ def match_payment_to_member(payment_id):
     if not member_id:
         return jsonify({"error": "member_id required"}), 400
 
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     c = conn.cursor()
 
     c.execute("SELECT * FROM members WHERE id = ?", (member_id,))
     member = c.fetchone()
     if not member:
-        conn.close()
         return jsonify({"error": "Member not found"}), 404
 
     member = dict(member)
@@ -771,42 +1641,44 @@ def match_payment_to_member(payment_id):
         (member['id'], member['full_name'], member['email'],
          datetime.now().isoformat(), datetime.now().isoformat(), payment_id))
     conn.commit()
-    conn.close()
     return jsonify({"success": True, "member": member['full_name']})
 
 
 @app.route('/api/zelle/stats', methods=['GET'])
 def get_stats():
     """Get payment statistics dashboard data"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     c = conn.cursor()
 
     stats = {}
 
-    # Total payments
-    c.execute("SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM zelle_payments")
-    row = c.fetchone()
-    stats['total_payments'] = row[0]
-    stats['total_amount'] = round(row[1], 2)
-
-    # By status
-    c.execute("SELECT status, COUNT(*), COALESCE(SUM(amount), 0) FROM zelle_payments GROUP BY status")
-    stats['by_status'] = {r[0]: {'count': r[1], 'amount': round(r[2], 2)} for r in c.fetchall()}
+    # Everything about payments comes from the rollups, not zelle_payments itself
+    c.execute('''SELECT status, SUM(payment_count), SUM(amount_cents) FROM zelle_payment_totals
+        GROUP BY status HAVING SUM(payment_count) > 0''')
+    by_status = {r[0]: {'count': r[1], 'amount': round(r[2] / 100, 2)} for r in c.fetchall()}
+    stats['total_payments'] = sum(v['count'] for v in by_status.values())
+    stats['total_amount'] = round(sum(v['amount'] for v in by_status.values()), 2)
+    stats['by_status'] = by_status
 
     # Auto-matched vs manual
-    c.execute("SELECT auto_matched, COUNT(*) FROM zelle_payments GROUP BY auto_matched")
+    c.execute('''SELECT auto_matched != 0, SUM(payment_count) FROM zelle_payment_totals
+        GROUP BY 1 HAVING SUM(payment_count) > 0''')
     stats['auto_vs_manual'] = {('auto' if r[0] else 'manual'): r[1] for r in c.fetchall()}
 
-    # Recent payments (last 7 days)
+    # Recent payments (last 7 days): whole days from the rollup, plus the
+    # partial first day straight from the created_at index
     week_ago = (datetime.now() - timedelta(days=7)).isoformat()
-    c.execute("SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM zelle_payments WHERE created_at >= ?", (week_ago,))
+    next_day = (datetime.now() - timedelta(days=6)).strftime('%Y-%m-%d')
+    c.execute('''SELECT COALESCE(SUM(payment_count), 0), COALESCE(SUM(amount_cents), 0)
+        FROM zelle_payment_rollup WHERE day >= ?''', (next_day,))
+    count, cents = c.fetchone()
+    c.execute('''SELECT COUNT(*), COALESCE(SUM(amount), 0) FROM zelle_payments
+        WHERE created_at >= ? AND created_at < ?''', (week_ago, next_day))
     row = c.fetchone()
-    stats['last_7_days'] = {'count': row[0], 'amount': round(row[1], 2)}
+    stats['last_7_days'] = {'count': count + row[0], 'amount': round(cents / 100 + row[1], 2)}
 
     # Pending count
-    c.execute("SELECT COUNT(*) FROM zelle_payments WHERE status = 'pending'")
-    stats['pending_count'] = c.fetchone()[0]
+    stats['pending_count'] = by_status.get('pending', {}).get('count', 0)
 
     # Members with balance due
     c.execute("SELECT COUNT(*) FROM members WHERE balance_due > 0")
@@ -818,36 +1690,38 @@ def get_stats():
     if last_poll:
         stats['last_poll'] = dict(last_poll)
 
-    stats['poller_active'] = _poller_running
+    stats['poller_active'] = poller_state(c)['active']
 
-    conn.close()
     return jsonify(stats)
 
 
+@app.route('/api/zelle/stats/rebuild', methods=['POST'])
+def rebuild_stats():
+    """Recompute the stats rollup from scratch (after manual DB edits or restores)"""
+    rebuild_stats_rollup(get_db())
+    return jsonify({"success": True, "timestamp": datetime.now().isoformat()})
+
+
 @app.route('/api/zelle/members', methods=['GET'])
 def get_members():
     """Get member list for matching dropdown"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     c = conn.cursor()
     c.execute("SELECT * FROM members ORDER BY full_name")
     members = [dict(row) for row in c.fetchall()]
-    conn.close()
     return jsonify({"members": members})
 
 
 @app.route('/api/zelle/members/<member_id>/payments', methods=['GET'])
 def get_member_payments(member_id):
     """Get payment history for a specific member"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     c = conn.cursor()
 
     # Get member info
     c.execute("SELECT * FROM members WHERE id = ?", (member_id,))
     member = c.fetchone()
     if not member:
-        conn.close()
         return jsonify({"error": "Member not found"}), 404
 
     # Get payment history
@@ -858,53 +1732,175 @@ def get_member_payments(member_id):
         ORDER BY ph.created_at DESC''', (member_id,))
     payments = [dict(row) for row in c.fetchall()]
 
-    conn.close()
     return jsonify({"member": dict(member), "payments": payments})
 
 
 @app.route('/api/zelle/history', methods=['GET'])
 def get_payment_history():
-    """Get full payment history across all members"""
+    """Get full payment history across all members, newest-first, cursor-paged like /payments"""
     limit = int(request.args.get('limit', 50))
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     c = conn.cursor()
-    c.execute('''SELECT ph.*, zp.sender_name as zelle_sender, zp.bank_source
-        FROM payment_history ph
-        LEFT JOIN zelle_payments zp ON ph.zelle_payment_id = zp.id
-        ORDER BY ph.created_at DESC LIMIT ?''', (limit,))
-    history = [dict(row) for row in c.fetchall()]
-    conn.close()
-    return jsonify({"history": history, "count": len(history)})
+    try:
+        history, next_token, prev_token = keyset_page(
+            c, '''SELECT ph.*, zp.sender_name as zelle_sender, zp.bank_source
+            FROM payment_history ph
+            LEFT JOIN zelle_payments zp ON ph.zelle_payment_id = zp.id''', [], [], 'ph.', limit,
+            cursor=request.args.get('cursor'))
+    except CursorError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"history": history, "count": len(history), "next": next_token, "prev": prev_token})
+
+
+# Tables /api/zelle/export can dump, oldest-first on the (created_at, id) indexes
+EXPORT_TABLES = {
+    'payments': 'zelle_payments',
+    'history': 'payment_history',
+}
+EXPORT_BATCH_ROWS = 500
+
+
+@app.route('/api/zelle/export', methods=['GET'])
+def export_payments():
+    """
+    Stream a full dump of payments or payment history as NDJSON or CSV.
+    Filters: from/to (YYYY-MM-DD, inclusive, on created_at) and status.
+    Rows are read in batches from a dedicated cursor and written as they
+    go, so memory stays flat however many years are exported. Gzipped
+    when the client accepts gzip (Accept-Encoding with q > 0, or gzip=1).
+    """
+    table = EXPORT_TABLES.get(request.args.get('table', 'payments'))
+    fmt = request.args.get('format', 'ndjson')
+    if table is None:
+        return jsonify({"error": f"table must be one of: {', '.join(EXPORT_TABLES)}"}), 400
+    if fmt not in ('ndjson', 'csv'):
+        return jsonify({"error": "format must be ndjson or csv"}), 400
+
+    filters, params = [], []
+    try:
+        if request.args.get('from'):
+            filters.append("created_at >= ?")
+            params.append(datetime.strptime(request.args['from'], '%Y-%m-%d').strftime('%Y-%m-%d'))
+        if request.args.get('to'):
+            filters.append("created_at < ?")
+            params.append((datetime.strptime(request.args['to'], '%Y-%m-%d') + timedelta(days=1)).strftime('%Y-%m-%d'))
+    except ValueError:
+        return jsonify({"error": "from/to must be YYYY-MM-DD"}), 400
+    if request.args.get('status'):
+        filters.append("status = ?")
+        params.append(request.args['status'])
+
+    sql = f"SELECT * FROM {table}"
+    if filters:
+        sql += " WHERE " + " AND ".join(filters)
+    sql += " ORDER BY created_at, id"
+
+    # Parsed codings with q-values: 'gzip;q=0' (or '*;q=0') refuses gzip, '*' accepts it
+    gzip_it = request.args.get('gzip') in ('1', 'true') or request.accept_encodings['gzip'] > 0
+
+    def rows_as_text():
+        # Own connection: a long read shouldn't hold the thread's shared one,
+        # and WAL gives it a consistent snapshot while the poller keeps writing
+        conn = open_db()
+        try:
+            c = conn.execute(sql, params)
+            columns = [d[0] for d in c.description]
+            buf = StringIO()
+            writer = csv.writer(buf) if fmt == 'csv' else None
+            if writer:
+                writer.writerow(columns)
+            while True:
+                batch = c.fetchmany(EXPORT_BATCH_ROWS)
+                if not batch:
+                    break
+                for row in batch:
+                    if writer:
+                        writer.writerow(row)
+                    else:
+                        buf.write(json.dumps(dict(zip(columns, row)), default=str))
+                        buf.write("\n")
+                yield buf.getvalue()
+                buf.seek(0)
+                buf.truncate()
+            if buf.tell():
+                yield buf.getvalue()
+        finally:
+            conn.close()
+
+    def body():
+        if not gzip_it:
+            for chunk in rows_as_text():
+                yield chunk.encode('utf-8')
+            return
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+        for chunk in rows_as_text():
+            data = compressor.compress(chunk.encode('utf-8'))
+            if data:
+                yield data
+        yield compressor.flush()
+
+    filename = f"banf_{request.args.get('table', 'payments')}_{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"', "Vary": "Accept-Encoding"}
+    if gzip_it:
+        headers["Content-Encoding"] = "gzip"
+    mimetype = 'text/csv' if fmt == 'csv' else 'application/x-ndjson'
+    return Response(stream_with_context(body()), mimetype=mimetype, headers=headers)
 
 
 @app.route('/api/zelle/poller/start', methods=['POST'])
 def api_start_poller():
-    """Start the background Gmail poller"""
-    if start_poller():
-        return jsonify({"success": True, "message": "Poller started", "interval": POLL_INTERVAL})
-    return jsonify({"success": False, "message": "Poller already running"})
+    """Start the background Gmail poller (in whichever worker leads)"""
+    data = request.get_json(silent=True) or {}
+    mode = data.get('mode')
+    if mode and mode not in ('interval', 'idle'):
+        return jsonify({"error": "mode must be 'interval' or 'idle'"}), 400
+    conn = get_db()
+    c = conn.cursor()
+    enabled, current_mode = poller_settings(c)
+    already = enabled and poller_leader.holder() is not None and (not mode or mode == current_mode)
+    set_setting(c, 'poller_enabled', '1')
+    set_setting(c, 'poller_mode', mode or current_mode)
+    conn.commit()
+    if already:
+        return jsonify({"success": False, "message": "Poller already running"})
+    start_background()
+    if poller_leader.is_leader:
+        apply_poller_settings()
+    return jsonify({"success": True, "message": "Poller started", "mode": mode or current_mode,
+                    "interval": POLL_INTERVAL})
 
 
 @app.route('/api/zelle/poller/stop', methods=['POST'])
 def api_stop_poller():
-    """Stop the background Gmail poller"""
-    stop_poller()
+    """Stop the background Gmail poller (in whichever worker leads)"""
+    conn = get_db()
+    set_setting(conn.cursor(), 'poller_enabled', '0')
+    conn.commit()
+    if poller_leader.is_leader:
+        apply_poller_settings()
     return jsonify({"success": True, "message": "Poller stopped"})
 
 
 @app.route('/api/zelle/poller/status', methods=['GET'])
 def poller_status():
     """Get poller status and recent log"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     c = conn.cursor()
     c.execute("SELECT * FROM poll_log ORDER BY id DESC LIMIT 10")
     logs = [dict(row) for row in c.fetchall()]
-    conn.close()
+    checkpoint = {
+        "uidvalidity": get_setting(c, 'zelle_uidvalidity'),
+        "last_uid": get_setting(c, 'zelle_last_uid'),
+    }
+    poller = poller_state(c)
     return jsonify({
-        "active": _poller_running,
+        "active": poller["active"],
+        "enabled": poller["enabled"],
+        "mode": poller["mode"],
         "interval_seconds": POLL_INTERVAL,
+        "leader_pid": poller["leader_pid"],
+        "worker_pid": poller["worker_pid"],
+        "sync_checkpoint": checkpoint,
         "recent_polls": logs
     })
 
@@ -912,7 +1908,7 @@ def poller_status():
 @app.route('/api/zelle/test/seed', methods=['POST'])
 def seed_test_data():
     """Seed database with test Zelle payment data (for demo/testing)"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     c = conn.cursor()
 
     test_payments = [
@@ -1020,7 +2016,6 @@ def seed_test_data():
             print(f"[SEED] Error: {e}")
 
     conn.commit()
-    conn.close()
     return jsonify({"success": True, "inserted": inserted, "total_test": len(test_payments)})
 
 
@@ -1034,7 +2029,7 @@ if __name__ == '__main__':
     print(f"  Gmail:     {GMAIL_ADDRESS}")
     print(f"  Database:  {DB_PATH}")
     print(f"  Server:    http://localhost:5002")
-    print(f"  Poll Int:  {POLL_INTERVAL}s")
+    print(f"  Poll Mode: {POLL_MODE}" + (f" (every {POLL_INTERVAL}s)" if POLL_MODE != 'idle' else ""))
     print("=" * 60)
     print()
     print("  Endpoints:")
@@ -1046,15 +2041,18 @@ if __name__ == '__main__':
     print("    POST /api/zelle/payments/<id>/reject  - Reject payment")
     print("    POST /api/zelle/payments/<id>/match   - Match to member")
     print("    GET  /api/zelle/stats           - Dashboard stats")
+    print("    POST /api/zelle/stats/rebuild   - Recompute stats rollup")
     print("    GET  /api/zelle/members         - Member list")
     print("    GET  /api/zelle/history         - Payment history")
+    print("    GET  /api/zelle/export          - Stream NDJSON/CSV dump")
     print("    POST /api/zelle/poller/start    - Start auto-poll")
     print("    POST /api/zelle/poller/stop     - Stop auto-poll")
     print("    GET  /api/zelle/poller/status   - Poller status")
     print("    POST /api/zelle/test/seed       - Seed test data")
     print()
 
-    # Auto-start poller
-    start_poller()
+    # Poll in this process unless another one (e.g. serve.py workers) already does;
+    # python serve.py zelle runs the API with several worker processes
+    start_background()
 
     app.run(host='0.0.0.0', port=5002, debug=False)